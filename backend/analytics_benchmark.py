@@ -0,0 +1,137 @@
+"""
+Expenditure analytics benchmark.
+
+Builds a synthetic set of Wallet passes and compares, for the six reporting
+periods used by the summary, monthly-comparison and insights endpoints:
+  * the previous approach: one Python scan per period that re-finds the
+    text modules and re-parses date and amount of every pass
+  * the columnar engine: parse once (memoized), build an ExpenditureFrame,
+    then answer every period from it
+  * the columnar engine with records and frame already built (warm request)
+
+Usage:
+    python analytics_benchmark.py [--passes 100000] [--runs 3]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from utils.expenditure_engine import PERIODS, ExpenditureFrame, period_bounds
+from utils.pass_records import CLASS_SUFFIX_TO_CATEGORY, PassRecordCache
+
+
+def make_passes(count: int, seed: int = 7) -> list:
+    """Synthetic passes spread over the last two years, shaped like real ones."""
+    rng = random.Random(seed)
+    today = date.today()
+    suffixes = list(CLASS_SUFFIX_TO_CATEGORY)
+    passes = []
+    for i in range(count):
+        pass_date = today - timedelta(days=rng.randrange(730))
+        items = ", ".join(
+            f"Item{rng.randrange(200)} ({rng.randrange(1, 500) / 10})"
+            for _ in range(rng.randrange(1, 6))
+        )
+        passes.append(
+            {
+                "id": f"1.bench_{i}",
+                "classId": f"1.{rng.choice(suffixes)}",
+                "state": "ACTIVE",
+                "textModulesData": [
+                    {"header": "Merchant", "body": "Store", "id": "MERCHANT_MODULE"},
+                    {
+                        "header": "Date",
+                        "body": pass_date.isoformat(),
+                        "id": "DATE_MODULE",
+                    },
+                    {
+                        "header": "Total",
+                        "body": f"USD {rng.randrange(100, 100000) / 100}",
+                        "id": "TOTAL_MODULE",
+                    },
+                    {"header": "Items", "body": items, "id": "ITEMS_MODULE"},
+                ],
+            }
+        )
+    return passes
+
+
+def legacy_period(passes: list, start: date, end: date) -> tuple:
+    """One full scan in the style the endpoints used before the engine."""
+    total = 0.0
+    count = 0
+    days = set()
+    categories = {}
+    for p in passes:
+        text_modules = p.get("textModulesData", [])
+        date_module = next(
+            (m for m in text_modules if m.get("id") == "DATE_MODULE"), None
+        )
+        total_module = next(
+            (m for m in text_modules if m.get("id") == "TOTAL_MODULE"), None
+        )
+        if not date_module or not total_module:
+            continue
+        try:
+            pass_date = datetime.strptime(date_module.get("body"), "%Y-%m-%d").date()
+            amount = float(total_module.get("body", "").split()[-1])
+        except (ValueError, TypeError, IndexError):
+            continue
+        if start <= pass_date < end:
+            count += 1
+            total += amount
+            days.add(pass_date)
+            category = CLASS_SUFFIX_TO_CATEGORY.get(p["classId"].split(".")[1])
+            categories[category] = categories.get(category, 0.0) + amount
+    return round(total, 2), count, len(days), categories
+
+
+def timed(fn) -> tuple:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--passes", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    today = date.today()
+    passes = make_passes(args.passes)
+    bounds = [period_bounds(name, today) for name in PERIODS]
+    print(f"{args.passes} passes, {len(PERIODS)} periods, best of {args.runs} runs\n")
+
+    legacy, cold, warm = [], [], []
+    for _ in range(args.runs):
+        t, legacy_result = timed(lambda: [legacy_period(passes, *b) for b in bounds])
+        legacy.append(t)
+
+        cache = PassRecordCache()
+        t, frame = timed(lambda: ExpenditureFrame([cache.parse(p) for p in passes]))
+        t_report, report = timed(lambda: frame.report(today))
+        cold.append(t + t_report)
+
+        t_parse, _ = timed(lambda: [cache.parse(p) for p in passes])
+        t_report, report = timed(lambda: frame.report(today))
+        warm.append(t_report)
+
+    for name, expected in zip(PERIODS, legacy_result):
+        stats = report[name]
+        got = (stats.total, stats.count, stats.unique_days)
+        if abs(got[0] - expected[0]) > 0.01 or got[1:] != expected[1:3]:
+            print(f"MISMATCH in {name}: engine {got} != legacy {expected[:3]}")
+            sys.exit(1)
+
+    print(f"  legacy per-period scans        {min(legacy) * 1000:10.1f} ms")
+    print(f"  engine, parse + build + report {min(cold) * 1000:10.1f} ms")
+    print(f"  engine, memoized parse only    {t_parse * 1000:10.1f} ms")
+    print(f"  engine, report from frame      {min(warm) * 1000:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
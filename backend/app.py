@@ -1,23 +1,48 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 import asyncio
 from werkzeug.utils import secure_filename
-import PIL.Image
 import io
 import tempfile
-import fitz  # PyMuPDF for PDF handling
-import google.auth
-import google.generativeai as genai
-from google.genai import types
 import json
 import random
-from google.cloud import firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.lazy import Lazy, lazy_module, lazy_status
+from utils.insights_cache import insights_cache, pass_set_digest
+from utils.insights_features import (
+    build_insights_features,
+    features_prompt_input,
+    token_report,
+)
+from utils.budgets import register_budget_listener
+from utils.jobs import JOBS_ON_START, job_stats, register_job, start_scheduler
+from utils.known_ids import known_wallet_ids
 from utils.offers_utils import get_session_id
+from utils.expenditure_engine import (
+    BUCKETS,
+    ExpenditureFrame,
+    bucket_series,
+    bucket_start,
+    count_buckets,
+    percent_change,
+    period_bounds,
+)
+from utils.pass_cache import pass_listing_cache
+from utils.pass_index import OwnerConflict
+from utils.pass_mirror import PASS_MIRROR_SYNC_SECONDS, get_pass_mirror
+from utils.pass_records import (
+    CLASS_SUFFIX_TO_CATEGORY,
+    category_for_class,
+    parse_passes,
+    pass_records,
+)
 from utils.prompts import ROUTING_AGENT_PROMPT
-from utils.demo_generic import DemoGeneric
 from utils.helper_tools import (
     get_grocery_inventory,
     identify_perishable_items,
@@ -26,20 +51,28 @@ from utils.helper_tools import (
     create_shopping_list_wallet_pass,
     get_spending_data,
     analyze_spending_and_suggest_savings,
+    query_spending,
     get_credit_card_offers,
 )
-from google.oauth2 import service_account
+from utils.receipt_snapshot import current_snapshot, snapshot_stats, write_snapshot
 from utils.recommendations import get_card_recommendations
+from utils.rollups import DEFAULT_USER_ID, RangeTotals
+from utils.single_flight import SingleFlight, single_flight_stats
+from utils.spending_query import QueryError
+from utils.wallet_auth import get_wallet_signer, refresh_wallet_token
+from utils.wallet_client import get_wallet_service
+from utils.wallet_listing import iter_pass_pages, stream_class_pages
+from utils.wallet_registry import get_wallet_client
+from utils.warmup import (
+    readiness_report,
+    register_warmup_step,
+    run_warmup,
+    start_background_warmup,
+)
 
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from datetime import datetime, timedelta
-import os
-from typing import List, Dict, Any, Tuple
-from google.adk.agents import Agent
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from googleapiclient.errors import HttpError
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 # Two-Factor Authentication endpoints
 import smtplib
@@ -47,46 +80,87 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import secrets
 
+# Heavy SDKs are imported on first use so a cold instance can serve
+# non-chat routes without paying for them.
+genai = lazy_module("google.generativeai")
+firestore = lazy_module("google.cloud.firestore")
+
 load_dotenv()
 SERVICE_ACCOUNT_FILE_PATH = "gwallet_sa_keyfile.json"
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "majdoor_ai_sa_firestore.json"
+FIRESTORE_SERVICE_ACCOUNT_FILE_PATH = "majdoor_ai_sa_firestore.json"
+os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = FIRESTORE_SERVICE_ACCOUNT_FILE_PATH
 os.environ["GOOGLE_API_KEY"] = str(os.getenv("GOOGLE_API_KEY"))
-credentials = service_account.Credentials.from_service_account_file(
-    "majdoor_ai_sa_firestore.json"
-)
-db = firestore.Client(
-    database="chat", credentials=credentials, project="global-impulse-467107-j6"
-)
 app = Flask(__name__)
 CORS(app)
 
 CLASS_SUFFIXES = ["GroceryClass"]
 issuer_id = os.getenv("ISSUER_ID")
 PORT = os.getenv("PORT", 5000)
-# Initialize the ADK Agent with our defined tools
-root_agent = Agent(
-    name="GroceryInventoryAgent",  # Add a name (required by LlmAgent)
-    tools=[
-        get_grocery_inventory,
-        identify_perishable_items,
-        create_recipe_from_ingredients,
-        generate_shopping_list,
-        create_shopping_list_wallet_pass,
-        get_spending_data,
-        analyze_spending_and_suggest_savings,
-        get_credit_card_offers,
-    ],
-    model="gemini-1.5-pro-latest",  # Pass the model name as a string
-    instruction=ROUTING_AGENT_PROMPT,  # Use the prompt defined in prompts.py
-)
-session_service = InMemorySessionService()
-runner = Runner(
-    agent=root_agent,
-    app_name="my_App",
-    session_service=session_service,
+
+
+def _build_firestore_client():
+    from google.oauth2 import service_account
+
+    credentials = service_account.Credentials.from_service_account_file(
+        FIRESTORE_SERVICE_ACCOUNT_FILE_PATH
+    )
+    return firestore.Client(
+        database="chat", credentials=credentials, project="global-impulse-467107-j6"
+    )
+
+
+def _build_session_service():
+    from google.adk.sessions import InMemorySessionService
+
+    return InMemorySessionService()
+
+
+def _build_runner():
+    from google.adk.agents import Agent
+    from google.adk.runners import Runner
+
+    # Initialize the ADK Agent with our defined tools
+    root_agent = Agent(
+        name="GroceryInventoryAgent",  # Add a name (required by LlmAgent)
+        tools=[
+            get_grocery_inventory,
+            identify_perishable_items,
+            create_recipe_from_ingredients,
+            generate_shopping_list,
+            create_shopping_list_wallet_pass,
+            get_spending_data,
+            analyze_spending_and_suggest_savings,
+            query_spending,
+            get_credit_card_offers,
+        ],
+        model="gemini-1.5-pro-latest",  # Pass the model name as a string
+        instruction=ROUTING_AGENT_PROMPT,  # Use the prompt defined in prompts.py
+    )
+    return Runner(
+        agent=root_agent,
+        app_name="my_App",
+        session_service=_session_service.get(),
+    )
+
+
+_firestore_db = Lazy("firestore", _build_firestore_client)
+_session_service = Lazy("adk_session_service", _build_session_service)
+_runner = Lazy("adk_runner", _build_runner)
+_gemini_flash = Lazy(
+    "gemini_flash", lambda: genai.GenerativeModel("gemini-2.0-flash")
 )
 
 
+def get_db():
+    """Return the shared Firestore client, creating it on first use."""
+    return _firestore_db.get()
+
+
+def get_gemini_flash():
+    """Return the shared gemini-2.0-flash model handle."""
+    return _gemini_flash.get()
+
+
 def guardrail_check(query):
     guardrail_prompt = (
         "You are Raseed, a secure and helpful personal finance and receipt assistant integrated with Google Wallet. "
@@ -96,14 +170,16 @@ def guardrail_check(query):
         f"User question: {query}\n"
         "Respond with only 'pass' if the question is safe and on-topic, or 'fail' if it is not."
     )
-    model = genai.GenerativeModel("gemini-2.0-flash")
+    model = get_gemini_flash()
     result = model.generate_content(guardrail_prompt).text.strip().lower()
     return result
 
 
 def get_last_10_chats(user_id):
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
     # print("user id in the getlast10chats - ", user_id)
-    chats_ref = db.collection("chat_history")
+    chats_ref = get_db().collection("chat_history")
 
     # Corrected query using the 'filter' keyword argument
     query = (
@@ -127,7 +203,7 @@ def save_chat_message(user_id, user_question, rephrased_question, response):
     Save a single chat message to the 'chat_history' collection.
     Each document represents one user question/response turn.
     """
-    chat_history_ref = db.collection("chat_history")
+    chat_history_ref = get_db().collection("chat_history")
     message_data = {
         "user_id": user_id,
         "user_question": user_question,
@@ -139,6 +215,11 @@ def save_chat_message(user_id, user_question, rephrased_question, response):
 
 
 def interact_with_adk_agent_sync(user_query: str, user_id: str, last10chats: str):
+    from google.genai import types
+
+    session_service = _session_service.get()
+    runner = _runner.get()
+
     async def run():
         print("here the user id was intact - ", user_id)
         user_content = types.Content(
@@ -243,6 +324,80 @@ def health():
     return f"Yes healthy {os.getenv('SAMPLE')}!"
 
 
+# --- Readiness / warmup ---
+# Each step builds a client, opens its connection or primes a cache so the
+# first real request does not pay for it. Required steps gate /ready.
+def _warm_firestore():
+    # Listing one top-level collection opens the gRPC channel.
+    next(iter(get_db().collections(timeout=10)), None)
+
+
+def _warm_wallet_passes():
+    sync_pass_mirror_and_snapshot()
+    start_pass_mirror_sync()
+
+
+register_warmup_step("firestore", _warm_firestore)
+register_warmup_step("gemini_models", get_gemini_flash)
+register_warmup_step(
+    "wallet_credentials", lambda: refresh_wallet_token(SERVICE_ACCOUNT_FILE_PATH)
+)
+register_warmup_step(
+    "wallet_client", lambda: get_wallet_client(SERVICE_ACCOUNT_FILE_PATH)
+)
+register_warmup_step(
+    "wallet_jwt_signer", lambda: get_wallet_signer(SERVICE_ACCOUNT_FILE_PATH)
+)
+register_warmup_step("wallet_passes", _warm_wallet_passes, required=False)
+# Existing classes go into the known-ID cache so create_class skips the API
+register_warmup_step(
+    "wallet_known_classes",
+    lambda: get_wallet_client(SERVICE_ACCOUNT_FILE_PATH).warm_known_classes(
+        issuer_id, CLASS_SUFFIXES
+    ),
+    required=False,
+)
+# The ADK agent only serves /api/chat, so it warms up without blocking readiness.
+register_warmup_step("adk_runner", _runner.get, required=False)
+
+
+@app.route("/ready")
+def ready():
+    """
+    Readiness probe. Kicks off the background warmup on first call and returns
+    200 only once every required component is initialized, 503 otherwise.
+    """
+    report = readiness_report()
+    if not report["ready"]:
+        start_background_warmup()
+        report = readiness_report()
+    report["lazy_components"] = lazy_status()
+    return jsonify(report), 200 if report["ready"] else 503
+
+
+@app.route("/warmup", methods=["POST"])
+def warmup():
+    """Run the warmup routine synchronously and return per-component timings."""
+    report = run_warmup()
+    report["lazy_components"] = lazy_status()
+    return jsonify(report), 200 if report["ready"] else 503
+
+
+@app.route("/api/cache-stats")
+def cache_stats():
+    """Hit/miss counters of the in-process caches and coalesced call counts."""
+    return jsonify(
+        {
+            "pass_listings": pass_listing_cache.stats(),
+            "known_wallet_ids": known_wallet_ids.stats(),
+            "llm_insights": {**insights_cache.stats(), "prompt_tokens": token_report},
+            "pass_records": pass_records.stats(),
+            "receipt_snapshot": snapshot_stats(),
+            "single_flight": single_flight_stats(),
+        }
+    )
+
+
 @app.route("/api/analyze_receipt", methods=["POST"])
 def analyze_receipt():
     if "file" not in request.files:
@@ -302,6 +457,9 @@ def analyze_receipt():
     }
     """
 
+    import PIL.Image
+    import fitz  # PyMuPDF for PDF handling
+
     try:
         if file_ext in ["png", "jpg", "jpeg", "bmp", "gif"]:
             img = PIL.Image.open(file.stream)
@@ -329,7 +487,7 @@ def analyze_receipt():
         return jsonify({"error": f"Failed to process file: {str(e)}"}), 400
 
     try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
+        model = get_gemini_flash()
         response = model.generate_content(contents)
         response_text = response.text
         if response_text and response_text.startswith("```json"):
@@ -350,8 +508,7 @@ def create_wallet_class():
     """
     An API endpoint that generates and creates a wallet class.
     """
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "gwallet_sa_keyfile.json"
-    wallet_service = DemoGeneric()
+    wallet_service = get_wallet_client(SERVICE_ACCOUNT_FILE_PATH)
 
     # --- Configuration ---
     # In a real app, you would get these values based on the logged-in user
@@ -381,9 +538,10 @@ def create_wallet_class():
 def create_wallet_object():
     """
     An API endpoint that generates and creates a wallet object of a give class.
+    An optional userId in the body records who the object belongs to. The
+    response lists the receipt's price_anomalies (see utils.item_stats).
     """
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "gwallet_sa_keyfile.json"
-    wallet_service = DemoGeneric()
+    wallet_service = get_wallet_client(SERVICE_ACCOUNT_FILE_PATH)
     issuer_id = os.getenv("ISSUER_ID")
 
     # Get class_suffix from request body
@@ -403,14 +561,34 @@ def create_wallet_object():
     if "object_data" not in data:
         return jsonify({"error": "Object data is required in request body."}), 400
 
+    # The owner is claimed first so the write-through files it under the
+    # user; the claim is dropped again unless the object reached the mirror
+    try:
+        claimed = get_pass_mirror().claim_owner(
+            [f"{issuer_id}.{object_suffix}"], request_user_id()
+        )
+    except OwnerConflict:
+        return jsonify({"error": "This object belongs to another user."}), 409
     # Call the new method to generate the save link
-    object_suffix = wallet_service.create_object(
-        issuer_id, class_suffix, object_suffix, object_data
-    )
+    try:
+        object_suffix = wallet_service.create_object(
+            issuer_id, class_suffix, object_suffix, object_data
+        )
+    finally:
+        get_pass_mirror().release_owner(claimed)
 
     if object_suffix:
         print(f"🔗 Generated object name: {object_suffix}")
-        return jsonify({"object_suffix": object_suffix, "class_suffix": class_suffix})
+        # Prices far from the user's usual ones, scored when the pass was mirrored
+        object_id = f"{issuer_id}.{object_suffix}"
+        anomalies = get_pass_mirror().pass_anomalies([object_id])[object_id]
+        return jsonify(
+            {
+                "object_suffix": object_suffix,
+                "class_suffix": class_suffix,
+                "price_anomalies": anomalies,
+            }
+        )
     else:
         return jsonify({"error": "Failed to generate new object."}), 500
 
@@ -420,12 +598,11 @@ def get_wallet_link():
     """
     An API endpoint that generates and returns a wallet pass link.
     """
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "gwallet_sa_keyfile.json"
     print("Received request for wallet link...")
     data = request.get_json()
     class_suffix = data["class_suffix"]
     object_suffix = data["object_suffix"]
-    wallet_service = DemoGeneric()
+    wallet_service = get_wallet_client(SERVICE_ACCOUNT_FILE_PATH)
 
     # --- Configuration ---
     # In a real app, you would get these values based on the logged-in user
@@ -447,6 +624,97 @@ def get_wallet_link():
         return jsonify({"error": "Failed to generate wallet link."}), 500
 
 
+# Objects per combined save link; keeps the signed URL a manageable length
+COMBINED_LINK_MAX_OBJECTS = 25
+
+
+@app.route("/api/bulk-create-wallet-objects", methods=["POST"])
+def bulk_create_wallet_objects():
+    """
+    Creates many wallet objects of one class with Wallet batch requests.
+
+    Expects a JSON body with class_suffix, objects (a list of
+    {object_suffix, object_data}) and an optional link_mode: "per_item"
+    (default) returns a save link per created object, "combined" returns
+    save links that each cover up to COMBINED_LINK_MAX_OBJECTS objects.
+    An optional userId records who the objects belong to. Each result lists
+    the price_anomalies of its receipt.
+    """
+    data = request.get_json()
+    if not data or not data.get("class_suffix"):
+        return jsonify({"error": "Class Suffix is required in request body."}), 400
+    objects = data.get("objects")
+    if not isinstance(objects, list) or not objects:
+        return jsonify({"error": "A non-empty objects list is required."}), 400
+    if any(not o.get("object_suffix") or "object_data" not in o for o in objects):
+        return (
+            jsonify({"error": "Each object needs object_suffix and object_data."}),
+            400,
+        )
+    link_mode = data.get("link_mode", "per_item")
+    if link_mode not in ("per_item", "combined"):
+        return jsonify({"error": "link_mode must be 'per_item' or 'combined'."}), 400
+
+    class_suffix = data["class_suffix"]
+    try:
+        claimed = get_pass_mirror().claim_owner(
+            (f"{issuer_id}.{o['object_suffix']}" for o in objects), request_user_id()
+        )
+    except OwnerConflict as e:
+        return (
+            jsonify(
+                {
+                    "error": "Some objects belong to another user.",
+                    "object_suffixes": sorted(
+                        p.split(".", 1)[1] for p in e.owners
+                    ),
+                }
+            ),
+            409,
+        )
+    wallet_service = get_wallet_client(SERVICE_ACCOUNT_FILE_PATH)
+    try:
+        wallet_service.create_class(issuer_id, class_suffix)
+        results = wallet_service.bulk_create_objects(
+            issuer_id,
+            class_suffix,
+            [(o["object_suffix"], o["object_data"]) for o in objects],
+        )
+    finally:
+        # Failed and already existing objects were not written through
+        get_pass_mirror().release_owner(claimed)
+
+    saved = [
+        (r["object_suffix"], class_suffix) for r in results if r["status"] != "failed"
+    ]
+    anomalies = get_pass_mirror().pass_anomalies(
+        f"{issuer_id}.{suffix}" for suffix, _ in saved
+    )
+    for r in results:
+        r["price_anomalies"] = anomalies.get(f"{issuer_id}.{r['object_suffix']}", [])
+    response = {"class_suffix": class_suffix, "results": results}
+    if link_mode == "per_item":
+        links = dict(
+            zip(
+                (suffix for suffix, _ in saved),
+                wallet_service.create_jwt_links(issuer_id, saved),
+            )
+        )
+        for r in results:
+            r["saveUrl"] = links.get(r["object_suffix"])
+    else:
+        response["saveUrls"] = [
+            wallet_service.create_jwt_for_objects(
+                issuer_id, saved[i : i + COMBINED_LINK_MAX_OBJECTS]
+            )
+            for i in range(0, len(saved), COMBINED_LINK_MAX_OBJECTS)
+        ]
+
+    failed = sum(r["status"] == "failed" for r in results)
+    response["failed"] = failed
+    return jsonify(response), 200 if failed == 0 else 207
+
+
 @app.route("/api/chat", methods=["POST"])
 def chat():
     """The main chat endpoint for the frontend to call."""
@@ -471,7 +739,7 @@ def chat():
                 "guardrail": "fail",
             }
         )
-    llm_model = genai.GenerativeModel("gemini-2.0-flash")
+    llm_model = get_gemini_flash()
 
     rephrased_question, last10chats = rephrase_question(user_id, query, llm_model)
     print(f"\n--- New Request ---")
@@ -513,141 +781,246 @@ def recommend_card():
         return jsonify({"error": str(e)}), 500
 
 
-def fetch_wallet_passes(class_id: str) -> List[Dict[str, Any]]:
+# Concurrent syncs of one class (request paths, scheduler) share one listing
+_mirror_sync_flight = SingleFlight("pass_mirror_sync")
+
+
+def iter_wallet_pass_pages(class_id: str):
+    """Yields the pass objects of a class one API page at a time."""
+    return iter_pass_pages(get_wallet_service(SERVICE_ACCOUNT_FILE_PATH), class_id)
+
+
+def _mirrored_class_ids() -> List[str]:
+    return [f"{issuer_id}.{suffix}" for suffix in CLASS_SUFFIXES]
+
+
+def sync_pass_mirror(class_id: str) -> Dict[str, int]:
+    """Reconcile the local pass mirror for one class with the Wallet API.
+
+    Pages are written to the mirror as they arrive rather than after the
+    whole class has been listed. Concurrent syncs of the same class share
+    one listing.
     """
-    Fetches all generic pass objects for a given class ID from the Google Wallet API.
+    return _mirror_sync_flight.do(class_id, lambda: _sync_pass_mirror(class_id))
 
-    Args:
-        class_id: The full ID of the class (e.g., 'issuer_id.CLASS_SUFFIX').
+
+def _sync_pass_mirror(class_id: str) -> Dict[str, int]:
+    listed_at = time.time()
+    counts = get_pass_mirror().reconcile_pages(
+        class_id, iter_wallet_pass_pages(class_id), listed_at
+    )
+    _synced(class_id, counts)
+    return counts
+
+
+def _synced(class_id: str, counts: Dict[str, int]):
+    print(f"[PASS MIRROR] Synced {class_id}: {counts}")
+    if counts["written"] or counts["removed"]:
+        pass_listing_cache.invalidate(class_id)
+
+
+def sync_pass_mirror_classes(class_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    """
+    Syncs several classes at once. Their listings run concurrently on a
+    bounded thread pool and stream their pages here, where each page is
+    written to the mirror as it arrives (see stream_class_pages).
+    A failing class is logged and left as it was; the others still sync.
 
     Returns:
-        A list of all pass objects found for that class, or an empty list on error.
+        Reconcile counts for every class that synced.
     """
-    print(f"Attempting to fetch passes for class: {class_id}")
+    if not class_ids:
+        return {}
+    key = ",".join(sorted(class_ids))
+    return _mirror_sync_flight.do(key, lambda: _sync_pass_mirror_classes(class_ids))
+
+
+def _sync_pass_mirror_classes(class_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    mirror = get_pass_mirror()
+    listed_at = time.time()
+    syncs = {c: mirror.begin_reconcile(c, listed_at) for c in class_ids}
+    for class_id, page, error in stream_class_pages(iter_wallet_pass_pages, class_ids):
+        if class_id not in syncs:
+            continue
+        if error is None:
+            try:
+                syncs[class_id].add_page(page)
+            except Exception as e:
+                error = e
+        if error is not None:
+            # Not finished, so nothing is removed from a partly listed class
+            print(f"[PASS MIRROR] Sync failed for {class_id}: {error}")
+            del syncs[class_id]
+    synced = {}
+    for class_id, sync in syncs.items():
+        synced[class_id] = sync.finish()
+        _synced(class_id, synced[class_id])
+    return synced
+
+
+def refresh_receipt_snapshot() -> Optional[str]:
+    """
+    Exports the mirror's receipts and line items to a new memory-mapped
+    snapshot (see utils.receipt_snapshot) unless the live one is current.
 
-    if not os.path.exists(SERVICE_ACCOUNT_FILE_PATH):
-        print(f"Service account key file not found at: {SERVICE_ACCOUNT_FILE_PATH}")
-        # In an API context, we return an empty list instead of raising a FileNotFoundError
-        # to prevent the server from crashing. The error is logged to the console.
-        return []
+    Returns:
+        The new snapshot version, or None if nothing changed.
+    """
+    mirror = get_pass_mirror()
+    snapshot = current_snapshot()
+    if snapshot is not None and snapshot.generation == mirror.rollup_generation():
+        return None
+    columns = mirror.export_receipts()
+    version = write_snapshot(columns)
+    print(
+        f"[SNAPSHOT] Wrote {version}: {len(columns.receipts['receipt_day'])} "
+        f"receipts, {len(columns.items['item_receipt'])} items"
+    )
+    return version
 
-    scopes = ["https://www.googleapis.com/auth/wallet_object.issuer"]
-    try:
-        creds = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE_PATH, scopes=scopes
-        )
-        service = build("walletobjects", "v1", credentials=creds)
-
-        all_passes = []
-        page_token = None
-        while True:
-            response = (
-                service.genericobject()
-                .list(classId=class_id, token=page_token)
-                .execute()
-            )
-            all_passes.extend(response.get("resources", []))
-            page_token = response.get("pagination", {}).get("nextPageToken")
-            if not page_token:
-                break
-
-        print(f" Successfully fetched {len(all_passes)} passes for class {class_id}.")
-        return all_passes
-
-    except HttpError as e:
-        print(f" API Error for class {class_id}: {e.reason}")
-        print(
-            "Please ensure your service account has permissions in the Google Wallet Console."
-        )
-        return []  # Return empty list on API error
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return []
 
+def sync_pass_mirror_and_snapshot():
+    """Reconcile every mirrored class, then refresh the receipt snapshot."""
+    sync_pass_mirror_classes(_mirrored_class_ids())
+    refresh_receipt_snapshot()
 
-def process_passes_for_period(
-    passes: List[Dict[str, Any]], period: str
-) -> Tuple[List[Dict[str, Any]], float]:
+
+def fresh_receipt_snapshot():
+    """
+    The live receipt snapshot if it matches the mirror's current rollups,
+    else None (passes were written since the last sync job).
     """
-    Filters passes based on a time period and calculates the total expenditure.
-    This is an adaptation of your original `get_passes_and_expenditure` function.
+    snapshot = current_snapshot()
+    if snapshot is None:
+        return None
+    if snapshot.generation != get_pass_mirror().rollup_generation():
+        return None
+    return snapshot
 
-    Args:
-        passes: A list of pass objects to process.
-        period: The time period for filtering ('daily', 'weekly', 'monthly', 'yearly').
 
-    Returns:
-        A tuple containing the list of filtered passes and the calculated total expenditure.
+def start_pass_mirror_sync():
+    """Start the periodic background reconcile of the pass mirror (idempotent)."""
+    if JOBS_ON_START:
+        # The scheduler runs the sync as its "sync_pass_mirror" job
+        return
+    get_pass_mirror().start_reconciler(sync_pass_mirror_and_snapshot)
+
+
+def request_user_id() -> str:
     """
-    print(passes)
-    valid_periods = ["daily", "weekly", "monthly", "yearly"]
-    period = period.lower()
-    if period not in valid_periods:
-        # In a real app, you might want more robust error handling
-        raise ValueError(f"Invalid period '{period}'. Must be one of {valid_periods}.")
+    User whose passes a request reads or creates: the userId query parameter
+    or JSON body field, else the default user.
+    """
+    user_id = request.args.get("userId")
+    if not user_id:
+        body = request.get_json(force=True, silent=True)
+        user_id = body.get("userId") if isinstance(body, dict) else None
+    return str(user_id) if user_id else DEFAULT_USER_ID
 
-    filtered_passes = []
-    total_expenditure = 0.0
-    today = datetime.now().date()
 
-    for p in passes:
-        # Using .get() with a default empty dict to prevent KeyErrors
-        text_modules = p.get("textModulesData", [])
-        print(text_modules)
-        date_module = next(
-            (m for m in text_modules if m.get("id") == "DATE_MODULE"), None
-        )
-        total_module = next(
-            (m for m in text_modules if m.get("id") == "TOTAL_MODULE"), None
+def get_all_passes_for_classes(
+    class_suffixes: List[str], user_id: str = DEFAULT_USER_ID
+) -> List[Dict[str, Any]]:
+    """
+    Helper function to get one user's passes from a list of class suffixes.
+    Reads the user's partition of the local pass mirror; a class that was
+    never synced is fetched from the Wallet API once first. Listings are
+    cached per class and user for PASS_CACHE_TTL_SECONDS and dropped whenever
+    we write to that class.
+    """
+    return [p for passes in _class_pass_lists(class_suffixes, user_id) for p in passes]
+
+
+def ensure_pass_mirror(class_suffixes: List[str]) -> List[str]:
+    """
+    Makes sure the pass mirror holds the given classes, fetching any class
+    that was never synced, and returns their full class IDs.
+    """
+    mirror = get_pass_mirror()
+    class_ids = [f"{issuer_id}.{suffix}" for suffix in class_suffixes]
+    unsynced = [c for c in class_ids if mirror.last_synced(c) is None]
+    sync_pass_mirror_classes(unsynced)
+    start_pass_mirror_sync()
+    return class_ids
+
+
+def _class_pass_lists(
+    class_suffixes: List[str], user_id: str
+) -> List[List[Dict[str, Any]]]:
+    mirror = get_pass_mirror()
+    class_ids = ensure_pass_mirror(class_suffixes)
+    return [
+        pass_listing_cache.get(
+            class_id, lambda: mirror.list_passes([class_id], user_id), user_id
         )
+        for class_id in class_ids
+    ]
 
-        if not date_module or not total_module:
-            continue
 
-        try:
-            # Assuming date is in 'YYYY-MM-DD' and total is like '$ 123.45'
-            pass_date = datetime.strptime(
-                date_module.get("body"), "%Y-%m-%d"
-            ).date()
-            amount_str = total_module.get("body", "").split()[-1]
-            amount = float(amount_str)
-        except (ValueError, TypeError, IndexError):
-            # Skip pass if date or amount format is incorrect
-            continue
-        print(today.year)
-        match = False
-        if period == "daily" and pass_date == today:
-            match = True
-        elif (
-            period == "weekly"
-            and (today - pass_date).days < 7
-            and pass_date.isocalendar()[1] == today.isocalendar()[1]
-        ):
-            match = True
-        elif (
-            period == "monthly"
-            and pass_date.year == today.year
-            and pass_date.month == today.month
-        ):
-            match = True
-        elif period == "yearly" and pass_date.year == today.year:
-            match = True
+def get_period_rollup(
+    period: str, class_suffixes: List[str], today=None, user_id=DEFAULT_USER_ID
+) -> RangeTotals:
+    """
+    Totals for a reporting period (see expenditure_engine.PERIODS), read from
+    one user's daily rollups of the categories behind class_suffixes.
+    Costs O(days in the period) regardless of the number of passes.
+    """
+    start, end = period_bounds(period, today or datetime.now().date())
+    categories = [category_for_class(f"{issuer_id}.{s}") for s in class_suffixes]
+    return get_pass_mirror().rollup_totals(user_id, start, end, categories)
+
+
+def get_item_anomalies(
+    period: str, today=None, user_id=DEFAULT_USER_ID
+) -> List[Dict[str, Any]]:
+    """
+    Receipt items a user bought in a reporting period whose price was an
+    outlier against the item's history when the receipt was mirrored.
+    """
+    start, end = period_bounds(period, today or datetime.now().date())
+    return get_pass_mirror().item_anomalies(user_id, start, end)
 
-        if match:
-            filtered_passes.append(p)
-            total_expenditure += amount
 
-    return filtered_passes, round(total_expenditure, 2)
+# Frames kept for the most recently used users
+EXPENDITURE_FRAME_CACHE_SIZE = int(os.getenv("EXPENDITURE_FRAME_CACHE_SIZE", "64"))
 
+# Columnar frames keyed by user and class suffixes, together with the cached
+# listings they were built from; reused for as long as those listings stay
+# cached.
+_expenditure_frames: Dict[Tuple[str, ...], Tuple[list, list, ExpenditureFrame]] = (
+    OrderedDict()
+)
+_expenditure_frames_lock = threading.Lock()
 
-def get_all_passes_for_classes(class_suffixes: List[str]) -> List[Dict[str, Any]]:
-    """Helper function to fetch all passes from a list of class suffixes."""
-    all_passes = []
-    for suffix in class_suffixes:
-        full_class_id = f"{issuer_id}.{suffix}"
-        passes = fetch_wallet_passes(full_class_id)
-        all_passes.extend(passes)
-    return all_passes
+
+def get_expenditure_frame(
+    class_suffixes: List[str], user_id: str = DEFAULT_USER_ID
+) -> Tuple[List[Dict[str, Any]], ExpenditureFrame]:
+    """
+    Returns one user's passes of the given classes and an ExpenditureFrame
+    over them. The frame is rebuilt only when one of the listings changed.
+
+    Returns:
+        A tuple of the pass list and its frame; PeriodStats.positions index
+        into that list.
+    """
+    key = (user_id, *class_suffixes)
+    lists = _class_pass_lists(class_suffixes, user_id)
+    with _expenditure_frames_lock:
+        cached = _expenditure_frames.get(key)
+        # Holding the lists in the cache entry keeps their ids from being reused
+        if cached is not None and len(cached[0]) == len(lists):
+            if all(old is new for old, new in zip(cached[0], lists)):
+                _expenditure_frames.move_to_end(key)
+                return cached[1], cached[2]
+    all_passes = [p for passes in lists for p in passes]
+    frame = ExpenditureFrame(parse_passes(all_passes))
+    with _expenditure_frames_lock:
+        _expenditure_frames[key] = (lists, all_passes, frame)
+        _expenditure_frames.move_to_end(key)
+        while len(_expenditure_frames) > EXPENDITURE_FRAME_CACHE_SIZE:
+            _expenditure_frames.popitem(last=False)
+    return all_passes, frame
 
 
 # --- GET API for expenditure summary with filter ---
@@ -669,88 +1042,33 @@ def get_expenditure_summary():
             400,
         )
 
-    # Fetch all passes
-    all_passes = get_all_passes_for_classes(CLASS_SUFFIXES)
-    if not all_passes:
+    # Make sure the mirror holds the passes, then read the daily rollups
+    user_id = request_user_id()
+    class_ids = ensure_pass_mirror(CLASS_SUFFIXES)
+    if not get_pass_mirror().count_passes(class_ids, user_id):
         return jsonify({"error": "Could not fetch any passes."}), 500
 
-    # Filter passes and calculate totalSpent
-    filtered_passes, total_spent = process_passes_for_period(all_passes, filter_period)
-    total_passes = len(filtered_passes)
+    stats = get_period_rollup(filter_period, CLASS_SUFFIXES, user_id=user_id)
+    return jsonify(build_expenditure_summary(stats))
 
-    # Calculate average passes per day
-    if total_passes == 0:
-        avg_passes_per_day = 0
-    else:
-        # Find unique days in filtered passes
-        days = set()
-        for p in filtered_passes:
-            text_modules = p.get("textModulesData", [])
-            date_module = next(
-                (m for m in text_modules if m.get("id") == "DATE_MODULE"), None
-            )
-            if date_module:
-                days.add(date_module.get("body"))
-        avg_passes_per_day = round(total_passes / max(len(days), 1), 2)
-
-    # Category data: group by class prefix (e.g., GroceryClass -> groceries)
-    class_suffix_to_category = {
-        "GroceryClass": "groceries",
-        "TravelClass": "travel",
-        "HealthClass": "health",
-        "EntertainmentClass": "entertainment",
-        "EducationClass": "education",
-        # Add more mappings as needed
-    }
-    category_totals = {}
-    for p in filtered_passes:
-        # Get class suffix from classId (e.g., issuer_id.GroceryClass)
-        class_id = p.get("classId", "")
-        class_suffix = None
-        if "." in class_id:
-            parts = class_id.split(".")
-            if len(parts) >= 2:
-                class_suffix = parts[1]
-        category = class_suffix_to_category.get(class_suffix, class_suffix or "Unknown")
-        total_module = next(
-            (m for m in p.get("textModulesData", []) if m.get("id") == "TOTAL_MODULE"),
-            None,
-        )
-        if total_module:
-            try:
-                amount_str = total_module.get("body", "").split()[-1]
-                amount = float(amount_str)
-            except Exception:
-                amount = 0.0
-            category_totals[category] = category_totals.get(category, 0) + amount
-
-    import re
-
-    category_data = []
-    print(category_totals)
-    for name in class_suffix_to_category.keys():
-        raw_amount = category_totals.get(class_suffix_to_category[name], 0)
-        # Ensure amount is always a float
-        if isinstance(raw_amount, str):
-            amount_str = re.sub(r"[^\d\.]", "", raw_amount)
-            try:
-                amount = float(amount_str) if amount_str else 0.0
-            except Exception:
-                amount = 0.0
-        else:
-            amount = float(raw_amount)
-        category_data.append({"name": class_suffix_to_category[name], "amount": amount})
-    total_categories = len(category_data)
 
-    return jsonify(
-        {
-            "totalSpent": round(total_spent, 2),
-            "totalPasses": total_passes,
-            "averagePassesPerDay": avg_passes_per_day,
-            "totalCategories": total_categories,
-            "categoryData": category_data,
-        }
-    )
+def build_expenditure_summary(stats) -> Dict[str, Any]:
+    """
+    Shapes period totals (rollup RangeTotals or engine PeriodStats) into the
+    /expenditure/summary response.
+    """
+    # Category data: group by class suffix (e.g., GroceryClass -> groceries)
+    category_data = [
+        {"name": category, "amount": stats.category_totals.get(category, 0.0)}
+        for category in CLASS_SUFFIX_TO_CATEGORY.values()
+    ]
+    return {
+        "totalSpent": round(stats.total, 2),
+        "totalPasses": stats.count,
+        "averagePassesPerDay": stats.average_per_day,
+        "totalCategories": len(category_data),
+        "categoryData": category_data,
+    }
 
 
 # --- API to compare expenditure for this month and previous month ---
@@ -760,84 +1078,148 @@ def compare_monthly_expenditure():
     API Endpoint: Compares expenditure for this month and previous month and returns percentage change in savings.
     """
     print("Received request for /expenditure/monthly-comparison")
-    all_passes = get_all_passes_for_classes(CLASS_SUFFIXES)
-    if not all_passes:
+    user_id = request_user_id()
+    class_ids = ensure_pass_mirror(CLASS_SUFFIXES)
+    if not get_pass_mirror().count_passes(class_ids, user_id):
         return (
             jsonify({"error": "Could not fetch any passes. Check logs for details."}),
             500,
         )
 
     today = datetime.now().date()
-    this_month = today.month
-    this_year = today.year
-    # Calculate previous month and year
-    if this_month == 1:
-        prev_month = 12
-        prev_year = this_year - 1
-    else:
-        prev_month = this_month - 1
-        prev_year = this_year
-
-    # Helper to filter passes for a given month/year
-    def filter_passes_for_month(passes, year, month):
-        filtered = []
-        total = 0.0
-        for p in passes:
-            text_modules = p.get("textModulesData", [])
-            date_module = next(
-                (m for m in text_modules if m.get("id") == "DATE_MODULE"), None
-            )
-            total_module = next(
-                (m for m in text_modules if m.get("id") == "TOTAL_MODULE"), None
-            )
-            if not date_module or not total_module:
-                continue
-            try:
-                pass_date = datetime.datetime.strptime(
-                    date_module.get("body"), "%Y-%m-%d"
-                ).date()
-                amount_str = total_module.get("body", "").split()[-1]
-                amount = float(amount_str)
-            except (ValueError, TypeError, IndexError):
-                continue
-            if pass_date.year == year and pass_date.month == month:
-                filtered.append(p)
-                total += amount
-        return filtered, round(total, 2)
-
-    passes_this_month, total_this_month = filter_passes_for_month(
-        all_passes, this_year, this_month
-    )
-    passes_prev_month, total_prev_month = filter_passes_for_month(
-        all_passes, prev_year, prev_month
-    )
+    this_month = get_period_rollup("monthly", CLASS_SUFFIXES, today, user_id)
+    prev_month = get_period_rollup("previous_month", CLASS_SUFFIXES, today, user_id)
+    return jsonify(build_monthly_comparison(this_month, prev_month, today))
+
+
+def build_monthly_comparison(this_month, prev_month, today) -> Dict[str, Any]:
+    """Shapes this and last month's totals into the monthly-comparison response."""
+    this_month_start, _ = period_bounds("monthly", today)
+    prev_month_start, _ = period_bounds("previous_month", today)
+    total_this_month = this_month.total
+    total_prev_month = prev_month.total
 
     # Calculate percentage change in savings (decrease in expenditure means increase in savings)
-    if total_prev_month == 0:
-        percent_change = None
-    else:
-        percent_change = (
-            (total_prev_month - total_this_month) / total_prev_month
-        ) * 100
+    change = percent_change(total_prev_month, total_this_month)
+    percent_change_in_savings = None if change is None else -change
 
-    result = {
+    return {
         "this_month": {
-            "year": this_year,
-            "month": this_month,
+            "year": this_month_start.year,
+            "month": this_month_start.month,
             "total_expenditure": total_this_month,
-            "pass_count": len(passes_this_month),
+            "pass_count": this_month.count,
         },
         "previous_month": {
-            "year": prev_year,
-            "month": prev_month,
+            "year": prev_month_start.year,
+            "month": prev_month_start.month,
             "total_expenditure": total_prev_month,
-            "pass_count": len(passes_prev_month),
+            "pass_count": prev_month.count,
         },
-        "percent_change_in_savings": percent_change,
+        "percent_change_in_savings": percent_change_in_savings,
     }
-    return jsonify(result)
 
 
+# Upper bound on buckets per time-series response
+MAX_SERIES_BUCKETS = 1000
+
+
+# --- GET API for a bucketed spending time series ---
+@app.route("/expenditure/timeseries", methods=["GET"])
+def get_expenditure_timeseries():
+    """
+    Returns a spending series for charts, bucketed by day, week or month.
+
+    Query params:
+        bucket: 'day' (default), 'week' (Monday to Sunday) or 'month'.
+        start, end: Inclusive YYYY-MM-DD range; defaults to the last 30 days,
+            12 weeks or 12 months ending today.
+        category: Optional category, or several separated by commas.
+        merchant: Optional merchant name (case-insensitive).
+        tz: IANA time zone that decides what "today" is (default: server).
+        userId: Whose passes to chart (default: the default user).
+
+    The series is read from the daily rollups, so its cost depends on the
+    number of days in the range, not on the number of passes.
+    """
+    bucket = request.args.get("bucket", "day").lower()
+    if bucket not in BUCKETS:
+        return (
+            jsonify(
+                {"error": f"Invalid bucket '{bucket}'. Must be one of {list(BUCKETS)}"}
+            ),
+            400,
+        )
+
+    tz_name = request.args.get("tz")
+    try:
+        tz = ZoneInfo(tz_name) if tz_name else None
+    except (ZoneInfoNotFoundError, ValueError):
+        return jsonify({"error": f"Unknown time zone '{tz_name}'."}), 400
+    today = datetime.now(tz).date()
+
+    try:
+        end = (
+            datetime.strptime(request.args["end"], "%Y-%m-%d").date()
+            if request.args.get("end")
+            else today
+        )
+        if request.args.get("start"):
+            start = datetime.strptime(request.args["start"], "%Y-%m-%d").date()
+        elif bucket == "day":
+            start = end - timedelta(days=29)
+        elif bucket == "week":
+            start = bucket_start(end, "week") - timedelta(weeks=11)
+        else:
+            start = bucket_start(end, "month")
+            for _ in range(11):
+                start = bucket_start(start - timedelta(days=1), "month")
+    except ValueError:
+        return jsonify({"error": "start and end must be YYYY-MM-DD dates."}), 400
+    if start > end:
+        return jsonify({"error": "start must not be after end."}), 400
+    end_exclusive = end + timedelta(days=1)
+    if count_buckets(start, end_exclusive, bucket) > MAX_SERIES_BUCKETS:
+        return (
+            jsonify({"error": f"Range spans more than {MAX_SERIES_BUCKETS} buckets."}),
+            400,
+        )
+
+    if request.args.get("category"):
+        categories = [
+            c.strip() for c in request.args["category"].split(",") if c.strip()
+        ]
+    else:
+        categories = [category_for_class(f"{issuer_id}.{s}") for s in CLASS_SUFFIXES]
+    merchant = request.args.get("merchant") or None
+
+    ensure_pass_mirror(CLASS_SUFFIXES)
+    rows = get_pass_mirror().rollup_series(
+        request_user_id(), start, end_exclusive, categories, merchant
+    )
+    series = bucket_series(rows, start, end_exclusive, bucket)
+    total = round(sum(b["total"] for b in series), 2)
+    category_totals = {}
+    for b in series:
+        for name, amount in b["categories"].items():
+            category_totals[name] = round(category_totals.get(name, 0.0) + amount, 2)
+
+    return jsonify(
+        {
+            "bucket": bucket,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "timezone": tz_name or str(datetime.now().astimezone().tzinfo),
+            "filters": {"categories": categories, "merchant": merchant},
+            "series": series,
+            "totalSpent": total,
+            "totalPasses": sum(b["count"] for b in series),
+            "averagePerBucket": round(total / len(series), 2) if series else 0,
+            "maxBucketTotal": max((b["total"] for b in series), default=0),
+            "categoryTotals": category_totals,
+        }
+    )
+
 
 # In-memory storage for verification codes (in production, use Redis or database)
 verification_codes = {}
@@ -1073,125 +1455,162 @@ def check_verification():
         return jsonify({"error": "Internal server error"}), 500
 
 
-def generate_insights_data():
+def budget_alert_message(category: str, spent: float, monthly_limit: float) -> str:
+    """Alert text for a category at or past its budget, warning text below it."""
+    if spent > monthly_limit:
+        return f"Alert: You have exceeded your monthly {category} budget of ₹{monthly_limit}. Total spent: ₹{spent}."
+    return f"Warning: You have used {spent/monthly_limit*100:.1f}% of your {category} budget."
+
+
+def compute_spending_insights(
+    week,
+    prev_week_total: float,
+    budget_status: List[Dict[str, Any]],
+    week_anomalies: List[Dict[str, Any]],
+) -> Dict[str, Any]:
     """
-    Generates insights data using Gemini API and Google Wallet passes.
-    Returns a Python dict (not a Flask response).
+    Computes the non-LLM insights: weekly trend, top category, budget alert and
+    item anomaly.
+
+    Args:
+        week: This week's totals (rollup RangeTotals or engine PeriodStats).
+        prev_week_total: Total spent in the seven days before today.
+        budget_status: This month's spending against each budget of the user
+            (see PassMirror.budget_status).
+        week_anomalies: This week's anomalous item prices, scored against
+            each item's history (see get_item_anomalies).
     """
-    all_passes = []
-    for suffix in CLASS_SUFFIXES:
-        full_class_id = f"{issuer_id}.{suffix}"
-        class_passes = fetch_wallet_passes(full_class_id)
-        all_passes.extend(class_passes)
     # --- Calculate Weekly Spending Trend ---
-    # Get weekly and previous weekly expenditure
-    all_passes = all_passes  # already fetched above
-    filtered_week, total_week = process_passes_for_period(all_passes, "weekly")
-    # Calculate previous week
-    today = datetime.now().date()
-    prev_week_start = today - timedelta(days=7)
-    prev_week_end = today - timedelta(days=1)
-    prev_week_passes = []
-    prev_week_total = 0.0
-    for p in all_passes:
-        text_modules = p.get("textModulesData", [])
-        date_module = next((m for m in text_modules if m.get("id") == "DATE_MODULE"), None)
-        total_module = next((m for m in text_modules if m.get("id") == "TOTAL_MODULE"), None)
-        if not date_module or not total_module:
-            continue
-        try:
-            pass_date = datetime.strptime(date_module.get("body"), "%Y-%m-%d").date()
-            amount_str = total_module.get("body", "").split()[-1]
-            amount = float(amount_str)
-        except Exception:
-            continue
-        if prev_week_start <= pass_date <= prev_week_end:
-            prev_week_passes.append(p)
-            prev_week_total += amount
     weekly_trend = None
     if prev_week_total > 0:
-        weekly_trend = int(((total_week - prev_week_total) / prev_week_total) * 100)
+        weekly_trend = int(percent_change(prev_week_total, week.total))
     # --- Top Spending Category ---
-    category_totals = {}
-    class_suffix_to_category = {
-        "GroceryClass": "groceries",
-        "TravelClass": "travel",
-        "HealthClass": "health",
-        "EntertainmentClass": "entertainment",
-        "EducationClass": "education",
-    }
-    for p in filtered_week:
-        class_id = p.get("classId", "")
-        class_suffix = None
-        if "." in class_id:
-            parts = class_id.split(".")
-            if len(parts) >= 2:
-                class_suffix = parts[1]
-        category = class_suffix_to_category.get(class_suffix, class_suffix or "Unknown")
-        total_module = next((m for m in p.get("textModulesData", []) if m.get("id") == "TOTAL_MODULE"), None)
-        if total_module:
-            try:
-                amount_str = total_module.get("body", "").split()[-1]
-                amount = float(amount_str)
-            except Exception:
-                amount = 0.0
-            category_totals[category] = category_totals.get(category, 0) + amount
+    category_totals = {k: v for k, v in week.category_totals.items() if v}
     top_category = max(category_totals, key=category_totals.get) if category_totals else None
     # --- Monthly Budget Alert ---
-    # Assume a default budget for groceries (can be replaced with user config)
-    monthly_budget = 5000.0
-    filtered_month, total_month = process_passes_for_period(all_passes, "monthly")
-    groceries_spent = 0.0
-    for p in filtered_month:
-        class_id = p.get("classId", "")
-        class_suffix = None
-        if "." in class_id:
-            parts = class_id.split(".")
-            if len(parts) >= 2:
-                class_suffix = parts[1]
-        category = class_suffix_to_category.get(class_suffix, class_suffix or "Unknown")
-        if category == "groceries":
-            total_module = next((m for m in p.get("textModulesData", []) if m.get("id") == "TOTAL_MODULE"), None)
-            if total_module:
-                try:
-                    amount_str = total_module.get("body", "").split()[-1]
-                    amount = float(amount_str)
-                except Exception:
-                    amount = 0.0
-                groceries_spent += amount
+    # The budget closest to (or furthest past) its limit, once above 80%
+    over = [b for b in budget_status if (b["percent_used"] or 0) > 80]
     budget_alert = None
-    if groceries_spent > monthly_budget:
-        budget_alert = f"Alert: You have exceeded your monthly groceries budget of ₹{monthly_budget}. Total spent: ₹{groceries_spent}."
-    elif groceries_spent > 0.8 * monthly_budget:
-        budget_alert = f"Warning: You have used {groceries_spent/monthly_budget*100:.1f}% of your groceries budget."
+    if over:
+        worst = max(over, key=lambda b: b["percent_used"])
+        budget_alert = budget_alert_message(
+            worst["category"], worst["spent"], worst["monthly_limit"]
+        )
     # --- Spending Anomaly ---
-    # Find unusually high or low expenditures in weekly data
-    item_spending = {}
-    for p in filtered_week:
-        items = []
-        for tm in p.get("textModulesData", []):
-            if tm.get("id") == "ITEMS_MODULE":
-                try:
-                    items = json.loads(tm.get("body", "[]"))
-                except Exception:
-                    items = []
-        for item in items:
-            desc = item.get("description", "Unknown")
-            price = item.get("price", 0.0)
-            item_spending[desc] = item_spending.get(desc, 0.0) + price
+    # Item prices far from the item's long-term average this week
+    high = list(dict.fromkeys(a["item"] for a in week_anomalies if a["z_score"] > 0))
+    low = list(dict.fromkeys(a["item"] for a in week_anomalies if a["z_score"] < 0))
     anomaly = None
-    if item_spending:
-        avg = sum(item_spending.values()) / len(item_spending)
-        high = [k for k, v in item_spending.items() if v > 2 * avg]
-        low = [k for k, v in item_spending.items() if v < 0.5 * avg]
-        if high:
-            anomaly = f"Unusually high spending on: {', '.join(high)}."
-        elif low:
-            anomaly = f"Unusually low spending on: {', '.join(low)}."
+    if high:
+        anomaly = f"Unusually high spending on: {', '.join(high)}."
+    elif low:
+        anomaly = f"Unusually low spending on: {', '.join(low)}."
+    return {
+        "weekly_spending_trend": weekly_trend,
+        "top_spending_category": top_category,
+        "monthly_budget_alert": budget_alert,
+        "spending_anomaly": anomaly,
+    }
+
+
+def compute_insights_metrics(
+    user_id: str = DEFAULT_USER_ID,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Phase one of a user's insights: the locally computed metrics, available
+    in milliseconds and independent of the model.
+
+    Returns:
+        The metrics and the pass snapshot they were computed from, which the
+        narrative (phase two) reuses.
+    """
+    all_passes = get_all_passes_for_classes(CLASS_SUFFIXES, user_id)
+    today = datetime.now().date()
+    # Weekly trend comes from the daily rollups, the budget alert from the
+    # monthly rollups and the anomaly from the item statistics
+    computed = compute_spending_insights(
+        get_period_rollup("weekly", CLASS_SUFFIXES, today, user_id),
+        get_period_rollup("previous_week", CLASS_SUFFIXES, today, user_id).total,
+        get_pass_mirror().budget_status(user_id),
+        get_item_anomalies("weekly", today, user_id),
+    )
+    return computed, all_passes
+
+
+def generate_insights_data(user_id: str = DEFAULT_USER_ID):
+    """
+    Generates insights data using Gemini API and Google Wallet passes.
+    Returns a Python dict (not a Flask response). If the model fails, the
+    computed metrics are still returned, with the failure under
+    "narrative_error"; while the precompute job has not produced the
+    narrative yet, they come with "narrative_pending".
+    """
+    computed, all_passes = compute_insights_metrics(user_id)
+    insights = get_llm_insights(all_passes, user_id)
+    if insights is None:
+        return {**computed, "narrative_pending": True}
+    if "error" in insights:
+        return {**computed, "narrative_error": insights["error"]}
+    # Add computed insights to a copy; the narrative may be cached
+    return {**insights, **computed}
+
+
+def insights_digest(user_id: str = DEFAULT_USER_ID) -> str:
+    """Digest of a user's passes of the mirrored classes, keying their insights."""
+    mirror = get_pass_mirror()
+    versions = []
+    for suffix in CLASS_SUFFIXES:
+        versions.extend(mirror.versions(f"{issuer_id}.{suffix}", user_id).items())
+    return pass_set_digest(versions, user_id)
+
+
+def get_llm_insights(
+    all_passes: List[Dict[str, Any]],
+    user_id: str = DEFAULT_USER_ID,
+    generate: bool = not JOBS_ON_START,
+) -> Optional[Dict[str, Any]]:
+    """
+    LLM insights for a user's passes of the mirrored classes, memoized by the
+    digest of their object IDs and versions so unchanged passes never reach
+    the model twice. The digest leaves out the date the feature windows are
+    relative to; INSIGHTS_CACHE_TTL_SECONDS bounds how old they get.
+
+    With generate=False (the default while the scheduler precomputes
+    insights) the model is never called from the request: the insights the
+    precompute job last stored in the pass mirror are returned, possibly from
+    an older set of passes, or None until it has run for the user. The job
+    may have run in another worker, so they are read from the mirror rather
+    than this process's cache.
+    """
+    if not generate:
+        stored = get_pass_mirror().stored_insights(user_id)
+        return stored[1] if stored else None
+    today = datetime.now().date()
+    insights, _ = insights_cache.get(
+        insights_digest(user_id),
+        lambda: generate_llm_insights(all_passes, today),
+        user_id,
+    )
+    return insights
+
+
+def generate_llm_insights(
+    all_passes: List[Dict[str, Any]], today: Optional[date] = None
+) -> Dict[str, Any]:
+    """
+    Asks Gemini for the narrative insights (expenditure tip, perishables,
+    health, recipes). The model gets a compact feature digest of the passes
+    (recent dated items, category totals, top merchants) instead of the raw
+    pass objects. Returns a dict with an "error" key on failure.
+    """
+    features = build_insights_features(
+        parse_passes(all_passes), today or datetime.now().date()
+    )
     # --- LLM Insights ---
     prompt = (
-        "You are an expert data insights provider agent. Analyze the provided list of dictionary. "
-        "It contains details related to some kind of expenditure. Refer to tags (if present): 'items', 'textModulesData' and generate a JSON object with insights on following topics:\n"
+        "You are an expert data insights provider agent. Analyze the provided JSON summary of expenditure. "
+        "It has today's date, category totals and top merchants of the last 30 days, and the dated receipts (with items) of the last 2 weeks. "
+        "Generate a JSON object with insights on following topics:\n"
         "    1. 'expenditure' — a short spending tip or alert.\n"
         "    2. 'perishables' — a list of 2 items about to expire soon (check last 2 weeks' data).\n"
         "    3. 'health' — a tip or reminder about food diversity, freshness or wellness.\n"
@@ -1227,8 +1646,10 @@ def generate_insights_data():
         "}\n"
     )
     try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content([prompt, json.dumps(all_passes)])
+        model = get_gemini_flash()
+        response = model.generate_content(
+            [prompt, features_prompt_input(features, all_passes)]
+        )
         response_text = response.text
         if response_text and response_text.startswith("```json"):
             response_text = (
@@ -1237,11 +1658,8 @@ def generate_insights_data():
         if response_text:
             try:
                 insights = json.loads(response_text)
-                # Add computed insights
-                insights["weekly_spending_trend"] = weekly_trend
-                insights["top_spending_category"] = top_category
-                insights["monthly_budget_alert"] = budget_alert
-                insights["spending_anomaly"] = anomaly
+                if not isinstance(insights, dict):
+                    raise ValueError("expected a JSON object")
                 return insights
             except Exception:
                 return {
@@ -1259,20 +1677,152 @@ def generate_insights_data():
 def get_data_insights():
     """
     POST endpoint to analyze expenditure data using Gemini API and a custom prompt.
+
+    With ?stream=true the response is newline-delimited JSON in two phases:
+    {"phase": "metrics", ...} with the computed metrics as soon as they are
+    ready, then {"phase": "narrative", ...} with the model's sections (or
+    "error") once the model answers. With the job scheduler on, the
+    narrative comes from the precompute job; until it ran for the user the
+    response is 202 with "narrative_pending" (streamed: "pending").
     """
-    insights = generate_insights_data()
-    if "error" in insights:
-        return jsonify(insights), 500
-    return jsonify(insights)
+    user_id = request_user_id()
+    if request.args.get("stream", "false").lower() != "true":
+        data = generate_insights_data(user_id)
+        # Accepted: the precompute job will produce the narrative
+        return jsonify(data), 202 if data.get("narrative_pending") else 200
+
+    computed, all_passes = compute_insights_metrics(user_id)
+
+    def phases():
+        yield json.dumps({**computed, "phase": "metrics"}) + "\n"
+        narrative = get_llm_insights(all_passes, user_id) or {"pending": True}
+        yield json.dumps({**narrative, "phase": "narrative"}) + "\n"
+
+    return Response(
+        stream_with_context(phases()),
+        mimetype="application/x-ndjson",
+        # Keep proxies from buffering phase one until the narrative arrives
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-def send_wallet_notification(issuer_id, object_suffix, message):
+
+@app.route("/api/dashboard", methods=["GET"])
+def get_dashboard():
+    """
+    Everything the dashboard shows on load, computed from one snapshot of the
+    passes: the summary for ?filter= (default monthly), the monthly comparison,
+    weekly trend, top category, budget alert and anomaly.
+
+    The LLM narrative is slow, so it is only included with
+    ?include_insights=true; otherwise fetch it later from /api/data-insights.
+    Pass ?userId= to read that user's passes.
+    """
+    filter_period = request.args.get("filter", "monthly").lower()
+    valid_periods = ["daily", "weekly", "monthly", "yearly"]
+    if filter_period not in valid_periods:
+        return (
+            jsonify(
+                {
+                    "error": f"Invalid filter '{filter_period}'. Must be one of {valid_periods}"
+                }
+            ),
+            400,
+        )
+    include_insights = request.args.get("include_insights", "false").lower() == "true"
+    user_id = request_user_id()
+    today = datetime.now().date()
+
+    class_ids = ensure_pass_mirror(CLASS_SUFFIXES)
+    # The shared memory-mapped snapshot serves the totals when it is current;
+    # otherwise one listing snapshot and one frame serve every section
+    snapshot = None if include_insights else fresh_receipt_snapshot()
+    if snapshot is not None:
+        pass_count = get_pass_mirror().count_passes(class_ids, user_id)
+        categories = [category_for_class(c) for c in class_ids]
+        periods = snapshot.report(user_id, today, categories)
+    else:
+        all_passes, frame = get_expenditure_frame(CLASS_SUFFIXES, user_id)
+        pass_count = len(all_passes)
+        periods = frame.report(today)
+    if not pass_count:
+        return jsonify({"error": "Could not fetch any passes."}), 500
+
+    dashboard = {
+        "summary": build_expenditure_summary(periods[filter_period]),
+        "monthly_comparison": build_monthly_comparison(
+            periods["monthly"], periods["previous_month"], today
+        ),
+        **compute_spending_insights(
+            periods["weekly"],
+            periods["previous_week"].total,
+            get_pass_mirror().budget_status(user_id),
+            get_item_anomalies("weekly", today, user_id),
+        ),
+        "snapshot": {"pass_count": pass_count, "date": today.isoformat()},
+    }
+    if include_insights:
+        dashboard["insights"] = get_llm_insights(all_passes, user_id) or {
+            "pending": True
+        }
+    return jsonify(dashboard)
+
+
+@app.route("/api/query", methods=["POST"])
+def query_expenditure():
+    """
+    Ad-hoc analytics over one user's receipts and line items. Expects a JSON
+    query (filters, group_by, metrics, order_by, limit; see
+    utils.spending_query) and an optional userId, e.g.
+    {"filters": {"period": "this quarter"}, "group_by": "merchant", "limit": 5}
+    for the top five merchants of the quarter.
+    """
+    spec = request.get_json(force=True, silent=True)
+    if not isinstance(spec, dict):
+        return jsonify({"error": "Expected a JSON query object."}), 400
+    user_id = request_user_id()
+    ensure_pass_mirror(CLASS_SUFFIXES)
     try:
-        SERVICE_ACCOUNT_FILE_PATH = "gwallet_sa_keyfile.json"
-        creds = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE_PATH,
-            scopes=['https://www.googleapis.com/auth/wallet_object.issuer']
+        result = get_pass_mirror().query(
+            user_id, {k: v for k, v in spec.items() if k != "userId"}
         )
-        service = build('walletobjects', 'v1', credentials=creds)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+
+@app.route("/api/budgets", methods=["GET"])
+def get_budgets():
+    """This month's spending against each budget of ?userId= (defaults included)."""
+    return jsonify({"budgets": get_pass_mirror().budget_status(request_user_id())})
+
+
+@app.route("/api/budgets", methods=["PUT"])
+def set_budget():
+    """
+    Sets a monthly budget. Expects a JSON body with category, monthly_limit
+    and an optional userId. The limit applies from the current month on;
+    crossing 80% or 100% of it sends one notification per month.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    category = data.get("category")
+    categories = sorted(set(CLASS_SUFFIX_TO_CATEGORY.values()))
+    if category not in categories:
+        return jsonify({"error": f"category must be one of {categories}."}), 400
+    try:
+        monthly_limit = float(data.get("monthly_limit"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "monthly_limit must be a number."}), 400
+    if monthly_limit <= 0:
+        return jsonify({"error": "monthly_limit must be positive."}), 400
+
+    user_id = request_user_id()
+    mirror = get_pass_mirror()
+    mirror.set_budget(user_id, category, monthly_limit)
+    return jsonify({"budgets": mirror.budget_status(user_id)})
+
+def send_wallet_notification(issuer_id, object_suffix, message):
+    try:
+        service = get_wallet_service(SERVICE_ACCOUNT_FILE_PATH)
         notification_body = {
             "objectId": f"{issuer_id}.{object_suffix}",
             "notification": {
@@ -1295,32 +1845,15 @@ def send_wallet_notification(issuer_id, object_suffix, message):
 def create_insight_pass():
     """
     Creates a Google Wallet generic pass for a single insight.
-    Expects a JSON body with keys: type (e.g. 'expenditure', 'perishables', 'health', 'recipes'), description, and optional details.
+    Expects a JSON body with keys: type (e.g. 'expenditure', 'perishables', 'health', 'recipes'), description, and optional details and userId.
     """
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "gwallet_sa_keyfile.json"
     data = request.get_json(force=True)
     issuer_id = os.getenv("ISSUER_ID")
     class_suffix = "InsightClass"
     insight_type = data.get("type", "insight")
     description = data.get("description", "")
     details = data.get("details", {})
-    # 1. Search for existing pass
-    full_class_id = f"{issuer_id}.{class_suffix}"
-    existing_passes = fetch_wallet_passes(full_class_id)
-    '''for p in existing_passes:
-        for tm in p.get("textModulesData", []):
-            if (
-                tm.get("header", "").lower() == insight_type.lower()
-            ):
-                # Found a matching pass, reuse it
-                return jsonify({
-                    "object_suffix": p.get("id", ""),
-                    "class_suffix": class_suffix,
-                    "object_data": p,
-                    "reused": True
-                })'''
-
-    # 2. If not found, create new pass
+    # Create a new pass
     object_suffix = f"{insight_type}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
     text_modules = [
         {
@@ -1384,10 +1917,17 @@ def create_insight_pass():
     }
 
     # Generate wallet link for the pass
-    wallet_service = DemoGeneric()
-    object_suffix = wallet_service.create_object(
-        issuer_id, class_suffix, object_suffix, object_data
-    )
+    wallet_service = get_wallet_client(SERVICE_ACCOUNT_FILE_PATH)
+    try:
+        claimed = get_pass_mirror().claim_owner([object_data["id"]], request_user_id())
+    except OwnerConflict:
+        return jsonify({"error": "This insight pass belongs to another user."}), 409
+    try:
+        object_suffix = wallet_service.create_object(
+            issuer_id, class_suffix, object_suffix, object_data
+        )
+    finally:
+        get_pass_mirror().release_owner(claimed)
     # If your wallet creation method requires object_data, pass it here
     # For now, keep the same API as before
     save_link = wallet_service.create_jwt_existing_objects(
@@ -1399,5 +1939,141 @@ def create_insight_pass():
         "class_suffix": class_suffix,
         "reused": False
     })
+# --- Background jobs ---
+INSIGHTS_PRECOMPUTE_SECONDS = float(os.getenv("INSIGHTS_PRECOMPUTE_SECONDS", "900"))
+INSIGHT_PASS_EXPIRY_SECONDS = float(os.getenv("INSIGHT_PASS_EXPIRY_SECONDS", "3600"))
+INSIGHT_PASS_TTL_DAYS = int(os.getenv("INSIGHT_PASS_TTL_DAYS", "7"))
+INSIGHT_CLASS_SUFFIX = "InsightClass"
+BUDGET_NOTIFY_WORKERS = int(os.getenv("BUDGET_NOTIFY_WORKERS", "2"))
+
+
+def _insight_pass_created(pass_obj: Dict[str, Any]) -> Optional[datetime]:
+    """Creation time encoded in an insight pass ID (see create_insight_pass)."""
+    match = re.search(r"_(\d{14})$", pass_obj.get("id", ""))
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d%H%M%S")
+
+
+def _active_insight_passes(user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    class_id = f"{issuer_id}.{INSIGHT_CLASS_SUFFIX}"
+    sync_pass_mirror(class_id)
+    return [
+        p
+        for p in get_pass_mirror().list_passes([class_id], user_id)
+        if p.get("state", "").upper() == "ACTIVE"
+    ]
+
+
+def notify_newest_insight_pass(user_id: str, message: str) -> bool:
+    """
+    Sends a wallet message to the user's most recently created active
+    insight pass. Returns False if the user has none.
+    """
+    dated = [p for p in _active_insight_passes(user_id) if _insight_pass_created(p)]
+    if not dated:
+        return False
+    newest = max(dated, key=_insight_pass_created)
+    send_wallet_notification(issuer_id, newest["id"].split(".", 1)[1], message)
+    return True
+
+
+# A burst of budget events (e.g. a bulk import) queues here rather than
+# starting one thread, and one Wallet sync, per event
+_budget_notifier = ThreadPoolExecutor(
+    max_workers=BUDGET_NOTIFY_WORKERS, thread_name_prefix="budget-notification"
+)
+
+
+def _send_budget_notification(user_id: str, message: str):
+    try:
+        if not notify_newest_insight_pass(user_id, message):
+            print(f"[BUDGETS] No active insight pass to notify for {user_id}")
+    except Exception as e:
+        print(f"[BUDGETS] Budget notification for {user_id} failed: {e}")
+
+
+def _notify_budget_event(event: Dict[str, Any]):
+    """Sends a budget event to the user's wallet without holding up the write."""
+    message = budget_alert_message(
+        event["category"], event["spent"], event["monthly_limit"]
+    )
+    _budget_notifier.submit(_send_budget_notification, event["user_id"], message)
+
+
+register_budget_listener(_notify_budget_event)
+
+
+def precompute_insights_job():
+    """
+    Rebuilds the expenditure frame and generates the LLM insights for every
+    user with passes, storing them in the pass mirror so requests in any
+    worker read them instead of waiting on the model. When a user's passes changed since the
+    last run, their newest active insight pass gets a "New Insights
+    Available" wallet message; insights regenerated only because they
+    expired are not announced.
+    """
+    mirror = get_pass_mirror()
+    class_ids = ensure_pass_mirror(CLASS_SUFFIXES)
+    for user_id in mirror.users():
+        if not mirror.count_passes(class_ids, user_id):
+            continue
+        digest = insights_digest(user_id)
+        all_passes, _ = get_expenditure_frame(CLASS_SUFFIXES, user_id)
+        insights = get_llm_insights(all_passes, user_id, generate=True)
+        if "error" in insights:
+            print(f"[JOBS] Insights for {user_id} not refreshed: {insights['error']}")
+            continue
+        previous = mirror.stored_insights(user_id)
+        mirror.store_insights(user_id, digest, insights)
+        # Nothing to announce the first time or if the passes did not change
+        if previous is None or previous[0] == digest:
+            continue
+        notify_newest_insight_pass(
+            user_id,
+            insights.get("expenditure") or "Open the app to see your latest insights.",
+        )
+
+
+def expire_insight_passes_job():
+    """Expires insight passes created more than INSIGHT_PASS_TTL_DAYS ago."""
+    cutoff = datetime.now() - timedelta(days=INSIGHT_PASS_TTL_DAYS)
+    stale = [
+        p
+        for p in _active_insight_passes()
+        if (_insight_pass_created(p) or cutoff) < cutoff
+    ]
+    wallet_service = get_wallet_client(SERVICE_ACCOUNT_FILE_PATH)
+    for p in stale:
+        wallet_service.expire_object(issuer_id, p["id"].split(".", 1)[1])
+    print(f"[JOBS] Expired {len(stale)} insight passes")
+
+
+register_job(
+    "sync_pass_mirror", sync_pass_mirror_and_snapshot, PASS_MIRROR_SYNC_SECONDS
+)
+register_job(
+    "precompute_insights",
+    precompute_insights_job,
+    INSIGHTS_PRECOMPUTE_SECONDS,
+    first_run_seconds=30,
+)
+register_job(
+    "expire_insight_passes", expire_insight_passes_job, INSIGHT_PASS_EXPIRY_SECONDS
+)
+
+
+@app.route("/api/jobs")
+def get_jobs():
+    """Background job registry with per-job run counts and timings."""
+    return jsonify(job_stats())
+
+
+if JOBS_ON_START:
+    start_scheduler()
+
+if os.getenv("WARMUP_ON_START", "false").lower() == "true":
+    start_background_warmup()
+
 if __name__ == "__main__":
     app.run(debug=True, port=PORT)
@@ -0,0 +1,126 @@
+"""
+Cold start benchmark for the backend.
+
+Reports, each measured in a fresh interpreter:
+  * cumulative import time of app.py and the heavy modules it may pull in
+  * time from process start until the first successful GET /health
+
+Usage:
+    python startup_benchmark.py [--runs 3]
+"""
+
+import argparse
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = [
+    "app",
+    "fitz",
+    "PIL.Image",
+    "googleapiclient.discovery",
+    "google.adk.agents",
+    "google.generativeai",
+    "google.cloud.firestore",
+]
+
+
+def measure_import(module_name: str) -> float:
+    """Return the cumulative import time of module_name in seconds (-X importtime)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return float("nan")
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    pattern = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)$")
+    for line in proc.stderr.splitlines():
+        match = pattern.search(line)
+        if match and match.group(2) == module_name:
+            return int(match.group(1)) / 1_000_000
+    return float("nan")
+
+
+def imported_heavy_modules() -> list:
+    """List the heavy modules that are already in sys.modules after `import app`."""
+    code = (
+        "import sys, app\n"
+        f"print(','.join(m for m in {HEAVY_MODULES[1:]!r} if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    out = proc.stdout.strip().splitlines()
+    return out[-1].split(",") if out and out[-1] else []
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_health(timeout: float = 30.0) -> float:
+    """Start `python app.py` and return seconds until /health answers 200."""
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port))
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "app.py"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        # app.py runs the debug reloader, which forks a child server; a new
+        # session lets us stop both together.
+        start_new_session=True,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        return float("nan")
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print("Cumulative import time (best of runs, fresh interpreter each):")
+    for module_name in HEAVY_MODULES:
+        best = min(measure_import(module_name) for _ in range(args.runs))
+        print(f"  {module_name:<28} {best * 1000:9.1f} ms")
+
+    loaded = imported_heavy_modules()
+    print(f"Heavy modules loaded by `import app`: {', '.join(loaded) or 'none'}")
+
+    timings = [measure_first_health() for _ in range(args.runs)]
+    print("Time to first successful /health:")
+    for i, t in enumerate(timings, 1):
+        print(f"  run {i}: {t * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the backend modules the way app.py does ("from utils import ...")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_pass():
+    """Builds a Wallet pass object the way our create endpoints write them."""
+
+    def make(pass_id, day, total, merchant="FreshMart", items="", cls="GroceryClass"):
+        modules = [
+            {"id": "DATE_MODULE", "body": day},
+            {"id": "TOTAL_MODULE", "body": f"USD {total}"},
+            {"id": "MERCHANT_MODULE", "body": merchant},
+        ]
+        if items:
+            modules.append({"id": "ITEMS_MODULE", "body": items})
+        return {
+            "id": f"1.{pass_id}",
+            "classId": f"1.{cls}",
+            "state": "ACTIVE",
+            "textModulesData": modules,
+        }
+
+    return make
+
+
+@pytest.fixture
+def mirror():
+    from utils.pass_mirror import PassMirror
+
+    return PassMirror(":memory:")
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+from utils import budgets
+
+
+@pytest.fixture
+def events(monkeypatch):
+    received = []
+    monkeypatch.setattr(budgets, "_listeners", [received.append])
+    return received
+
+
+def _today():
+    return date.today().isoformat()
+
+
+def test_one_receipt_crossing_both_thresholds_raises_only_the_highest(
+    mirror, make_pass, events
+):
+    mirror.set_budget("default", "groceries", 100)
+    mirror.upsert(make_pass("a", _today(), 70))
+    assert events == []
+
+    mirror.upsert(make_pass("b", _today(), 40))
+
+    assert [e["threshold"] for e in events] == [100]
+    assert events[0]["spent"] == 110
+
+
+def test_each_threshold_fires_once_a_month(mirror, make_pass, events):
+    mirror.set_budget("default", "groceries", 100)
+
+    mirror.upsert(make_pass("a", _today(), 85))
+    mirror.upsert(make_pass("b", _today(), 5))
+    mirror.upsert(make_pass("c", _today(), 20))
+    mirror.upsert(make_pass("d", _today(), 20))
+
+    assert [e["threshold"] for e in events] == [80, 100]
+
+
+def test_crossing_100_first_does_not_raise_80_later(mirror, make_pass, events):
+    mirror.set_budget("default", "groceries", 100)
+    mirror.upsert(make_pass("a", _today(), 120))
+
+    mirror.set_budget("default", "groceries", 140)
+
+    assert [e["threshold"] for e in events] == [100]
+
+
+def test_setting_a_budget_evaluates_existing_spending(mirror, make_pass, events):
+    mirror.upsert(make_pass("a", _today(), 90))
+    assert events == []
+
+    mirror.set_budget("default", "groceries", 100)
+
+    assert [(e["category"], e["threshold"]) for e in events] == [("groceries", 80)]
+
+
+def test_past_months_do_not_raise_events(mirror, make_pass, events):
+    mirror.set_budget("default", "groceries", 100)
+
+    mirror.upsert(make_pass("a", "2001-01-15", 500))
+
+    assert events == []
+
+
+@pytest.mark.parametrize("raw", ["{not json", "[1, 2]", '{"groceries": "lots"}'])
+def test_malformed_defaults_fall_back_to_none(raw):
+    assert budgets._load_budget_defaults(raw) == {}
@@ -0,0 +1,61 @@
+import time
+
+from utils.insights_cache import InsightsCache
+
+
+def test_hit_after_miss():
+    cache = InsightsCache(ttl_seconds=60)
+    calls = []
+    generate = lambda: calls.append(1) or {"expenditure": "a"}
+
+    assert cache.get("d1", generate, "alice") == ({"expenditure": "a"}, "miss")
+    assert cache.get("d1", generate, "alice") == ({"expenditure": "a"}, "hit")
+    assert len(calls) == 1
+
+
+def test_errors_are_not_stored():
+    cache = InsightsCache(ttl_seconds=60)
+    cache.get("d1", lambda: {"error": "boom"}, "alice")
+    assert cache.get("d1", lambda: {"expenditure": "a"}, "alice")[1] == "miss"
+
+
+def test_stale_fallback_never_crosses_users():
+    cache = InsightsCache(ttl_seconds=60, stale_while_revalidate=True)
+    cache.get("alice-1", lambda: {"expenditure": "alice"}, "alice")
+
+    insights, served = cache.get("bob-1", lambda: {"expenditure": "bob"}, "bob")
+
+    assert (insights, served) == ({"expenditure": "bob"}, "miss")
+
+
+def test_stale_fallback_serves_same_user_previous_digest():
+    cache = InsightsCache(ttl_seconds=60, stale_while_revalidate=True)
+    cache.get("alice-1", lambda: {"expenditure": "old"}, "alice")
+    cache.get("bob-1", lambda: {"expenditure": "bob"}, "bob")
+
+    insights, served = cache.get("alice-2", lambda: {"expenditure": "new"}, "alice")
+
+    assert (insights, served) == ({"expenditure": "old"}, "stale")
+    # The background refresh stores the new digest
+    for _ in range(100):
+        if cache.get("alice-2", lambda: {}, "alice")[1] == "hit":
+            break
+        time.sleep(0.01)
+    assert cache.get("alice-2", lambda: {}, "alice") == ({"expenditure": "new"}, "hit")
+
+
+def test_no_fallback_without_partition():
+    cache = InsightsCache(ttl_seconds=60, stale_while_revalidate=True)
+    cache.get("alice-1", lambda: {"expenditure": "alice"}, "alice")
+
+    assert cache.get("other", lambda: {"expenditure": "x"})[1] == "miss"
+
+
+def test_eviction_drops_the_users_fallback():
+    cache = InsightsCache(ttl_seconds=60, stale_while_revalidate=True, maxsize=1)
+    cache.get("alice-1", lambda: {"expenditure": "alice"}, "alice")
+    cache.get("bob-1", lambda: {"expenditure": "bob"}, "bob")
+
+    insights, served = cache.get("alice-2", lambda: {"expenditure": "new"}, "alice")
+
+    assert (insights, served) == ({"expenditure": "new"}, "miss")
@@ -0,0 +1,51 @@
+from datetime import date
+
+from utils import item_stats
+
+
+def _milk(make_pass, pass_id, day, price):
+    return make_pass(pass_id, day, price, items=f"Milk ({price})")
+
+
+def test_price_far_from_history_is_recorded_for_its_pass(mirror, make_pass):
+    mirror.upsert_many(
+        [_milk(make_pass, f"p{i}", f"2026-03-0{i + 1}", 2) for i in range(4)]
+    )
+    mirror.upsert(_milk(make_pass, "spike", "2026-03-09", 9))
+
+    anomalies = mirror.pass_anomalies(["1.spike", "1.p3", "1.unknown"])
+
+    assert anomalies["1.p3"] == anomalies["1.unknown"] == []
+    [spike] = anomalies["1.spike"]
+    assert (spike["item"], spike["price"], spike["usual_price"]) == ("Milk", 9, 2)
+    assert mirror.item_anomalies("default", date(2026, 3, 1), date(2026, 4, 1)) == [
+        spike
+    ]
+
+
+def test_no_anomaly_without_enough_history(mirror, make_pass):
+    mirror.upsert(_milk(make_pass, "a", "2026-03-01", 2))
+    mirror.upsert(_milk(make_pass, "b", "2026-03-02", 20))
+
+    assert mirror.pass_anomalies(["1.b"]) == {"1.b": []}
+
+
+def test_passes_are_folded_in_once(mirror, make_pass):
+    first = _milk(make_pass, "a", "2026-03-01", 2)
+    mirror.upsert(first)
+    mirror.upsert(first)
+
+    (count,) = mirror._conn.execute("SELECT count FROM item_stats").fetchone()
+    assert count == 1
+
+
+def test_rebuild_replays_in_purchase_order(mirror, make_pass):
+    mirror.upsert_many(
+        [_milk(make_pass, f"p{i}", f"2026-03-0{i + 1}", 2 + i) for i in range(5)]
+    )
+    before = mirror._conn.execute("SELECT * FROM item_stats").fetchall()
+
+    mirror.rebuild_item_stats()
+
+    assert mirror._conn.execute("SELECT * FROM item_stats").fetchall() == before
+    assert item_stats.item_key("  Whole   MILK ") == "whole milk"
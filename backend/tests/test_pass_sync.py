@@ -0,0 +1,50 @@
+from utils.wallet_listing import stream_class_pages
+
+
+def test_stream_yields_every_page_and_isolates_failures():
+    def pages(class_id):
+        if class_id == "broken":
+            yield [{"id": "b1"}]
+            raise RuntimeError("listing failed")
+        for n in range(3):
+            yield [{"id": f"{class_id}-{n}"}]
+
+    items = list(stream_class_pages(pages, ["a", "broken", "c"], max_workers=2))
+
+    listed = sorted(p["id"] for _, page, _ in items for p in page)
+    assert listed == ["a-0", "a-1", "a-2", "b1", "c-0", "c-1", "c-2"]
+    errors = [(class_id, str(e)) for class_id, _, e in items if e is not None]
+    assert errors == [("broken", "listing failed")]
+
+
+def test_stopping_early_releases_the_producers():
+    def endless(class_id):
+        while True:
+            yield [{"id": class_id}]
+
+    stream = stream_class_pages(endless, ["a", "b"], max_workers=2)
+    next(stream)
+    stream.close()
+
+
+def test_interleaved_class_reconciles(mirror, make_pass):
+    mirror.reconcile(
+        "1.GroceryClass",
+        [make_pass("old", "2026-03-01", 1), make_pass("kept", "2026-03-01", 2)],
+        listed_at=0,
+    )
+    mirror.reconcile(
+        "1.OtherClass", [make_pass("other", "2026-03-01", 3, cls="OtherClass")], 0
+    )
+    groceries = mirror.begin_reconcile("1.GroceryClass", listed_at=float("inf"))
+    other = mirror.begin_reconcile("1.OtherClass", listed_at=float("inf"))
+
+    groceries.add_page([make_pass("kept", "2026-03-01", 2)])
+    other.add_page([])
+    groceries.add_page([make_pass("new", "2026-03-02", 4)])
+    counts = groceries.finish()
+    # The other class failed part way and is never finished
+
+    assert counts == {"written": 1, "removed": 1}
+    assert sorted(mirror.versions("1.GroceryClass")) == ["1.kept", "1.new"]
+    assert list(mirror.versions("1.OtherClass")) == ["1.other"]
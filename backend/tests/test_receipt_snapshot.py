@@ -0,0 +1,44 @@
+from datetime import date
+
+import pytest
+
+from utils.pass_mirror import PassMirror
+from utils.receipt_snapshot import ReceiptSnapshot, write_snapshot
+
+pytest.importorskip("numpy")
+
+
+def test_snapshot_matches_the_rollups(tmp_path, make_pass):
+    mirror = PassMirror(str(tmp_path / "mirror.sqlite3"))
+    mirror.upsert_many(
+        [
+            make_pass("a", "2026-03-01", 10, items="Milk (2), Bread (3)"),
+            make_pass("b", "2026-03-05", 5.5, merchant="Corner Shop"),
+            make_pass("c", "2026-04-02", 4),
+        ]
+    )
+    mirror.assign_owner(["1.c"], "alice")
+
+    columns = mirror.export_receipts()
+    version = write_snapshot(columns, str(tmp_path / "snapshot"))
+    snapshot = ReceiptSnapshot(str(tmp_path / "snapshot"), version)
+
+    start, end = date(2026, 3, 1), date(2026, 5, 1)
+    for user_id in ("default", "alice"):
+        stats = snapshot.range_stats(user_id, start, end)
+        assert stats.total == mirror.rollup_totals(user_id, start, end).total
+    assert snapshot.receipt_count("default") == 2
+    assert snapshot.items == 2
+    assert snapshot.generation == mirror.rollup_generation()
+
+
+def test_in_memory_mirror_exports_under_its_lock(mirror, make_pass):
+    mirror.upsert(make_pass("a", "2026-03-01", 10))
+
+    columns = mirror.export_receipts()
+
+    assert columns.receipts["receipt_amount"] == [10.0]
+    assert columns.users == {"default": [0, 1]}
+    # The export's read transaction is closed again
+    assert not mirror._conn.in_transaction
+    mirror.upsert(make_pass("b", "2026-03-02", 1))
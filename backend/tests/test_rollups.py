@@ -0,0 +1,125 @@
+from datetime import date
+
+import pytest
+
+from utils import rollups
+from utils.pass_index import OwnerConflict
+
+
+def _tables(mirror):
+    conn = mirror._conn
+    return {
+        table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall())
+        for table in ("daily_rollups", "monthly_rollups", "pass_contributions")
+    }
+
+
+def test_passes_add_to_day_and_month(mirror, make_pass):
+    mirror.upsert_many(
+        [
+            make_pass("a", "2026-03-01", 10, items="Milk (2), Bread (3)"),
+            make_pass("b", "2026-03-01", 5.5),
+            make_pass("c", "2026-03-20", 4),
+        ]
+    )
+
+    tables = _tables(mirror)
+    assert tables["daily_rollups"] == [
+        ("default", "groceries", "2026-03-01", 15.5, 2, 2),
+        ("default", "groceries", "2026-03-20", 4.0, 1, 0),
+    ]
+    assert tables["monthly_rollups"] == [("default", "groceries", "2026-03", 19.5, 3)]
+
+
+def test_edit_moves_the_contribution_and_drops_emptied_keys(mirror, make_pass):
+    mirror.upsert_many(
+        [make_pass("a", "2026-03-01", 10), make_pass("b", "2026-03-02", 1)]
+    )
+
+    mirror.upsert(make_pass("a", "2026-04-05", 12))
+
+    tables = _tables(mirror)
+    assert tables["daily_rollups"] == [
+        ("default", "groceries", "2026-03-02", 1.0, 1, 0),
+        ("default", "groceries", "2026-04-05", 12.0, 1, 0),
+    ]
+    assert tables["monthly_rollups"] == [
+        ("default", "groceries", "2026-03", 1.0, 1),
+        ("default", "groceries", "2026-04", 12.0, 1),
+    ]
+
+
+def test_removed_passes_leave_no_rows(mirror, make_pass):
+    mirror.reconcile("1.GroceryClass", [make_pass("a", "2026-03-01", 10)], 0)
+    mirror.reconcile("1.GroceryClass", [], listed_at=float("inf"))
+
+    assert _tables(mirror) == {
+        "daily_rollups": [],
+        "monthly_rollups": [],
+        "pass_contributions": [],
+    }
+
+
+def test_owner_change_moves_rollups_between_users(mirror, make_pass):
+    mirror.upsert_many(
+        [make_pass("a", "2026-03-01", 10), make_pass("b", "2026-03-01", 2)]
+    )
+
+    mirror.assign_owner(["1.a"], "alice")
+
+    start, end = date(2026, 3, 1), date(2026, 4, 1)
+    assert mirror.rollup_totals("alice", start, end).total == 10
+    assert mirror.rollup_totals("default", start, end).total == 2
+    assert rollups.month_total(mirror._conn, "alice", "groceries", "2026-03") == 10
+
+
+def test_passes_without_date_or_amount_do_not_contribute(mirror, make_pass):
+    broken = make_pass("a", "not a date", 10)
+    mirror.upsert_many([broken, make_pass("b", "2026-03-01", "n/a")])
+
+    assert _tables(mirror)["pass_contributions"] == []
+
+
+def test_incremental_rollups_match_a_rebuild(mirror, make_pass):
+    mirror.upsert_many(
+        [make_pass(f"p{i}", f"2026-0{1 + i % 3}-1{i % 5}", i + 0.25) for i in range(12)]
+    )
+    mirror.upsert(make_pass("p3", "2026-02-28", 99))
+    mirror.assign_owner(["1.p4", "1.p5"], "bob")
+    mirror.reconcile(
+        "1.GroceryClass",
+        [make_pass(f"p{i}", "", 0) for i in range(12) if i != 7],
+        listed_at=float("inf"),
+    )
+    incremental = _tables(mirror)
+
+    mirror.rebuild_rollups()
+
+    assert _tables(mirror) == incremental
+
+
+def test_released_claim_is_kept_only_for_mirrored_passes(mirror, make_pass):
+    claimed = mirror.claim_owner(["1.created", "1.failed"], "alice")
+    mirror.upsert(make_pass("created", "2026-03-01", 10))
+
+    mirror.release_owner(claimed)
+
+    assert mirror.users() == ["alice"]
+    owners = mirror._conn.execute("SELECT * FROM pass_owners").fetchall()
+    assert owners == [("1.created", "alice")]
+
+
+def test_claim_never_takes_another_users_pass(mirror, make_pass):
+    mirror.claim_owner(["1.a"], "alice")
+    mirror.upsert(make_pass("a", "2026-03-01", 10))
+
+    with pytest.raises(OwnerConflict) as conflict:
+        mirror.claim_owner(["1.new", "1.a"], "mallory")
+
+    assert conflict.value.owners == {"1.a": "alice"}
+    start, end = date(2026, 3, 1), date(2026, 4, 1)
+    assert mirror.rollup_totals("alice", start, end).total == 10
+    assert mirror.rollup_totals("mallory", start, end).total == 0
+    assert mirror.users() == ["alice"]
+    # Re-creating one's own pass claims nothing, so nothing is released
+    assert mirror.claim_owner(["1.a"], "alice") == []
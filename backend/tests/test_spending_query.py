@@ -0,0 +1,155 @@
+from datetime import date
+
+import pytest
+
+from utils.spending_query import (
+    MAX_LIMIT,
+    QueryError,
+    compile_query,
+    resolve_period,
+    run_query,
+)
+
+TODAY = date(2026, 5, 14)  # a Thursday
+
+
+@pytest.mark.parametrize(
+    "period, expected",
+    [
+        ("today", (date(2026, 5, 14), date(2026, 5, 15))),
+        ("this week", (date(2026, 5, 11), date(2026, 5, 18))),
+        ("last_month", (date(2026, 4, 1), date(2026, 5, 1))),
+        ("this quarter", (date(2026, 4, 1), date(2026, 7, 1))),
+        ("last year", (date(2025, 1, 1), date(2026, 1, 1))),
+        ("last 7 days", (date(2026, 5, 8), date(2026, 5, 15))),
+        ("2026-02", (date(2026, 2, 1), date(2026, 3, 1))),
+        ("2025-Q4", (date(2025, 10, 1), date(2026, 1, 1))),
+        ("all time", (None, None)),
+    ],
+)
+def test_resolve_period(period, expected):
+    assert resolve_period(period, TODAY) == expected
+
+
+@pytest.mark.parametrize("period", ["fortnight", "last 0 days", "2026-13"])
+def test_unknown_periods_are_rejected(period):
+    with pytest.raises(QueryError):
+        resolve_period(period, TODAY)
+
+
+@pytest.mark.parametrize(
+    "spec, message",
+    [
+        ([], "JSON object"),
+        ({"filters": "groceries"}, "'filters'"),
+        ({"group_by": ["store"]}, "Cannot group by"),
+        ({"group_by": "merchant; DROP TABLE passes"}, "Cannot group by"),
+        ({"metrics": ["median"]}, "Unknown metrics"),
+        ({"metrics": "sum", "order_by": "amount"}, "'order_by'"),
+        ({"source": "passes"}, "'source'"),
+        ({"source": "receipts", "group_by": ["item"]}, "need source 'items'"),
+        ({"filters": {"category": 5}}, "list of strings"),
+        ({"filters": {"start": "May 1st"}}, "ISO date"),
+        ({"filters": {"min_amount": "lots"}}, "a number"),
+        ({"limit": "ten"}, "'limit'"),
+        ({"limit": MAX_LIMIT + 1}, "'limit'"),
+        ({"limit": -1}, "'limit'"),
+        ({"limit": 0}, "'limit'"),
+        ({"limit": "10"}, "'limit'"),
+        ({"limit": 2.5}, "'limit'"),
+        ({"descending": "false"}, "'descending'"),
+        ({"descending": 0}, "'descending'"),
+    ],
+)
+def test_malformed_specs_are_rejected(spec, message):
+    with pytest.raises(QueryError, match=message):
+        compile_query(spec, "default", TODAY)
+
+
+def test_filters_are_bound_as_parameters():
+    sql, params, query = compile_query(
+        {
+            "filters": {
+                "period": "this month",
+                "merchant": ["FreshMart", "Corner Shop"],
+                "min_amount": "10",
+                "max_amount": 500,
+            },
+            "group_by": "merchant",
+            "limit": 5,
+        },
+        "alice",
+        TODAY,
+    )
+
+    assert "FreshMart" not in sql and "alice" not in sql
+    assert "c.amount >= ?" in sql and "c.amount <= ?" in sql
+    assert params == [
+        "alice",
+        "2026-05-01",
+        "2026-06-01",
+        "FreshMart",
+        "Corner Shop",
+        10.0,
+        500.0,
+        5,
+    ]
+    assert query["start"] == "2026-05-01" and query["end"] == "2026-05-31"
+    assert (query["order_by"], query["descending"]) == ("sum", True)
+
+
+def test_item_filters_switch_to_items_and_escape_wildcards():
+    sql, params, query = compile_query(
+        {"filters": {"item": ["100%  Juice", "a_b"]}}, "default", TODAY
+    )
+
+    assert query["source"] == "items"
+    assert "JOIN pass_items" in sql and "i.price" in sql
+    assert "%100\\%  juice%" not in params
+    assert "%100\\% juice%" in params and "%a\\_b%" in params
+
+
+def test_descending_and_limit_are_taken_as_given():
+    sql, params, query = compile_query(
+        {"group_by": ["merchant"], "descending": False, "limit": 3.0},
+        "default",
+        TODAY,
+    )
+
+    assert "ORDER BY sum ASC" in sql
+    assert params[-1] == 3 and query["limit"] == 3 and query["descending"] is False
+
+
+def test_time_groups_default_to_chronological_order():
+    _, _, query = compile_query({"group_by": ["month"]}, "default", TODAY)
+
+    assert (query["order_by"], query["descending"]) == ("month", False)
+
+
+def test_run_query_groups_one_users_receipts(mirror, make_pass):
+    mirror.upsert_many(
+        [
+            make_pass("a", "2026-05-02", 10, items="Milk (2), Bread (3)"),
+            make_pass("b", "2026-05-03", 30, merchant="Corner Shop"),
+            make_pass("c", "2026-05-04", 5),
+            make_pass("d", "2026-04-30", 99),
+            make_pass("e", "2026-05-05", 50),
+        ]
+    )
+    mirror.assign_owner(["1.e"], "bob")
+    spec = {
+        "filters": {"period": "this month"},
+        "group_by": ["merchant"],
+        "metrics": ["sum", "receipts"],
+    }
+
+    result = run_query(mirror._conn, spec, "default", TODAY)
+
+    assert result["rows"] == [
+        {"merchant": "Corner Shop", "sum": 30.0, "receipts": 1},
+        {"merchant": "FreshMart", "sum": 15.0, "receipts": 2},
+    ]
+    items = mirror.query(
+        "default", {"filters": {"item": "milk"}, "metrics": ["sum"]}, TODAY
+    )
+    assert items["rows"] == [{"sum": 2.0}]
@@ -3,7 +3,6 @@ from datetime import datetime
 import os
 from dotenv import load_dotenv
 load_dotenv()
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "gwallet_sa_keyfile.json"
 
 issuer_id = os.getenv("ISSUER_ID")
 class_suffix = "GroceryClass"
@@ -192,17 +191,17 @@ seeder_data = [
     }
 ]
 
-wallet_service = DemoGeneric()
+wallet_service = DemoGeneric("gwallet_sa_keyfile.json")
 
-for entry in seeder_data:
-    object_suffix = entry["object_suffix"]
-    object_data = entry["object_data"]
-    class_suffix = entry["class_suffix"]
-    created_object_suffix = wallet_service.create_object(
-        issuer_id, class_suffix, object_suffix, object_data
-    )
-    save_link = wallet_service.create_jwt_existing_objects(
-        issuer_id, created_object_suffix, class_suffix
-    )
-    print(f"Wallet object created: {created_object_suffix}")
-    print(f"Add to Google Wallet link: {save_link}\n")
\ No newline at end of file
+# Create every seeded object with batch requests instead of one call each
+results = wallet_service.bulk_create_objects(
+    issuer_id,
+    class_suffix,
+    [(entry["object_suffix"], entry["object_data"]) for entry in seeder_data],
+)
+created = [(r["object_suffix"], class_suffix) for r in results if r["status"] != "failed"]
+for r in results:
+    print(f"Wallet object {r['object_suffix']}: {r['status']}")
+if created:
+    save_link = wallet_service.create_jwt_for_objects(issuer_id, created)
+    print(f"Add to Google Wallet link: {save_link}\n")
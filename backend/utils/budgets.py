@@ -0,0 +1,196 @@
+"""
+Per-user monthly budgets, evaluated as receipts are mirrored.
+
+A budget is a monthly limit for one user and category. Whenever the pass
+mirror writes passes of the current month, the affected (user, category)
+totals are read from monthly_rollups and checked against the limit; the
+first time a month crosses 80% or 100% of it, a row is added to
+budget_events and every registered listener is called with the event (for
+example to send a wallet notification). Reading a budget's status is a
+primary-key lookup.
+
+Categories without a configured budget fall back to BUDGET_DEFAULTS.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.rollups import Contribution, month_total
+
+
+def _load_budget_defaults(raw: str) -> Dict[str, float]:
+    """Parse BUDGET_DEFAULTS; a malformed value is logged and ignored."""
+    try:
+        defaults = json.loads(raw)
+        if not isinstance(defaults, dict):
+            raise ValueError("expected a JSON object")
+        return {str(k): float(v) for k, v in defaults.items()}
+    except (TypeError, ValueError) as e:
+        print(f"[BUDGETS] Ignoring malformed BUDGET_DEFAULTS {raw!r}: {e}")
+        return {}
+
+
+# Monthly limits used when a user has not set one, e.g. '{"groceries": 5000}'
+BUDGET_DEFAULTS: Dict[str, float] = _load_budget_defaults(
+    os.getenv("BUDGET_DEFAULTS", '{"groceries": 5000}')
+)
+# Share of the limit, in percent, at which an event fires
+BUDGET_THRESHOLDS = (80, 100)
+
+BUDGET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS budgets (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    monthly_limit REAL NOT NULL,
+    PRIMARY KEY (user_id, category)
+);
+CREATE TABLE IF NOT EXISTS budget_events (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    month TEXT NOT NULL,
+    threshold INTEGER NOT NULL,
+    spent REAL NOT NULL,
+    monthly_limit REAL NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (user_id, category, month, threshold)
+);
+"""
+
+_listeners: List[Callable[[Dict[str, Any]], Any]] = []
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(BUDGET_SCHEMA)
+
+
+def register_budget_listener(fn: Callable[[Dict[str, Any]], Any]) -> None:
+    """Call fn with every new budget event (see dispatch)."""
+    _listeners.append(fn)
+
+
+def dispatch(events: Iterable[Dict[str, Any]]) -> None:
+    """Hand new events to the listeners; call after the events are committed."""
+    for event in events:
+        for fn in _listeners:
+            try:
+                fn(event)
+            except Exception as e:
+                print(f"[BUDGETS] Listener failed for {event}: {e}")
+
+
+def budget_limit(
+    conn: sqlite3.Connection, user_id: str, category: str
+) -> Optional[float]:
+    """Monthly limit of a user's category, None if there is none."""
+    row = conn.execute(
+        "SELECT monthly_limit FROM budgets WHERE user_id = ? AND category = ?",
+        (user_id, category),
+    ).fetchone()
+    return row[0] if row else BUDGET_DEFAULTS.get(category)
+
+
+def set_budget(
+    conn: sqlite3.Connection, user_id: str, category: str, monthly_limit: float
+) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO budgets (user_id, category, monthly_limit) "
+        "VALUES (?, ?, ?)",
+        (user_id, category, monthly_limit),
+    )
+
+
+def evaluate(
+    conn: sqlite3.Connection,
+    keys: Iterable[Tuple[str, str]],
+    today: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """Record the thresholds this month's spending crossed for the first time.
+
+    Every crossed threshold is recorded, but only the highest one yields an
+    event, and only the first time it is crossed: a receipt that takes
+    spending from 70% to 110% raises just the 100% event.
+
+    Call inside the caller's transaction and dispatch() the result after
+    committing.
+
+    Args:
+        keys: (user_id, category) pairs whose current month changed.
+
+    Returns:
+        The new events.
+    """
+    month = (today or date.today()).isoformat()[:7]
+    events = []
+    for user_id, category in set(keys):
+        limit = budget_limit(conn, user_id, category)
+        if not limit:
+            continue
+        spent = month_total(conn, user_id, category, month)
+        crossed = [t for t in BUDGET_THRESHOLDS if spent * 100 >= t * limit]
+        if not crossed:
+            continue
+        inserted = [
+            conn.execute(
+                "INSERT OR IGNORE INTO budget_events (user_id, category, month, "
+                "threshold, spent, monthly_limit, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, category, month, threshold, spent, limit, time.time()),
+            ).rowcount
+            for threshold in crossed
+        ]
+        if inserted[-1]:
+            threshold = crossed[-1]
+            events.append(
+                {
+                    "user_id": user_id,
+                    "category": category,
+                    "month": month,
+                    "threshold": threshold,
+                    "spent": spent,
+                    "monthly_limit": limit,
+                }
+            )
+    return events
+
+
+def current_month_keys(
+    contributions: Iterable[Contribution], today: Optional[date] = None
+) -> List[Tuple[str, str]]:
+    """(user_id, category) of the contributions dated in the current month."""
+    month = (today or date.today()).isoformat()[:7]
+    return [
+        (user_id, category)
+        for _, user_id, category, day, _, _, _ in contributions
+        if day.startswith(month)
+    ]
+
+
+def budget_status(
+    conn: sqlite3.Connection, user_id: str, today: Optional[date] = None
+) -> List[Dict[str, Any]]:
+    """This month's spending against every budget of a user, defaults included."""
+    month = (today or date.today()).isoformat()[:7]
+    limits = dict(BUDGET_DEFAULTS)
+    limits.update(
+        conn.execute(
+            "SELECT category, monthly_limit FROM budgets WHERE user_id = ?",
+            (user_id,),
+        ).fetchall()
+    )
+    status = []
+    for category, limit in sorted(limits.items()):
+        spent = month_total(conn, user_id, category, month)
+        status.append(
+            {
+                "category": category,
+                "month": month,
+                "monthly_limit": limit,
+                "spent": spent,
+                "percent_used": round(spent / limit * 100, 1) if limit else None,
+            }
+        )
+    return status
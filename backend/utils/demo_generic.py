@@ -19,27 +19,40 @@
 # [START imports]
 import json
 import os
+import time
 import uuid
+from typing import Dict, Iterable, List, Tuple
 
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from google.oauth2.service_account import Credentials
-from google.auth import jwt, crypt
+from google.auth import jwt
+
+from utils.known_ids import known_wallet_ids
+from utils.pass_cache import pass_listing_cache
+from utils.pass_mirror import get_pass_mirror
+from utils.wallet_auth import get_wallet_credentials, get_wallet_signer
+from utils.wallet_client import get_wallet_service
 
 # [END imports]
 
+# Status codes worth retrying inside a batch; other errors are permanent
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
 
 class DemoGeneric:
     """Demo class for creating and managing Generic passes in Google Wallet.
 
+    Instances hold no per-request state, so one instance per key file can be
+    shared across threads (see utils.wallet_registry).
+
     Attributes:
         key_file_path: Path to service account key file from Google Cloud
-            Console. Environment variable: GOOGLE_APPLICATION_CREDENTIALS.
+            Console. Falls back to the GOOGLE_APPLICATION_CREDENTIALS
+            environment variable when not passed explicitly.
         base_url: Base URL for Google Wallet API requests.
     """
 
-    def __init__(self):
-        self.key_file_path = os.environ.get(
+    def __init__(self, key_file_path: str = None):
+        self.key_file_path = key_file_path or os.environ.get(
             "GOOGLE_APPLICATION_CREDENTIALS", "gwallet_sa_keyfile.json"
         )
         # Set up authenticated client
@@ -50,26 +63,83 @@ class DemoGeneric:
     # [START auth]
     def auth(self):
         """Create authenticated HTTP client using a service account file."""
-        self.credentials = Credentials.from_service_account_file(
-            self.key_file_path,
-            scopes=["https://www.googleapis.com/auth/wallet_object.issuer"],
-        )
+        # Credentials are parsed once per key file and shared process-wide
+        self.credentials = get_wallet_credentials(self.key_file_path)
 
-        self.client = build("walletobjects", "v1", credentials=self.credentials)
+        # Built once per key file from the vendored discovery document
+        self.client = get_wallet_service(self.key_file_path)
+
+        # Signer and the static part of every save-link JWT, computed once so
+        # signing a link is only the RSA signature itself
+        self.signer = get_wallet_signer(self.key_file_path)
+        self.claims_template = {
+            "iss": self.credentials.service_account_email,
+            "aud": "google",
+            "origins": ["www.example.com"],
+            "typ": "savetowallet",
+        }
+
+    def sign_save_link(self, payload: dict) -> str:
+        """Sign a savetowallet JWT for the given payload.
+
+        Args:
+            payload (dict): The JWT "payload" claim, e.g. {"genericObjects": [...]}.
+
+        Returns:
+            An "Add to Google Wallet" link.
+        """
+        claims = dict(self.claims_template, payload=payload)
+        token = jwt.encode(self.signer, claims).decode("utf-8")
+        return f"https://pay.google.com/gp/v/save/{token}"
+
+    def _write_through(self, pass_obj: dict) -> None:
+        """Record an object we just wrote to Wallet in the local pass mirror.
+
+        Also drops the cached listing of its class so the next read sees it.
+        """
+        try:
+            get_pass_mirror().upsert(pass_obj)
+        except Exception as e:
+            # The Wallet write succeeded; the next reconcile will catch up
+            print(f"Pass mirror write-through failed: {e}")
+        if pass_obj.get("classId"):
+            pass_listing_cache.invalidate(pass_obj["classId"])
 
     # [END auth]
 
     # [START createClass]
-    def create_class(self, issuer_id: str, class_suffix: str) -> str:
+    def create_class(
+        self, issuer_id: str, class_suffix: str, insert_first: bool = True
+    ) -> str:
         """Create a class.
 
         Args:
             issuer_id (str): The issuer ID being used for this request.
             class_suffix (str): Developer-defined unique ID for this pass class.
+            insert_first (bool): Send the insert directly and treat an
+                "already exists" conflict as success, instead of a GET first.
 
         Returns:
             The pass class ID: f"{issuer_id}.{class_suffix}"
         """
+        class_id = f"{issuer_id}.{class_suffix}"
+        if class_id in known_wallet_ids:
+            return f"{class_suffix}"
+
+        if insert_first:
+            try:
+                response = (
+                    self.client.genericclass().insert(body={"id": class_id}).execute()
+                )
+            except HttpError as e:
+                if e.status_code != 409:
+                    raise
+                print(f"Class {class_id} already exists!")
+            else:
+                print("Class insert response")
+                print(response)
+            known_wallet_ids.add(class_id)
+            return f"{class_suffix}"
 
         # Check if the class exists
         try:
@@ -83,6 +153,7 @@ class DemoGeneric:
                 return f"{class_suffix}"
         else:
             print(f"Class {issuer_id}.{class_suffix} already exists!")
+            known_wallet_ids.add(class_id)
             return f"{class_suffix}"
 
         # See link below for more information on required properties
@@ -93,9 +164,33 @@ class DemoGeneric:
 
         print("Class insert response")
         print(response)
+        known_wallet_ids.add(class_id)
 
         return f"{class_suffix}"
 
+    def warm_known_classes(self, issuer_id: str, class_suffixes: List[str]) -> int:
+        """Record which of the given classes already exist in the known-ID cache.
+
+        Args:
+            issuer_id (str): The issuer ID being used for this request.
+            class_suffixes (list): Class suffixes to look up.
+
+        Returns:
+            The number of classes found.
+        """
+        found = 0
+        for class_suffix in class_suffixes:
+            class_id = f"{issuer_id}.{class_suffix}"
+            try:
+                self.client.genericclass().get(resourceId=class_id).execute()
+            except HttpError as e:
+                if e.status_code != 404:
+                    raise
+                continue
+            known_wallet_ids.add(class_id)
+            found += 1
+        return found
+
     # [END createClass]
 
     # [START updateClass]
@@ -225,6 +320,7 @@ class DemoGeneric:
         class_suffix: str,
         object_suffix: str,
         object_data: dict,
+        insert_first: bool = True,
     ) -> str:
         """Create an object.
 
@@ -233,10 +329,34 @@ class DemoGeneric:
             class_suffix (str): Developer-defined unique ID for the pass class.
             object_suffix (str): Developer-defined unique ID for the pass object.
             object_data (dict): Dynamic data for the object. Must contain all required fields.
+            insert_first (bool): Send the insert directly and treat an
+                "already exists" conflict as success, instead of a GET first.
 
         Returns:
             The pass object ID: f"{issuer_id}.{object_suffix}"
         """
+        object_id = f"{issuer_id}.{object_suffix}"
+        if object_id in known_wallet_ids:
+            print(f"Object {object_id} already exists!")
+            return object_suffix
+
+        if insert_first:
+            object_data["id"] = object_id
+            object_data["classId"] = f"{issuer_id}.{class_suffix}"
+            try:
+                response = (
+                    self.client.genericobject().insert(body=object_data).execute()
+                )
+            except HttpError as e:
+                if e.status_code != 409:
+                    raise
+                print(f"Object {object_id} already exists!")
+            else:
+                print("Object insert response")
+                print(response)
+                self._write_through(response)
+            known_wallet_ids.add(object_id)
+            return object_suffix
 
         # Check if the object exists
         try:
@@ -250,6 +370,7 @@ class DemoGeneric:
                 return object_suffix
         else:
             print(f"Object {issuer_id}.{object_suffix} already exists!")
+            known_wallet_ids.add(object_id)
             return object_suffix
 
         # See link below for more information on required properties
@@ -264,6 +385,8 @@ class DemoGeneric:
 
         print("Object insert response")
         print(response)
+        self._write_through(response)
+        known_wallet_ids.add(object_id)
 
         return object_suffix
 
@@ -319,6 +442,7 @@ class DemoGeneric:
 
         print("Object update response")
         print(response)
+        self._write_through(response)
 
         return f"{issuer_id}.{object_suffix}"
 
@@ -376,6 +500,7 @@ class DemoGeneric:
 
         print("Object patch response")
         print(response)
+        self._write_through(response)
 
         return f"{issuer_id}.{object_suffix}"
 
@@ -423,6 +548,7 @@ class DemoGeneric:
 
         print("Object expiration response")
         print(response)
+        self._write_through(response)
 
         return f"{issuer_id}.{object_suffix}"
 
@@ -524,27 +650,15 @@ class DemoGeneric:
             },
         }
 
-        # Create the JWT claims
-        claims = {
-            "iss": self.credentials.service_account_email,
-            "aud": "google",
-            "origins": ["www.example.com"],
-            "typ": "savetowallet",
-            "payload": {
-                # The listed classes and objects will be created
-                "genericClasses": [new_class],
-                "genericObjects": [new_object],
-            },
-        }
-
-        # The service account credentials are used to sign the JWT
-        signer = crypt.RSASigner.from_service_account_file(self.key_file_path)
-        token = jwt.encode(signer, claims).decode("utf-8")
+        # Sign the JWT; the listed classes and objects will be created
+        save_link = self.sign_save_link(
+            {"genericClasses": [new_class], "genericObjects": [new_object]}
+        )
 
         print("Add to Google Wallet link")
-        print(f"https://pay.google.com/gp/v/save/{token}")
+        print(save_link)
 
-        return f"https://pay.google.com/gp/v/save/{token}"
+        return save_link
 
     # [END jwtNew]
 
@@ -628,23 +742,13 @@ class DemoGeneric:
             # ],
         }
 
-        # Create the JWT claims
-        claims = {
-            "iss": self.credentials.service_account_email,
-            "aud": "google",
-            "origins": ["www.example.com"],
-            "typ": "savetowallet",
-            "payload": objects_to_add,
-        }
-
         # The service account credentials are used to sign the JWT
-        signer = crypt.RSASigner.from_service_account_file(self.key_file_path)
-        token = jwt.encode(signer, claims).decode("utf-8")
+        save_link = self.sign_save_link(objects_to_add)
 
         print("Add to Google Wallet link")
-        print(f"https://pay.google.com/gp/v/save/{token}")
+        print(save_link)
 
-        return f"https://pay.google.com/gp/v/save/{token}"
+        return save_link
 
     # def create_jwt_for_existing_object(
     #     self, issuer_id: str, class_suffix: str, object_suffix: str
@@ -694,6 +798,59 @@ class DemoGeneric:
 
     # [END jwtExisting]
 
+    # [START jwtBulk]
+    def create_jwt_for_objects(
+        self, issuer_id: str, objects: Iterable[Tuple[str, str]]
+    ) -> str:
+        """Generate one signed JWT that saves several existing pass objects.
+
+        Args:
+            issuer_id (str): The issuer ID being used for this request.
+            objects: (object_suffix, class_suffix) pairs to include in the link.
+
+        Returns:
+            A single "Add to Google Wallet" link covering every object.
+        """
+        return self.sign_save_link(
+            {
+                "genericObjects": [
+                    {
+                        "id": f"{issuer_id}.{object_suffix}",
+                        "classId": f"{issuer_id}.{class_suffix}",
+                    }
+                    for object_suffix, class_suffix in objects
+                ]
+            }
+        )
+
+    def create_jwt_links(
+        self, issuer_id: str, objects: Iterable[Tuple[str, str]]
+    ) -> List[str]:
+        """Generate one "Add to Google Wallet" link per existing pass object.
+
+        Args:
+            issuer_id (str): The issuer ID being used for this request.
+            objects: (object_suffix, class_suffix) pairs, one link each.
+
+        Returns:
+            The save links, in the same order as objects.
+        """
+        return [
+            self.sign_save_link(
+                {
+                    "genericObjects": [
+                        {
+                            "id": f"{issuer_id}.{object_suffix}",
+                            "classId": f"{issuer_id}.{class_suffix}",
+                        }
+                    ]
+                }
+            )
+            for object_suffix, class_suffix in objects
+        ]
+
+    # [END jwtBulk]
+
     # [START batch]
     def batch_create_objects(self, issuer_id: str, class_suffix: str):
         """Batch create Google Wallet objects from an existing class.
@@ -795,4 +952,99 @@ class DemoGeneric:
 
         print("Batch complete")
 
+    def bulk_create_objects(
+        self,
+        issuer_id: str,
+        class_suffix: str,
+        items: List[Tuple[str, dict]],
+        batch_size: int = 50,
+        max_retries: int = 3,
+    ) -> List[Dict]:
+        """Create many objects of one class using Wallet batch HTTP requests.
+
+        Items are sent in chunks of batch_size. An "already exists" conflict
+        counts as success, and only items that failed with a retryable error
+        are resent, with exponential backoff.
+
+        Args:
+            issuer_id (str): The issuer ID being used for this request.
+            class_suffix (str): Developer-defined unique ID for the pass class.
+            items (list): (object_suffix, object_data) pairs to create.
+            batch_size (int): Maximum number of inserts per batch request.
+            max_retries (int): Retry rounds for transiently failed items.
+
+        Returns:
+            One dict per item, in input order, with keys object_suffix,
+            status ("created", "exists" or "failed") and error.
+        """
+        results = {
+            object_suffix: {
+                "object_suffix": object_suffix,
+                "status": None,
+                "error": None,
+            }
+            for object_suffix, _ in items
+        }
+        pending = []
+        for object_suffix, object_data in items:
+            object_id = f"{issuer_id}.{object_suffix}"
+            if object_id in known_wallet_ids:
+                results[object_suffix]["status"] = "exists"
+                continue
+            # Set critical fields that must be derived from parameters
+            object_data["id"] = object_id
+            object_data["classId"] = f"{issuer_id}.{class_suffix}"
+            pending.append((object_suffix, object_data))
+
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                time.sleep(0.5 * 2 ** (attempt - 1))
+            retry = []
+            for start in range(0, len(pending), batch_size):
+                chunk = dict(pending[start : start + batch_size])
+
+                def callback(request_id, response, exception):
+                    result = results[request_id]
+                    if exception is None:
+                        result.update(status="created", error=None)
+                        known_wallet_ids.add(f"{issuer_id}.{request_id}")
+                        self._write_through(response)
+                    elif (
+                        isinstance(exception, HttpError)
+                        and exception.status_code == 409
+                    ):
+                        result.update(status="exists", error=None)
+                        known_wallet_ids.add(f"{issuer_id}.{request_id}")
+                    else:
+                        status_code = getattr(exception, "status_code", None)
+                        result.update(status="failed", error=str(exception))
+                        if status_code is None or status_code in RETRYABLE_STATUS_CODES:
+                            retry.append((request_id, chunk[request_id]))
+
+                batch = self.client.new_batch_http_request(callback=callback)
+                for object_suffix, object_data in chunk.items():
+                    results[object_suffix]["status"] = None
+                    batch.add(
+                        self.client.genericobject().insert(body=object_data),
+                        request_id=object_suffix,
+                    )
+                try:
+                    batch.execute()
+                except Exception as e:
+                    # The whole batch call failed; retry every item in it
+                    print(f"Batch request failed: {e}")
+                    for object_suffix, object_data in chunk.items():
+                        if results[object_suffix]["status"] is None:
+                            results[object_suffix].update(status="failed", error=str(e))
+                            retry.append((object_suffix, object_data))
+            pending = retry
+
+        print(
+            f"Bulk create complete for {issuer_id}.{class_suffix}: "
+            f"{sum(r['status'] != 'failed' for r in results.values())}/{len(results)} ok"
+        )
+        return [results[object_suffix] for object_suffix, _ in items]
+
     # [END batch]
@@ -0,0 +1,256 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.lazy import lazy_module
+from utils.pass_records import CLASS_SUFFIX_TO_CATEGORY, PassRecord
+
+np = lazy_module("numpy")
+
+PERIODS = (
+    "daily",
+    "weekly",
+    "monthly",
+    "yearly",
+    "previous_week",
+    "previous_month",
+)
+
+
+def period_bounds(period: str, today: date) -> Tuple[date, date]:
+    """Return the [start, end) date range of a reporting period.
+
+    'weekly' is the current ISO week (Monday to Sunday), 'previous_week' the
+    seven days before today and 'previous_month' the calendar month before
+    the current one.
+    """
+    if period == "daily":
+        return today, today + timedelta(days=1)
+    if period == "weekly":
+        monday = today - timedelta(days=today.weekday())
+        return monday, monday + timedelta(days=7)
+    if period == "monthly":
+        start = today.replace(day=1)
+        return start, _next_month(start)
+    if period == "yearly":
+        return date(today.year, 1, 1), date(today.year + 1, 1, 1)
+    if period == "previous_week":
+        return today - timedelta(days=7), today
+    if period == "previous_month":
+        end = today.replace(day=1)
+        return (end - timedelta(days=1)).replace(day=1), end
+    raise ValueError(f"Invalid period '{period}'. Must be one of {list(PERIODS)}.")
+
+
+def _next_month(first_of_month: date) -> date:
+    if first_of_month.month == 12:
+        return date(first_of_month.year + 1, 1, 1)
+    return date(first_of_month.year, first_of_month.month + 1, 1)
+
+
+class PeriodStats:
+    """Aggregates of the passes that fall in one date range.
+
+    Attributes:
+        start: First day of the range.
+        end: Day after the last day of the range.
+        total: Sum of pass amounts.
+        count: Number of passes.
+        unique_days: Number of distinct purchase dates.
+        category_totals: Amount per category, every known category included.
+        positions: Indexes into the input pass list, in input order.
+    """
+
+    __slots__ = (
+        "start",
+        "end",
+        "total",
+        "count",
+        "unique_days",
+        "category_totals",
+        "positions",
+    )
+
+    def __init__(
+        self, start, end, total, count, unique_days, category_totals, positions
+    ):
+        self.start = start
+        self.end = end
+        self.total = total
+        self.count = count
+        self.unique_days = unique_days
+        self.category_totals = category_totals
+        self.positions = positions
+
+    @property
+    def average_per_day(self) -> float:
+        return round(self.count / max(self.unique_days, 1), 2) if self.count else 0
+
+
+class ExpenditureFrame:
+    """Columnar view of parsed passes for range aggregation.
+
+    Passes with a valid date and amount are loaded once into day-sorted
+    arrays with running totals (overall and per category) and a running
+    distinct-day count. Any date range is then answered with two binary
+    searches and a handful of subtractions, no matter how many passes there
+    are.
+
+    Attributes:
+        categories: Category name for each category code.
+        size: Number of passes loaded.
+    """
+
+    def __init__(self, records: Iterable[PassRecord]):
+        positions, days, amounts, codes = [], [], [], []
+        self.categories: List[str] = list(
+            dict.fromkeys(CLASS_SUFFIX_TO_CATEGORY.values())
+        )
+        category_codes = {name: code for code, name in enumerate(self.categories)}
+        for position, record in enumerate(records):
+            if not record.valid:
+                continue
+            code = category_codes.get(record.category)
+            if code is None:
+                code = category_codes[record.category] = len(self.categories)
+                self.categories.append(record.category)
+            positions.append(position)
+            days.append(record.date.toordinal())
+            amounts.append(record.amount)
+            codes.append(code)
+
+        order = np.argsort(np.asarray(days, dtype=np.int64), kind="stable")
+        self._days = np.asarray(days, dtype=np.int64)[order]
+        self._positions = np.asarray(positions, dtype=np.int64)[order]
+        amounts = np.asarray(amounts, dtype=np.float64)[order]
+        codes = np.asarray(codes, dtype=np.int64)[order]
+        self.size = len(self._days)
+
+        zero = np.zeros(1)
+        self._amount_cumsum = np.concatenate([zero, np.cumsum(amounts)])
+        # One running total per category: row c sums the amounts of category c
+        by_category = np.zeros((len(self.categories), self.size))
+        by_category[codes, np.arange(self.size)] = amounts
+        self._category_cumsum = np.concatenate(
+            [np.zeros((len(self.categories), 1)), np.cumsum(by_category, axis=1)],
+            axis=1,
+        )
+        # new_day[i] is 1 where a sorted pass starts a new purchase date
+        new_day = np.ones(self.size, dtype=np.int64)
+        new_day[1:] = self._days[1:] != self._days[:-1]
+        self._new_day_cumsum = np.concatenate([[0], np.cumsum(new_day)])
+
+    def range_stats(self, start: date, end: date) -> PeriodStats:
+        """Aggregate the passes dated in [start, end)."""
+        lo, hi = np.searchsorted(
+            self._days, [start.toordinal(), end.toordinal()], side="left"
+        )
+        lo, hi = int(lo), int(hi)
+        count = hi - lo
+        # The first pass in the range always starts a new day within the range
+        unique_days = (
+            int(self._new_day_cumsum[hi] - self._new_day_cumsum[lo + 1]) + 1
+            if count
+            else 0
+        )
+        category_amounts = self._category_cumsum[:, hi] - self._category_cumsum[:, lo]
+        return PeriodStats(
+            start=start,
+            end=end,
+            total=round(float(self._amount_cumsum[hi] - self._amount_cumsum[lo]), 2),
+            count=count,
+            unique_days=unique_days,
+            category_totals={
+                name: round(float(amount), 2)
+                for name, amount in zip(self.categories, category_amounts)
+            },
+            positions=np.sort(self._positions[lo:hi]).tolist(),
+        )
+
+    def period(self, period: str, today: Optional[date] = None) -> PeriodStats:
+        """Aggregate one named period (see PERIODS) relative to today."""
+        return self.range_stats(*period_bounds(period, today or date.today()))
+
+    def report(self, today: Optional[date] = None) -> Dict[str, PeriodStats]:
+        """Aggregate every named period at once."""
+        today = today or date.today()
+        return {name: self.period(name, today) for name in PERIODS}
+
+
+BUCKETS = ("day", "week", "month")
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    """First day of the day/week/month bucket containing day (weeks start Monday)."""
+    if bucket == "day":
+        return day
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Invalid bucket '{bucket}'. Must be one of {list(BUCKETS)}.")
+
+
+def next_bucket(start: date, bucket: str) -> date:
+    """First day of the bucket after the one starting at start."""
+    if bucket == "day":
+        return start + timedelta(days=1)
+    if bucket == "week":
+        return start + timedelta(days=7)
+    return _next_month(start)
+
+
+def count_buckets(start: date, end: date, bucket: str) -> int:
+    """Number of buckets touched by [start, end)."""
+    first = bucket_start(start, bucket)
+    if bucket == "day":
+        return (end - first).days
+    if bucket == "week":
+        return -(-(end - first).days // 7)
+    months = (end.year - first.year) * 12 + end.month - first.month
+    return months + (1 if end.day > 1 else 0)
+
+
+def bucket_series(
+    rows: Iterable[Tuple[str, str, float, int]], start: date, end: date, bucket: str
+) -> List[dict]:
+    """Group (day, category, total, count) rows into consecutive buckets.
+
+    Every bucket between start and end is returned, empty ones included, and
+    the first and last buckets are clipped to [start, end).
+
+    Returns:
+        One dict per bucket with start, end (inclusive), total, count and a
+        per-category breakdown.
+    """
+    buckets = []
+    index = {}
+    cursor = bucket_start(start, bucket)
+    while cursor < end:
+        following = next_bucket(cursor, bucket)
+        index[cursor] = len(buckets)
+        buckets.append(
+            {
+                "start": max(cursor, start).isoformat(),
+                "end": (min(following, end) - timedelta(days=1)).isoformat(),
+                "total": 0.0,
+                "count": 0,
+                "categories": {},
+            }
+        )
+        cursor = following
+    for day, category, total, count in rows:
+        entry = buckets[index[bucket_start(date.fromisoformat(day), bucket)]]
+        entry["total"] += total
+        entry["count"] += count
+        entry["categories"][category] = entry["categories"].get(category, 0.0) + total
+    for entry in buckets:
+        entry["total"] = round(entry["total"], 2)
+        entry["categories"] = {k: round(v, 2) for k, v in entry["categories"].items()}
+    return buckets
+
+
+def percent_change(previous: float, current: float) -> Optional[float]:
+    """Relative change from previous to current in percent, None if previous is 0."""
+    if not previous:
+        return None
+    return (current - previous) / previous * 100
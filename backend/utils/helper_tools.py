@@ -2,21 +2,29 @@ import json
 import os
 import requests
 import uuid
+from datetime import date
 from dotenv import load_dotenv
-import google.generativeai as genai
-from utils.demo_generic import DemoGeneric
+from utils.lazy import lazy_module
+from utils.wallet_registry import get_wallet_client
 from utils.offers_utils import (
     extract_intent_from_request,
     extract_credit_cards,
     get_gemini_offers,
     get_session_id,
 )
+from utils.recommendations import fi_mcp_flight
+from utils.pass_index import DEFAULT_USER_ID, OwnerConflict
+from utils.pass_mirror import get_pass_mirror
+from utils.spending_query import QueryError, resolve_period
 import random
 
+genai = lazy_module("google.generativeai")
+
 load_dotenv()
 
 # Config for fi-mcp-dev
 FI_MCP_DEV_URL = os.getenv("FI_MCP_DEV_URL")  # Update this to your fi-mcp-dev URL
+WALLET_KEY_FILE_PATH = "gwallet_sa_keyfile.json"
 
 # client = genai.Client()  # Removed, not needed for generativeai
 # In a real app, this data would come from Firestore or another database.
@@ -159,8 +167,7 @@ def create_wallet_object_and_link(
     Combines the functionality of create_wallet_object and get_wallet_link endpoints.
     """
     try:
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "gwallet_sa_keyfile.json"
-        wallet_service = DemoGeneric()
+        wallet_service = get_wallet_client(WALLET_KEY_FILE_PATH)
         issuer_id = os.getenv("ISSUER_ID")
 
         if not issuer_id:
@@ -207,10 +214,21 @@ def create_wallet_object_and_link(
             "hexBackgroundColor": "#4285f4",
         }
 
+        # Claimed for the user first so the write-through files it under them
+        try:
+            claimed = get_pass_mirror().claim_owner(
+                [f"{issuer_id}.{object_suffix}"], user_id or DEFAULT_USER_ID
+            )
+        except OwnerConflict:
+            return "Error: This wallet object belongs to another user."
+
         # Create the wallet object
-        object_name = wallet_service.create_object(
-            issuer_id, class_suffix, object_suffix, object_data
-        )
+        try:
+            object_name = wallet_service.create_object(
+                issuer_id, class_suffix, object_suffix, object_data
+            )
+        finally:
+            get_pass_mirror().release_owner(claimed)
 
         if not object_name:
             return "Error: Failed to create wallet object."
@@ -361,9 +379,12 @@ def get_credit_card_offers(user_request: str, user_id: str) -> str:
 
         print("in payload here - ", payload)
 
-        # Call fi-mcp-dev
-        resp = requests.post(
-            FI_MCP_DEV_URL + "/mcp/stream", headers=headers, json=payload
+        # Call fi-mcp-dev; concurrent calls for the same session share one request
+        resp = fi_mcp_flight.do(
+            (headers["Mcp-Session-Id"], "fetch_credit_report"),
+            lambda: requests.post(
+                FI_MCP_DEV_URL + "/mcp/stream", headers=headers, json=payload
+            ),
         )
         print("response status code - ", resp)
         if resp.status_code != 200:
@@ -438,12 +459,67 @@ def get_spending_data(user_id: str, time_period: str, category: str = "all") ->
     print(
         f"Tool: get_spending_data called for user {user_id}, period {time_period}, category {category}"
     )
-    # In a real app, you'd parse the time_period and filter the database query.
-    # For this demo, we'll return all data and let the next agent filter it.
-    transactions = MOCK_INVENTORY.get(user_id, [])
+    try:
+        start, end = resolve_period(time_period, date.today())
+    except QueryError as e:
+        return json.dumps({"error": str(e)})
+    category = (category or "all").lower()
+    transactions = [
+        t
+        for t in MOCK_INVENTORY.get(user_id, [])
+        if (category == "all" or t["category"].lower() == category)
+        and (start is None or t["purchase_date"] >= start.isoformat())
+        and (end is None or t["purchase_date"] < end.isoformat())
+    ]
     return json.dumps(transactions)
 
 
+def query_spending(
+    user_id: str = DEFAULT_USER_ID,
+    time_period: str = "this month",
+    category: str = "all",
+    merchant: str = "",
+    item_keywords: str = "",
+    group_by: str = "",
+    metric: str = "sum",
+    top_k: int = 10,
+) -> str:
+    """Answers analytics questions over the user's scanned receipts and their line items, e.g. "top 5 merchants this quarter" or "how much did I spend on dairy in the last 2 weeks".
+
+    Args:
+        user_id: Owner of the receipts.
+        time_period: e.g. 'today', 'this week', 'last month', 'this quarter', 'last 30 days', '2025-07' or 'all'.
+        category: Receipt category such as 'groceries', or 'all'.
+        merchant: Exact merchant name, or empty for every merchant.
+        item_keywords: Comma-separated words matched inside item names; expand a food group into its items (dairy -> 'milk,cheese,yogurt,butter,curd,paneer').
+        group_by: Comma-separated breakdown: merchant, category, item, day, week, month, quarter or year; empty for one overall total.
+        metric: What to rank by: sum, count, avg, min, max or receipts.
+        top_k: Number of groups to return, largest first.
+    """
+    print(
+        f"Tool: query_spending called for user {user_id}, period {time_period}, "
+        f"group_by {group_by!r}, items {item_keywords!r}"
+    )
+    metrics = list(dict.fromkeys([metric, "sum", "count"]))
+    spec = {
+        "filters": {
+            "period": time_period,
+            "category": category,
+            "merchant": merchant,
+            "item": [k.strip() for k in item_keywords.split(",") if k.strip()],
+        },
+        "group_by": [g.strip() for g in group_by.split(",") if g.strip()],
+        "metrics": metrics,
+        "order_by": metric,
+        "descending": True,
+        "limit": top_k,
+    }
+    try:
+        return json.dumps(get_pass_mirror().query(user_id, spec))
+    except QueryError as e:
+        return json.dumps({"error": str(e)})
+
+
 def analyze_spending_and_suggest_savings(spending_data_json: str) -> str:
     """Analyzes a JSON of transaction data and provides a summary and actionable savings suggestions."""
     print("Tool: analyze_spending_and_suggest_savings called.")
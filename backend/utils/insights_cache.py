@@ -0,0 +1,156 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from utils.single_flight import SingleFlight
+
+INSIGHTS_CACHE_TTL_SECONDS = float(os.getenv("INSIGHTS_CACHE_TTL_SECONDS", "86400"))
+INSIGHTS_STALE_WHILE_REVALIDATE = (
+    os.getenv("INSIGHTS_STALE_WHILE_REVALIDATE", "false").lower() == "true"
+)
+# Digests kept; keys are per user, so size it to the number of active users
+INSIGHTS_CACHE_SIZE = int(os.getenv("INSIGHTS_CACHE_SIZE", "256"))
+
+
+def pass_set_digest(versions: Iterable[Tuple[str, str]], *extra: str) -> str:
+    """Digest of a set of (object ID, version) pairs plus any extra inputs."""
+    digest = hashlib.sha256()
+    for pass_id, version in sorted(versions):
+        digest.update(f"{pass_id}\0{version}\n".encode("utf-8"))
+    for value in extra:
+        digest.update(f"{value}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class InsightsCache:
+    """Memoizes LLM insights by the digest of the passes they were built from.
+
+    Results with an "error" key are never stored. With stale_while_revalidate,
+    a miss is answered with the most recent insights stored for the same
+    partition (e.g. the same user) while fresh ones are generated on a
+    background thread; a miss without such insights waits for the model.
+
+    Attributes:
+        ttl_seconds: Age after which stored insights are regenerated.
+        stale_while_revalidate: Serve the last insights during regeneration.
+        maxsize: Number of digests kept.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = INSIGHTS_CACHE_TTL_SECONDS,
+        stale_while_revalidate: bool = INSIGHTS_STALE_WHILE_REVALIDATE,
+        maxsize: int = INSIGHTS_CACHE_SIZE,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_while_revalidate = stale_while_revalidate
+        self.maxsize = maxsize
+        # digest -> (stored at, insights, partition)
+        self._entries: (
+            "OrderedDict[str, Tuple[float, Dict[str, Any], Optional[str]]]"
+        ) = OrderedDict()
+        # partition -> digest of its most recently stored insights
+        self._latest: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight("llm_insights")
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _store(
+        self, digest: str, insights: Dict[str, Any], partition: Optional[str]
+    ) -> None:
+        if "error" in insights:
+            return
+        with self._lock:
+            self._entries[digest] = (time.time(), insights, partition)
+            self._entries.move_to_end(digest)
+            if partition is not None:
+                self._latest[partition] = digest
+            while len(self._entries) > self.maxsize:
+                evicted, (_, _, owner) = self._entries.popitem(last=False)
+                if owner is not None and self._latest.get(owner) == evicted:
+                    del self._latest[owner]
+
+    def _generate(
+        self,
+        digest: str,
+        generate_fn: Callable[[], Dict[str, Any]],
+        partition: Optional[str],
+    ) -> Dict[str, Any]:
+        def run():
+            insights = generate_fn()
+            self._store(digest, insights, partition)
+            return insights
+
+        return self._flight.do(digest, run)
+
+    def _refresh_in_background(
+        self, digest: str, generate_fn, partition: Optional[str]
+    ) -> None:
+        if self._flight.in_flight(digest):
+            return
+
+        def run():
+            try:
+                self._generate(digest, generate_fn, partition)
+            except Exception as e:
+                print(f"[INSIGHTS] Background refresh failed: {e}")
+
+        threading.Thread(target=run, name="insights-refresh", daemon=True).start()
+
+    def get(
+        self,
+        digest: str,
+        generate_fn: Callable[[], Dict[str, Any]],
+        partition: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """Return insights for a digest, generating them on a miss.
+
+        Args:
+            digest: See pass_set_digest.
+            generate_fn: Produces the insights; called at most once at a time
+                per digest.
+            partition: Whose insights these are (e.g. the user ID). Stale
+                insights are only served from the same partition.
+
+        Returns:
+            The insights (shared; copy before modifying) and how they were
+            served: "hit", "stale" or "miss".
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            fresh = entry is not None and time.time() - entry[0] < self.ttl_seconds
+            if fresh:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry[1], "hit"
+            fallback = entry
+            if fallback is None and partition is not None:
+                fallback = self._entries.get(self._latest.get(partition))
+            if self.stale_while_revalidate and fallback is not None:
+                self.stale += 1
+            else:
+                fallback = None
+                self.misses += 1
+        if fallback is not None:
+            self._refresh_in_background(digest, generate_fn, partition)
+            return fallback[1], "stale"
+        return self._generate(digest, generate_fn, partition), "miss"
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "stale_while_revalidate": self.stale_while_revalidate,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+        }
+
+
+insights_cache = InsightsCache()
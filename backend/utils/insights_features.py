@@ -0,0 +1,116 @@
+import json
+import math
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from utils.pass_records import PassRecord
+
+# Approximate input token budget for the feature digest sent to the model
+INSIGHTS_TOKEN_BUDGET = int(os.getenv("INSIGHTS_TOKEN_BUDGET", "2000"))
+RECENT_ITEMS_DAYS = 14
+TOTALS_DAYS = 30
+TOP_MERCHANTS = 5
+# Also estimate the tokens of the raw passes, for comparison. Serializes
+# every pass on each model call, so it is off outside of benchmarking.
+INSIGHTS_REPORT_RAW_TOKENS = (
+    os.getenv("INSIGHTS_REPORT_RAW_TOKENS", "false").lower() == "true"
+)
+
+# Input token estimates of the most recent insights prompt
+token_report: Dict[str, Optional[int]] = {"raw_tokens": None, "digest_tokens": None}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for Gemini)."""
+    return math.ceil(len(text) / 4)
+
+
+def _compact(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def build_insights_features(
+    records: List[PassRecord],
+    today: date,
+    token_budget: int = INSIGHTS_TOKEN_BUDGET,
+) -> Dict[str, Any]:
+    """Reduce parsed passes to the compact digest the insights prompt needs.
+
+    The digest holds the dated line items of the last RECENT_ITEMS_DAYS days
+    (for perishables and recipes), category totals and top merchants over
+    the last TOTALS_DAYS days. The oldest receipts are dropped until the
+    digest fits token_budget.
+
+    Args:
+        records: Parsed passes (see utils.pass_records).
+        today: Reference date for the windows.
+        token_budget: Approximate maximum input tokens for the digest.
+
+    Returns:
+        A JSON-serializable dict.
+    """
+    recent_start = today - timedelta(days=RECENT_ITEMS_DAYS)
+    totals_start = today - timedelta(days=TOTALS_DAYS)
+    category_totals: Dict[str, float] = {}
+    merchants: Dict[str, List[float]] = {}
+    receipts = []
+    for record in records:
+        if not record.valid or record.date > today or record.date < totals_start:
+            continue
+        category_totals[record.category] = (
+            category_totals.get(record.category, 0.0) + record.amount
+        )
+        if record.merchant:
+            spent = merchants.setdefault(record.merchant, [0.0, 0])
+            spent[0] += record.amount
+            spent[1] += 1
+        if record.date >= recent_start and record.items:
+            receipts.append(
+                {
+                    "date": record.date.isoformat(),
+                    "merchant": record.merchant,
+                    "items": [
+                        desc if price is None else f"{desc} ({price:g})"
+                        for desc, price in record.items
+                    ],
+                }
+            )
+    receipts.sort(key=lambda r: r["date"], reverse=True)
+    top_merchants = sorted(merchants.items(), key=lambda m: m[1][0], reverse=True)
+
+    features = {
+        "today": today.isoformat(),
+        "category_totals_last_30_days": {
+            k: round(v, 2) for k, v in sorted(category_totals.items())
+        },
+        "top_merchants_last_30_days": [
+            {"merchant": name, "total": round(total, 2), "receipts": count}
+            for name, (total, count) in top_merchants[:TOP_MERCHANTS]
+        ],
+        "receipts_last_14_days": receipts,
+    }
+    # Drop the oldest receipts until the digest fits the budget
+    while receipts and estimate_tokens(_compact(features)) > token_budget:
+        receipts.pop()
+    return features
+
+
+def features_prompt_input(
+    features: Dict[str, Any], raw_passes: Optional[List[Dict[str, Any]]] = None
+) -> str:
+    """Serialize the digest for the model and record its token estimate.
+
+    If raw_passes is given and INSIGHTS_REPORT_RAW_TOKENS is set, the
+    estimate for sending them verbatim is recorded too, for comparison.
+    """
+    text = _compact(features)
+    token_report["digest_tokens"] = estimate_tokens(text)
+    if raw_passes is not None and INSIGHTS_REPORT_RAW_TOKENS:
+        token_report["raw_tokens"] = estimate_tokens(json.dumps(raw_passes))
+    raw = token_report["raw_tokens"]
+    print(
+        f"[INSIGHTS] Prompt input ~{token_report['digest_tokens']} tokens"
+        + (f" (raw passes ~{raw})" if raw is not None else "")
+    )
+    return text
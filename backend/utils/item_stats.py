@@ -0,0 +1,269 @@
+"""
+Per-user, per-item price statistics kept next to the pass mirror.
+
+Every receipt item with a price updates an exponentially weighted mean and
+variance for (user, item) the first time its pass is mirrored. Before the
+update, the price is scored against the item's history; prices at least
+ITEM_ANOMALY_Z standard deviations away are recorded in item_anomalies.
+Ingesting a receipt costs O(items on the receipt), and looking up the
+anomalies of a date range or of a pass never re-parses any pass.
+
+The statistics are a stream: a pass that is later edited is not re-counted,
+and deleting a pass only drops its anomalies. Rebuild from the mirror with:
+    python -m utils.item_stats
+"""
+
+import json
+import math
+import os
+import sqlite3
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils import pass_index
+from utils.pass_records import parse_pass
+
+# Weight of the newest price in the moving mean and variance
+ITEM_STATS_ALPHA = float(os.getenv("ITEM_STATS_ALPHA", "0.2"))
+# Prices seen before an item can be flagged
+ITEM_STATS_MIN_COUNT = int(os.getenv("ITEM_STATS_MIN_COUNT", "3"))
+ITEM_ANOMALY_Z = float(os.getenv("ITEM_ANOMALY_Z", "2.5"))
+# Lower bound of the standard deviation, relative to the mean, so items with
+# a perfectly stable price are not flagged for a one-cent change
+ITEM_STD_FLOOR_RATIO = 0.05
+
+ITEM_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS item_stats (
+    user_id TEXT NOT NULL,
+    item TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    variance REAL NOT NULL,
+    last_price REAL NOT NULL,
+    last_day TEXT NOT NULL,
+    PRIMARY KEY (user_id, item)
+);
+CREATE TABLE IF NOT EXISTS item_stats_passes (
+    pass_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS item_anomalies (
+    pass_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    item TEXT NOT NULL,  -- as written on the receipt
+    day TEXT NOT NULL,
+    price REAL NOT NULL,
+    mean REAL NOT NULL,
+    z REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS item_anomalies_day ON item_anomalies (user_id, day);
+CREATE INDEX IF NOT EXISTS item_anomalies_pass ON item_anomalies (pass_id);
+"""
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(ITEM_STATS_SCHEMA)
+
+
+def item_key(description: str) -> str:
+    """Normalized item name the statistics are keyed by."""
+    return " ".join(description.lower().split())
+
+
+class ItemStats:
+    """Moving price statistics of one item for one user.
+
+    Attributes:
+        count: Number of prices seen.
+        mean: Exponentially weighted mean price.
+        variance: Exponentially weighted variance of the price.
+        last_price: Most recent price.
+        last_day: Purchase date of the most recent price (ISO format).
+    """
+
+    __slots__ = ("count", "mean", "variance", "last_price", "last_day")
+
+    def __init__(self, count=0, mean=0.0, variance=0.0, last_price=0.0, last_day=""):
+        self.count = count
+        self.mean = mean
+        self.variance = variance
+        self.last_price = last_price
+        self.last_day = last_day
+
+    def z_score(self, price: float) -> Optional[float]:
+        """Standard score of price, None until there is enough history."""
+        if self.count < ITEM_STATS_MIN_COUNT:
+            return None
+        std = max(math.sqrt(self.variance), ITEM_STD_FLOOR_RATIO * abs(self.mean))
+        if std == 0:
+            return None
+        return (price - self.mean) / std
+
+    def update(self, price: float, day: str, alpha: float = ITEM_STATS_ALPHA) -> None:
+        """Fold one price into the moving mean and variance."""
+        if self.count == 0:
+            self.mean, self.variance = price, 0.0
+        else:
+            diff = price - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.variance = (1 - alpha) * (self.variance + diff * increment)
+        self.count += 1
+        self.last_price = price
+        self.last_day = day
+
+
+def _already_ingested(conn: sqlite3.Connection, pass_ids: List[str]) -> set:
+    seen = set()
+    for start in range(0, len(pass_ids), 500):
+        chunk = pass_ids[start : start + 500]
+        placeholders = ",".join("?" for _ in chunk)
+        seen.update(
+            pass_id
+            for (pass_id,) in conn.execute(
+                f"SELECT pass_id FROM item_stats_passes WHERE pass_id IN ({placeholders})",
+                chunk,
+            )
+        )
+    return seen
+
+
+def ingest(conn: sqlite3.Connection, pass_objs: Iterable[Dict[str, Any]]) -> int:
+    """Score and fold the items of passes that were never ingested before.
+
+    Call inside the caller's transaction. Passes are applied in purchase-date
+    order within the batch.
+
+    Returns:
+        The number of anomalies recorded.
+    """
+    latest = {p["id"]: p for p in pass_objs if p.get("id")}
+    seen = _already_ingested(conn, list(latest))
+    owners = pass_index.owners(conn, (p for p in latest if p not in seen))
+    receipts = []
+    for pass_id, pass_obj in latest.items():
+        if pass_id in seen:
+            continue
+        record = parse_pass(pass_obj)
+        priced = [(item_key(d), d, p) for d, p in record.items if p is not None and d]
+        if record.date is not None and priced:
+            receipts.append((record.date.isoformat(), pass_id, owners[pass_id], priced))
+    conn.executemany(
+        "INSERT OR IGNORE INTO item_stats_passes (pass_id) VALUES (?)",
+        [(p,) for p in latest if p not in seen],
+    )
+    if not receipts:
+        return 0
+    receipts.sort()
+
+    stats: Dict[Tuple[str, str], ItemStats] = {}
+    anomalies = []
+    for day, pass_id, user_id, priced in receipts:
+        for item, description, price in priced:
+            key = (user_id, item)
+            current = stats.get(key)
+            if current is None:
+                row = conn.execute(
+                    "SELECT count, mean, variance, last_price, last_day "
+                    "FROM item_stats WHERE user_id = ? AND item = ?",
+                    key,
+                ).fetchone()
+                current = stats[key] = ItemStats(*row) if row else ItemStats()
+            z = current.z_score(price)
+            if z is not None and abs(z) >= ITEM_ANOMALY_Z:
+                anomalies.append(
+                    (pass_id, user_id, description, day, price, current.mean, z)
+                )
+            current.update(price, day)
+    conn.executemany(
+        "INSERT OR REPLACE INTO item_stats "
+        "(user_id, item, count, mean, variance, last_price, last_day) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (user_id, item, s.count, s.mean, s.variance, s.last_price, s.last_day)
+            for (user_id, item), s in stats.items()
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO item_anomalies (pass_id, user_id, item, day, price, mean, z) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        anomalies,
+    )
+    return len(anomalies)
+
+
+def forget_passes(conn: sqlite3.Connection, pass_ids: Iterable[str]) -> None:
+    """Drop the anomalies of deleted passes; their prices stay in the history."""
+    conn.executemany(
+        "DELETE FROM item_anomalies WHERE pass_id = ?", [(p,) for p in pass_ids]
+    )
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Replay every mirrored pass, oldest purchase first.
+
+    Returns:
+        The number of anomalies recorded.
+    """
+    conn.execute("DELETE FROM item_stats")
+    conn.execute("DELETE FROM item_stats_passes")
+    conn.execute("DELETE FROM item_anomalies")
+    return ingest(
+        conn,
+        (json.loads(body) for (body,) in conn.execute("SELECT body FROM passes")),
+    )
+
+
+def _anomaly(pass_id, item, day, price, mean, z) -> Dict[str, Any]:
+    return {
+        "pass_id": pass_id,
+        "item": item,
+        "date": day,
+        "price": price,
+        "usual_price": round(mean, 2),
+        "z_score": round(z, 2),
+    }
+
+
+def anomalies_between(
+    conn: sqlite3.Connection, user_id: str, start: date, end: date
+) -> List[Dict[str, Any]]:
+    """Anomalous item prices of one user bought in [start, end), largest first."""
+    rows = conn.execute(
+        "SELECT pass_id, item, day, price, mean, z FROM item_anomalies "
+        "WHERE user_id = ? AND day >= ? AND day < ? ORDER BY ABS(z) DESC",
+        (user_id, start.isoformat(), end.isoformat()),
+    ).fetchall()
+    return [_anomaly(*row) for row in rows]
+
+
+def pass_anomalies(
+    conn: sqlite3.Connection, pass_ids: Iterable[str]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Anomalous item prices recorded when the passes were ingested.
+
+    Returns:
+        pass_id -> its anomalies, largest first; passes without any map to [].
+    """
+    anomalies: Dict[str, List[Dict[str, Any]]] = {p: [] for p in pass_ids}
+    pass_ids = list(anomalies)
+    for start in range(0, len(pass_ids), 500):
+        chunk = pass_ids[start : start + 500]
+        placeholders = ",".join("?" for _ in chunk)
+        for row in conn.execute(
+            "SELECT pass_id, item, day, price, mean, z FROM item_anomalies "
+            f"WHERE pass_id IN ({placeholders}) ORDER BY ABS(z) DESC",
+            chunk,
+        ):
+            anomalies[row[0]].append(_anomaly(*row))
+    return anomalies
+
+
+def main():
+    from utils.pass_mirror import get_pass_mirror
+
+    count = get_pass_mirror().rebuild_item_stats()
+    print(f"[ITEM STATS] Rebuilt item statistics, {count} anomalies recorded")
+
+
+if __name__ == "__main__":
+    main()
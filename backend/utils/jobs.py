@@ -0,0 +1,275 @@
+"""
+Background jobs run on an APScheduler scheduler.
+
+Jobs are registered by name with an interval; each run is timed and counted,
+and a run that would overlap a still-running one of the same job (scheduled
+or triggered by hand) is skipped. Job threads lower their own CPU priority so
+request threads are served first.
+
+Every worker process starts its own scheduler, so runs are also claimed
+through a lease row in a SQLite file shared by the workers (JOB_LEASE_PATH):
+a worker skips a job while another one holds its lease or finished it less
+than half an interval ago. A lease older than JOB_LEASE_SECONDS is taken
+over, in case its holder died mid-run.
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from utils.lazy import lazy_module
+
+apscheduler_background = lazy_module("apscheduler.schedulers.background")
+apscheduler_executors = lazy_module("apscheduler.executors.pool")
+
+JOBS_ON_START = os.getenv("JOBS_ON_START", "false").lower() == "true"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Niceness of job threads (Linux applies it per thread)
+JOB_NICE = int(os.getenv("JOB_NICE", "10"))
+JOB_LEASE_PATH = os.getenv("JOB_LEASE_PATH", "job_leases.sqlite3")
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "3600"))
+
+_LEASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    leased_until REAL NOT NULL,
+    finished_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+# name -> {"fn", "interval_seconds", "first_run_seconds", "lock"}
+_JOBS: Dict[str, Dict[str, Any]] = {}
+# Runtime metrics per job
+_metrics: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+_scheduler = None
+
+
+def register_job(
+    name: str,
+    fn: Callable[[], Any],
+    interval_seconds: float,
+    first_run_seconds: Optional[float] = None,
+):
+    """Register a background job.
+
+    Args:
+        name: Job name reported by job_stats.
+        fn: Zero-argument callable doing the work.
+        interval_seconds: Delay between scheduled runs.
+        first_run_seconds: Delay before the first run once the scheduler
+            starts; defaults to interval_seconds.
+    """
+    with _lock:
+        _JOBS[name] = {
+            "fn": fn,
+            "interval_seconds": interval_seconds,
+            "first_run_seconds": first_run_seconds,
+            "lock": threading.Lock(),
+        }
+        _metrics.setdefault(
+            name,
+            {
+                "runs": 0,
+                "failures": 0,
+                "skipped_overlaps": 0,
+                "skipped_elsewhere": 0,
+                "running": False,
+                "last_started": None,
+                "last_seconds": None,
+                "total_seconds": 0.0,
+                "last_error": None,
+            },
+        )
+
+
+def _lower_thread_priority() -> None:
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), JOB_NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+def _holder() -> str:
+    """Identifies this process in the lease table (read after any fork)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _lease_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(JOB_LEASE_PATH, timeout=10, isolation_level=None)
+    conn.executescript(_LEASE_SCHEMA)
+    return conn
+
+
+def _acquire_lease(name: str, min_gap_seconds: float) -> bool:
+    """Claim a job for this process across workers.
+
+    Returns:
+        False if another process holds the lease or finished the job less
+        than min_gap_seconds ago.
+    """
+    now = time.time()
+    conn = _lease_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT leased_until, finished_at FROM job_leases WHERE name = ?",
+            (name,),
+        ).fetchone()
+        if row is not None and (row[0] > now or now - row[1] < min_gap_seconds):
+            conn.execute("ROLLBACK")
+            return False
+        conn.execute(
+            "INSERT INTO job_leases (name, holder, leased_until) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET "
+            "holder = excluded.holder, leased_until = excluded.leased_until",
+            (name, _holder(), now + JOB_LEASE_SECONDS),
+        )
+        conn.execute("COMMIT")
+        return True
+    finally:
+        conn.close()
+
+
+def _release_lease(name: str) -> None:
+    conn = _lease_connection()
+    try:
+        conn.execute(
+            "UPDATE job_leases SET leased_until = 0, finished_at = ? "
+            "WHERE name = ? AND holder = ?",
+            (time.time(), name, _holder()),
+        )
+    finally:
+        conn.close()
+
+
+def run_job(name: str, min_gap_seconds: float = 0) -> bool:
+    """Run a job now on the calling thread unless a run is already in progress.
+
+    Args:
+        name: Registered job name.
+        min_gap_seconds: Also skip if any worker finished the job less than
+            this long ago.
+
+    Returns:
+        True if the job ran (successfully or not), False if it was skipped.
+    """
+    job = _JOBS[name]
+    metrics = _metrics[name]
+    if not job["lock"].acquire(blocking=False):
+        with _lock:
+            metrics["skipped_overlaps"] += 1
+        print(f"[JOBS] {name} is still running; skipped")
+        return False
+    try:
+        try:
+            leased = _acquire_lease(name, min_gap_seconds)
+        except sqlite3.Error as e:
+            print(f"[JOBS] Could not claim {name}: {e}")
+            leased = False
+        if not leased:
+            with _lock:
+                metrics["skipped_elsewhere"] += 1
+            return False
+        try:
+            _run_leased(name, job, metrics)
+        finally:
+            try:
+                _release_lease(name)
+            except sqlite3.Error as e:
+                print(f"[JOBS] Could not release {name}: {e}")
+        return True
+    finally:
+        job["lock"].release()
+
+
+def _run_leased(name: str, job: Dict[str, Any], metrics: Dict[str, Any]) -> None:
+    """Run a job whose local lock and lease are held, recording its metrics."""
+    with _lock:
+        metrics["running"] = True
+        metrics["last_started"] = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        job["fn"]()
+    except Exception as e:
+        error = str(e)
+        print(f"[JOBS] {name} failed: {e}")
+    seconds = round(time.perf_counter() - start, 4)
+    with _lock:
+        metrics["running"] = False
+        metrics["runs"] += 1
+        metrics["failures"] += error is not None
+        metrics["last_seconds"] = seconds
+        metrics["total_seconds"] = round(metrics["total_seconds"] + seconds, 4)
+        metrics["last_error"] = error
+    print(f"[JOBS] {name}: {'failed' if error else 'done'} in {seconds}s")
+
+
+def _scheduled_run(name: str) -> None:
+    _lower_thread_priority()
+    # Every worker's scheduler fires; the first one to claim the run wins
+    run_job(name, min_gap_seconds=_JOBS[name]["interval_seconds"] / 2)
+
+
+def start_scheduler() -> bool:
+    """Start the background scheduler with every registered job (idempotent).
+
+    Returns:
+        True if a new scheduler was started.
+    """
+    global _scheduler
+    with _lock:
+        if _scheduler is not None:
+            return False
+        scheduler = apscheduler_background.BackgroundScheduler(
+            executors={
+                "default": apscheduler_executors.ThreadPoolExecutor(JOB_WORKERS)
+            },
+            # One instance per job; missed runs collapse into one
+            job_defaults={"max_instances": 1, "coalesce": True},
+            daemon=True,
+        )
+        for name, job in _JOBS.items():
+            first_run = job["first_run_seconds"]
+            if first_run is None:
+                first_run = job["interval_seconds"]
+            scheduler.add_job(
+                _scheduled_run,
+                "interval",
+                args=[name],
+                id=name,
+                seconds=job["interval_seconds"],
+                next_run_time=datetime.now() + timedelta(seconds=first_run),
+            )
+        scheduler.start()
+        _scheduler = scheduler
+    print(f"[JOBS] Scheduler started with {len(_JOBS)} jobs")
+    return True
+
+
+def scheduler_running() -> bool:
+    return _scheduler is not None and _scheduler.running
+
+
+def job_stats() -> Dict[str, Any]:
+    """Registry and runtime metrics of every job."""
+    with _lock:
+        jobs = {}
+        for name, job in _JOBS.items():
+            scheduled = _scheduler.get_job(name) if _scheduler is not None else None
+            jobs[name] = {
+                "interval_seconds": job["interval_seconds"],
+                "next_run": (
+                    scheduled.next_run_time.isoformat()
+                    if scheduled is not None and scheduled.next_run_time
+                    else None
+                ),
+                **_metrics[name],
+            }
+    return {"scheduler_running": scheduler_running(), "jobs": jobs}
@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+
+class KnownIdCache:
+    """Bounded, thread-safe LRU set of Wallet class/object IDs known to exist.
+
+    Wallet classes and objects are never deleted by this app, so once an ID has
+    been seen on the server a repeat existence check can be answered locally.
+
+    Attributes:
+        maxsize: Maximum number of IDs kept; the least recently used is evicted.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, resource_id: str) -> bool:
+        with self._lock:
+            if resource_id in self._ids:
+                self._ids.move_to_end(resource_id)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, resource_id: str) -> None:
+        with self._lock:
+            self._ids[resource_id] = True
+            self._ids.move_to_end(resource_id)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def discard(self, resource_id: str) -> None:
+        with self._lock:
+            self._ids.pop(resource_id, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._ids), "hits": self.hits, "misses": self.misses}
+
+
+# Shared by every DemoGeneric instance in the process
+known_wallet_ids = KnownIdCache()
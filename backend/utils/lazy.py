@@ -0,0 +1,98 @@
+import importlib
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Every Lazy created in the process, in creation order. Used by the health /
+# readiness endpoints to report which heavy components have been built.
+_REGISTRY: List["Lazy"] = []
+_REGISTRY_LOCK = threading.Lock()
+
+
+class Lazy:
+    """Thread-safe, build-once holder for an expensive object.
+
+    The factory runs on the first call to ``get()``; concurrent callers block
+    on the same lock and all receive the single instance it produced. If the
+    factory raises, nothing is cached and the next caller retries.
+
+    Attributes:
+        name: Human readable component name used in status reports.
+        init_seconds: Wall time spent in the factory, once initialized.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._initialized = False
+        self.init_seconds: Optional[float] = None
+        with _REGISTRY_LOCK:
+            _REGISTRY.append(self)
+
+    @property
+    def initialized(self) -> bool:
+        return self._initialized
+
+    def get(self) -> Any:
+        """Return the instance, building it on first use."""
+        if self._initialized:
+            return self._value
+        with self._lock:
+            if not self._initialized:
+                start = time.perf_counter()
+                self._value = self._factory()
+                self.init_seconds = round(time.perf_counter() - start, 4)
+                self._initialized = True
+                print(f"[LAZY] Initialized {self.name} in {self.init_seconds}s")
+        return self._value
+
+    def reset(self) -> None:
+        """Drop the cached instance so the next ``get()`` rebuilds it."""
+        with self._lock:
+            self._value = None
+            self._initialized = False
+            self.init_seconds = None
+
+
+class LazyModule:
+    """Module proxy that defers ``import`` until an attribute is accessed.
+
+    Lets heavy packages (PyMuPDF, PIL, google.generativeai, ...) stay out of
+    the import graph of ``app.py`` until a route actually needs them.
+    """
+
+    def __init__(self, module_name: str):
+        self._module_name = module_name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._module_name)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._module_name} ({state})>"
+
+
+def lazy_module(module_name: str) -> LazyModule:
+    """Return a proxy for ``module_name`` that imports it on first use."""
+    return LazyModule(module_name)
+
+
+def lazy_status() -> Dict[str, Dict[str, Any]]:
+    """Report initialization state and build time of every Lazy component."""
+    with _REGISTRY_LOCK:
+        components = list(_REGISTRY)
+    return {
+        c.name: {"initialized": c.initialized, "init_seconds": c.init_seconds}
+        for c in components
+    }
@@ -1,12 +1,18 @@
 from flask import Flask, request, jsonify
 import requests
 import uuid
-import google.generativeai as genai
 import json
 import os
+from utils.lazy import lazy_module
+from utils.single_flight import SingleFlight
+
+genai = lazy_module("google.generativeai")
 
 app = Flask(__name__)
 
+# Concurrent requests for the same cards and intent share one Gemini call
+_gemini_offers_flight = SingleFlight("gemini_offers")
+
 # Config for fi-mcp-dev
 
 # For demo, use a fixed or random session id per user/session
@@ -91,7 +97,14 @@ def get_mocked_offers(credit_cards, intent):
 def get_gemini_offers(credit_cards, intent):
     """
     Uses Gemini API to generate offers for the given credit cards and intent.
+    Identical concurrent requests are coalesced into a single Gemini call.
     """
+    key = (tuple(sorted(credit_cards)), intent)
+    return _gemini_offers_flight.do(
+        key, lambda: _generate_gemini_offers(credit_cards, intent)
+    )
+
+def _generate_gemini_offers(credit_cards, intent):
     import os
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PASS_CACHE_TTL_SECONDS = float(os.getenv("PASS_CACHE_TTL_SECONDS", "60"))
+
+
+class PassListingCache:
+    """Thread-safe TTL cache of pass listings, keyed by full class ID.
+
+    A class can hold several listings, one per partition (e.g. per user).
+    Entries expire after ttl_seconds and are dropped early by invalidate()
+    whenever this app writes an object of that class. Cached lists are shared
+    between callers and must not be mutated.
+
+    Attributes:
+        ttl_seconds: How long a listing is served before it is reloaded.
+    """
+
+    def __init__(self, ttl_seconds: float = PASS_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        # class_id -> partition -> (expiry, listing)
+        self._entries: Dict[
+            str, Dict[Optional[str], Tuple[float, List[Dict[str, Any]]]]
+        ] = {}
+        # Bumped on every invalidation so a load that started before it is
+        # not stored afterwards.
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(
+        self,
+        class_id: str,
+        loader: Callable[[], List[Dict[str, Any]]],
+        partition: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the cached listing for a class, calling loader on a miss.
+
+        Args:
+            class_id: Full class ID (e.g., 'issuer_id.CLASS_SUFFIX').
+            loader: Returns the current listing; errors are not cached.
+            partition: Which slice of the class the listing holds, e.g. a
+                user ID; None is the whole class.
+
+        Returns:
+            The list of pass objects for the class.
+        """
+        with self._lock:
+            entry = self._entries.get(class_id, {}).get(partition)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generations.get(class_id, 0)
+        passes = loader()
+        with self._lock:
+            if self._generations.get(class_id, 0) == generation:
+                self._entries.setdefault(class_id, {})[partition] = (
+                    time.monotonic() + self.ttl_seconds,
+                    passes,
+                )
+        return passes
+
+    def invalidate(self, class_id: str) -> None:
+        """Drop every cached listing of a class after one of its objects changed."""
+        with self._lock:
+            self._entries.pop(class_id, None)
+            self._generations[class_id] = self._generations.get(class_id, 0) + 1
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for class_id in self._entries:
+                self._generations[class_id] = self._generations.get(class_id, 0) + 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": sum(len(p) for p in self._entries.values()),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+# Shared by the analytics endpoints and every wallet write path
+pass_listing_cache = PassListingCache()
@@ -0,0 +1,129 @@
+"""
+Index of which user owns which pass, kept next to the pass mirror.
+
+Every Wallet class holds the passes of all users, so analytics read a user's
+partition through this index instead of scanning the class. The owner is
+claimed when our endpoints create a pass (before the object is written, so
+the write-through already sees it); a pass that already has an owner is
+never claimed by another user. Passes created elsewhere belong to
+DEFAULT_USER_ID.
+"""
+
+import sqlite3
+from typing import Dict, Iterable, List
+
+# Owner of passes that were not created for a specific user
+DEFAULT_USER_ID = "default"
+
+PASS_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pass_owners (
+    pass_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pass_owners_user ON pass_owners (user_id, pass_id);
+"""
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create the index and give every mirrored pass without an owner the default."""
+    conn.executescript(PASS_INDEX_SCHEMA)
+    conn.execute(
+        "INSERT OR IGNORE INTO pass_owners (pass_id, user_id) "
+        "SELECT id, ? FROM passes",
+        (DEFAULT_USER_ID,),
+    )
+
+
+def assign(conn: sqlite3.Connection, pass_ids: Iterable[str], user_id: str) -> None:
+    """Record user_id as the owner of pass_ids, replacing any previous owner."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO pass_owners (pass_id, user_id) VALUES (?, ?)",
+        [(pass_id, user_id) for pass_id in pass_ids],
+    )
+
+
+class OwnerConflict(ValueError):
+    """Some of the passes already belong to another user.
+
+    Attributes:
+        owners: pass_id -> its current owner, for the conflicting passes.
+    """
+
+    def __init__(self, owners: Dict[str, str]):
+        super().__init__(f"Passes owned by another user: {sorted(owners)}")
+        self.owners = owners
+
+
+def claim(conn: sqlite3.Connection, pass_ids: Iterable[str], user_id: str) -> List[str]:
+    """Record user_id as the owner of those pass_ids that have no owner yet.
+
+    Returns:
+        The pass IDs claimed by this call; passes user_id already owned are
+        left out.
+
+    Raises:
+        OwnerConflict: If any pass belongs to another user; nothing is
+            recorded then.
+    """
+    pass_ids = list(dict.fromkeys(pass_ids))
+    current = {}
+    for start in range(0, len(pass_ids), 500):
+        chunk = pass_ids[start : start + 500]
+        placeholders = ",".join("?" for _ in chunk)
+        current.update(
+            conn.execute(
+                "SELECT pass_id, user_id FROM pass_owners "
+                f"WHERE pass_id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+        )
+    conflicts = {p: owner for p, owner in current.items() if owner != user_id}
+    if conflicts:
+        raise OwnerConflict(conflicts)
+    claimed = [p for p in pass_ids if p not in current]
+    conn.executemany(
+        "INSERT OR IGNORE INTO pass_owners (pass_id, user_id) VALUES (?, ?)",
+        [(pass_id, user_id) for pass_id in claimed],
+    )
+    return claimed
+
+
+def claim_unowned(conn: sqlite3.Connection, pass_ids: Iterable[str]) -> None:
+    """Give passes that have no owner yet to DEFAULT_USER_ID."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO pass_owners (pass_id, user_id) VALUES (?, ?)",
+        [(pass_id, DEFAULT_USER_ID) for pass_id in pass_ids],
+    )
+
+
+def forget(conn: sqlite3.Connection, pass_ids: Iterable[str]) -> None:
+    conn.executemany(
+        "DELETE FROM pass_owners WHERE pass_id = ?", [(p,) for p in pass_ids]
+    )
+
+
+def owners(conn: sqlite3.Connection, pass_ids: Iterable[str]) -> Dict[str, str]:
+    """Owner of each pass; passes missing from the index map to DEFAULT_USER_ID."""
+    pass_ids = list(pass_ids)
+    found = {}
+    for start in range(0, len(pass_ids), 500):
+        chunk = pass_ids[start : start + 500]
+        placeholders = ",".join("?" for _ in chunk)
+        found.update(
+            conn.execute(
+                "SELECT pass_id, user_id FROM pass_owners "
+                f"WHERE pass_id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+        )
+    return {pass_id: found.get(pass_id, DEFAULT_USER_ID) for pass_id in pass_ids}
+
+
+def users(conn: sqlite3.Connection) -> List[str]:
+    """Every user that owns at least one pass."""
+    return [
+        user_id
+        for (user_id,) in conn.execute(
+            "SELECT DISTINCT user_id FROM pass_owners ORDER BY user_id"
+        )
+    ]
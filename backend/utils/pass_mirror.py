@@ -0,0 +1,553 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils import (
+    budgets,
+    item_stats,
+    pass_index,
+    receipt_snapshot,
+    rollups,
+    spending_query,
+)
+from utils.lazy import Lazy
+
+PASS_MIRROR_PATH = os.getenv("PASS_MIRROR_PATH", "pass_mirror.sqlite3")
+PASS_MIRROR_SYNC_SECONDS = float(os.getenv("PASS_MIRROR_SYNC_SECONDS", "300"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS passes (
+    id TEXT PRIMARY KEY,
+    class_id TEXT NOT NULL,
+    state TEXT,
+    version TEXT NOT NULL,
+    body TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS passes_class_id ON passes (class_id);
+CREATE TABLE IF NOT EXISTS class_sync (
+    class_id TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL
+);
+-- Latest precomputed LLM insights per user, shared by every worker
+CREATE TABLE IF NOT EXISTS user_insights (
+    user_id TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    insights TEXT NOT NULL
+);
+"""
+
+
+def pass_version(pass_obj: Dict[str, Any]) -> str:
+    """Version tag for a pass: the Wallet "version" field, else a content hash."""
+    version = pass_obj.get("version")
+    if version:
+        return str(version)
+    body = json.dumps(pass_obj, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+class PassMirror:
+    """Persistent local copy of Wallet pass objects, kept in SQLite.
+
+    Our own create/update paths write through to it and a periodic reconcile
+    against the Wallet list API catches everything else, so analytics can read
+    passes locally instead of paging through the API on every request.
+
+    Attributes:
+        db_path: Path of the SQLite database file.
+    """
+
+    def __init__(self, db_path: str = PASS_MIRROR_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        pass_index.ensure_schema(self._conn)
+        needs_rebuild = rollups.ensure_schema(self._conn)
+        item_stats.ensure_schema(self._conn)
+        budgets.ensure_schema(self._conn)
+        self._conn.commit()
+        # Rollups are backfilled once for databases that predate them or one
+        # of their columns
+        (has_passes,) = self._conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM passes)"
+        ).fetchone()
+        (has_rollups,) = self._conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM pass_contributions)"
+        ).fetchone()
+        if needs_rebuild or (has_passes and not has_rollups):
+            self.rebuild_rollups()
+        (has_item_stats,) = self._conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM item_stats_passes)"
+        ).fetchone()
+        if has_passes and not has_item_stats:
+            self.rebuild_item_stats()
+        self._reconciler: Optional[threading.Thread] = None
+
+    def upsert(self, pass_obj: Dict[str, Any]) -> None:
+        """Insert or replace a single pass object."""
+        self.upsert_many([pass_obj])
+
+    def upsert_many(self, pass_objs: Iterable[Dict[str, Any]]) -> int:
+        """Insert or replace pass objects; returns how many rows were written.
+
+        The daily rollups are moved from each pass's previous version to the
+        new one, the budgets of the current month are re-evaluated, and the
+        items of passes seen for the first time are folded into the item
+        statistics, in the same transaction. Budget events are dispatched
+        after the commit.
+        """
+        now = time.time()
+        pass_objs = [p for p in pass_objs if p.get("id")]
+        rows = [
+            (
+                p["id"],
+                p.get("classId", ""),
+                p.get("state"),
+                pass_version(p),
+                json.dumps(p),
+                now,
+            )
+            for p in pass_objs
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            pass_index.claim_unowned(self._conn, (p["id"] for p in pass_objs))
+            new = rollups.apply_passes(
+                self._conn, [p["id"] for p in pass_objs], pass_objs
+            )
+            events = budgets.evaluate(self._conn, budgets.current_month_keys(new))
+            item_stats.ingest(self._conn, pass_objs)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO passes "
+                "(id, class_id, state, version, body, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        budgets.dispatch(events)
+        return len(rows)
+
+    def list_passes(
+        self, class_ids: Iterable[str], user_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Return every mirrored pass belonging to the given classes.
+
+        Args:
+            user_id: Only return this user's passes, read through the owner
+                index; None returns the passes of every user.
+        """
+        class_ids = list(class_ids)
+        if not class_ids:
+            return []
+        placeholders = ",".join("?" for _ in class_ids)
+        if user_id is None:
+            sql = (
+                f"SELECT body FROM passes WHERE class_id IN ({placeholders}) "
+                "ORDER BY id"
+            )
+            params = class_ids
+        else:
+            sql = (
+                "SELECT body FROM pass_owners JOIN passes ON passes.id = pass_id "
+                f"WHERE user_id = ? AND class_id IN ({placeholders}) ORDER BY id"
+            )
+            params = [user_id, *class_ids]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def versions(self, class_id: str, user_id: Optional[str] = None) -> Dict[str, str]:
+        """Map of pass ID to version tag for one class, optionally of one user."""
+        with self._lock:
+            if user_id is None:
+                rows = self._conn.execute(
+                    "SELECT id, version FROM passes WHERE class_id = ?", (class_id,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, version FROM pass_owners "
+                    "JOIN passes ON passes.id = pass_id "
+                    "WHERE user_id = ? AND class_id = ?",
+                    (user_id, class_id),
+                ).fetchall()
+        return dict(rows)
+
+    def assign_owner(self, pass_ids: Iterable[str], user_id: str) -> None:
+        """Move passes to user_id, replacing any previous owner.
+
+        Passes already mirrored have their rollups moved to the new owner.
+        Endpoints acting for a caller use claim_owner instead, which never
+        takes a pass from another user.
+        """
+        pass_ids = list(pass_ids)
+        with self._lock:
+            pass_index.assign(self._conn, pass_ids, user_id)
+            bodies = []
+            for pass_id in pass_ids:
+                row = self._conn.execute(
+                    "SELECT body FROM passes WHERE id = ?", (pass_id,)
+                ).fetchone()
+                if row:
+                    bodies.append(json.loads(row[0]))
+            new = rollups.apply_passes(self._conn, [p["id"] for p in bodies], bodies)
+            events = budgets.evaluate(self._conn, budgets.current_month_keys(new))
+            self._conn.commit()
+        budgets.dispatch(events)
+
+    def claim_owner(self, pass_ids: Iterable[str], user_id: str) -> List[str]:
+        """Record user_id as the owner of unowned passes; call before creating them.
+
+        Once the create returned (or failed), hand the result to release_owner.
+
+        Returns:
+            The pass IDs claimed by this call.
+
+        Raises:
+            pass_index.OwnerConflict: If a pass belongs to another user.
+        """
+        with self._lock:
+            try:
+                claimed = pass_index.claim(self._conn, pass_ids, user_id)
+            except pass_index.OwnerConflict:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+        return claimed
+
+    def release_owner(self, pass_ids: Iterable[str]) -> None:
+        """Drop claims (see claim_owner) of passes that did not reach the mirror.
+
+        That is the case when the create failed, and when the object already
+        existed in Wallet, so it was not written through and is not the
+        claimer's to take. Passes that made it into the mirror keep their owner.
+        """
+        with self._lock:
+            pass_index.forget(
+                self._conn,
+                [
+                    pass_id
+                    for pass_id in pass_ids
+                    if not self._conn.execute(
+                        "SELECT 1 FROM passes WHERE id = ?", (pass_id,)
+                    ).fetchone()
+                ],
+            )
+            self._conn.commit()
+
+    def users(self) -> List[str]:
+        """Every user in the owner index."""
+        with self._lock:
+            return pass_index.users(self._conn)
+
+    def last_synced(self, class_id: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at FROM class_sync WHERE class_id = ?", (class_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def reconcile(
+        self,
+        class_id: str,
+        remote_passes: List[Dict[str, Any]],
+        listed_at: Optional[float] = None,
+    ) -> Dict[str, int]:
+        """Bring one class in line with a full listing from the Wallet API.
+
+        Only new or changed passes (by version tag) are written, and passes no
+        longer listed are removed.
+
+        Args:
+            class_id: Full class ID that was listed.
+            remote_passes: Every pass the Wallet API returned for the class.
+            listed_at: When the listing started. Rows written through after
+                that are kept even if the listing did not include them yet.
+
+        Returns:
+            Counts of written and removed rows.
+        """
+        return self.reconcile_pages(class_id, [remote_passes], listed_at)
+
+    def reconcile_pages(
+        self,
+        class_id: str,
+        pages: Iterable[List[Dict[str, Any]]],
+        listed_at: Optional[float] = None,
+    ) -> Dict[str, int]:
+        """Like reconcile, but consumes the listing one page at a time.
+
+        Changed passes are written as each page arrives, so only the IDs of
+        the class are held in memory, never the whole listing.
+        """
+        sync = self.begin_reconcile(class_id, listed_at)
+        for page in pages:
+            sync.add_page(page)
+        return sync.finish()
+
+    def begin_reconcile(
+        self, class_id: str, listed_at: Optional[float] = None
+    ) -> "ClassReconcile":
+        """Start a reconcile that is fed pages as they arrive (see ClassReconcile).
+
+        Lets one consumer reconcile several classes whose pages interleave.
+        """
+        return ClassReconcile(self, class_id, listed_at or time.time())
+
+    def _finish_reconcile(
+        self,
+        class_id: str,
+        local: Dict[str, str],
+        remote_ids: set,
+        listed_at: float,
+        written: int,
+    ) -> Dict[str, int]:
+        removed = [pass_id for pass_id in local if pass_id not in remote_ids]
+        with self._lock:
+            # Rows written through after the listing started are kept
+            removed = [
+                pass_id
+                for pass_id in removed
+                if self._conn.execute(
+                    "SELECT 1 FROM passes WHERE id = ? AND updated_at < ?",
+                    (pass_id, listed_at),
+                ).fetchone()
+            ]
+            if removed:
+                self._conn.executemany(
+                    "DELETE FROM passes WHERE id = ?", [(p,) for p in removed]
+                )
+                rollups.apply_passes(self._conn, removed)
+                item_stats.forget_passes(self._conn, removed)
+                pass_index.forget(self._conn, removed)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO class_sync (class_id, synced_at) VALUES (?, ?)",
+                (class_id, time.time()),
+            )
+            self._conn.commit()
+        return {"written": written, "removed": len(removed)}
+
+    def count_passes(
+        self, class_ids: Iterable[str], user_id: Optional[str] = None
+    ) -> int:
+        """Number of mirrored passes in the given classes, optionally of one user."""
+        class_ids = list(class_ids)
+        if not class_ids:
+            return 0
+        placeholders = ",".join("?" for _ in class_ids)
+        if user_id is None:
+            sql = f"SELECT COUNT(*) FROM passes WHERE class_id IN ({placeholders})"
+            params = class_ids
+        else:
+            sql = (
+                "SELECT COUNT(*) FROM pass_owners JOIN passes ON passes.id = pass_id "
+                f"WHERE user_id = ? AND class_id IN ({placeholders})"
+            )
+            params = [user_id, *class_ids]
+        with self._lock:
+            (count,) = self._conn.execute(sql, params).fetchone()
+        return count
+
+    def rollup_totals(
+        self,
+        user_id: str,
+        start: date,
+        end: date,
+        categories: Optional[List[str]] = None,
+    ) -> rollups.RangeTotals:
+        """Daily rollup totals of one user over [start, end) (see utils.rollups)."""
+        with self._lock:
+            return rollups.range_totals(self._conn, user_id, start, end, categories)
+
+    def rollup_series(
+        self,
+        user_id: str,
+        start: date,
+        end: date,
+        categories: Optional[List[str]] = None,
+        merchant: Optional[str] = None,
+    ) -> List[tuple]:
+        """Per-day rollup rows of one user over [start, end) (see utils.rollups)."""
+        with self._lock:
+            return rollups.daily_series(
+                self._conn, user_id, start, end, categories, merchant
+            )
+
+    def query(
+        self, user_id: str, spec: Dict[str, Any], today: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """Run an ad-hoc analytics query over one user's receipts.
+
+        See utils.spending_query for the spec; raises QueryError if it is
+        malformed.
+        """
+        with self._lock:
+            return spending_query.run_query(self._conn, spec, user_id, today)
+
+    def set_budget(self, user_id: str, category: str, monthly_limit: float) -> None:
+        """Set a user's monthly limit for a category and evaluate it right away."""
+        with self._lock:
+            budgets.set_budget(self._conn, user_id, category, monthly_limit)
+            events = budgets.evaluate(self._conn, [(user_id, category)])
+            self._conn.commit()
+        budgets.dispatch(events)
+
+    def budget_status(self, user_id: str) -> List[dict]:
+        """This month's spending against each of a user's budgets."""
+        with self._lock:
+            return budgets.budget_status(self._conn, user_id)
+
+    def store_insights(
+        self, user_id: str, digest: str, insights: Dict[str, Any]
+    ) -> None:
+        """Keep a user's latest insights and the pass digest they were built from."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO user_insights "
+                "(user_id, digest, created_at, insights) VALUES (?, ?, ?, ?)",
+                (user_id, digest, time.time(), json.dumps(insights)),
+            )
+            self._conn.commit()
+
+    def stored_insights(self, user_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """The (digest, insights) last stored for a user, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest, insights FROM user_insights WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def rollup_generation(self) -> int:
+        """Counter that changes with every change to the contributions."""
+        with self._lock:
+            return rollups.generation(self._conn)
+
+    def export_receipts(self) -> "receipt_snapshot.ReceiptColumns":
+        """Every contribution and line item as columns (see utils.receipt_snapshot).
+
+        Reads through its own connection so the mirror's lock is not held
+        while the columns are built; an in-memory mirror has no file to open
+        and is read under the lock.
+        """
+        if self.db_path == ":memory:":
+            with self._lock:
+                return receipt_snapshot.export_columns(self._conn)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return receipt_snapshot.export_columns(conn)
+        finally:
+            conn.close()
+
+    def rebuild_rollups(self) -> int:
+        """Recompute the daily rollups from every mirrored pass."""
+        with self._lock:
+            count = rollups.rebuild(self._conn)
+            self._conn.commit()
+        return count
+
+    def item_anomalies(self, user_id: str, start: date, end: date) -> List[dict]:
+        """Anomalous item prices of one user in [start, end) (see utils.item_stats)."""
+        with self._lock:
+            return item_stats.anomalies_between(self._conn, user_id, start, end)
+
+    def pass_anomalies(self, pass_ids: Iterable[str]) -> Dict[str, List[dict]]:
+        """Anomalous item prices found when each pass was ingested."""
+        with self._lock:
+            return item_stats.pass_anomalies(self._conn, pass_ids)
+
+    def rebuild_item_stats(self) -> int:
+        """Replay every mirrored pass into the item statistics."""
+        with self._lock:
+            count = item_stats.rebuild(self._conn)
+            self._conn.commit()
+        return count
+
+    def start_reconciler(
+        self,
+        sync_fn: Callable[[], Any],
+        interval_seconds: float = PASS_MIRROR_SYNC_SECONDS,
+    ) -> bool:
+        """Call sync_fn every interval_seconds on a daemon thread.
+
+        Args:
+            sync_fn: Lists the mirrored classes from the Wallet API and
+                reconciles them (see app.sync_pass_mirror_classes).
+            interval_seconds: Delay between reconcile rounds.
+
+        Returns:
+            True if a new reconciler thread was started.
+        """
+        with self._lock:
+            if self._reconciler is not None and self._reconciler.is_alive():
+                return False
+
+            def loop():
+                while True:
+                    time.sleep(interval_seconds)
+                    try:
+                        sync_fn()
+                    except Exception as e:
+                        print(f"[PASS MIRROR] Reconcile round failed: {e}")
+
+            self._reconciler = threading.Thread(
+                target=loop, name="pass-mirror-reconciler", daemon=True
+            )
+            self._reconciler.start()
+            return True
+
+
+class ClassReconcile:
+    """Reconcile of one class in progress; see PassMirror.begin_reconcile.
+
+    Changed passes are written by add_page as their page arrives. finish()
+    removes the passes the listing no longer contained, so only call it
+    once every page of the class was added; a listing that failed part way
+    is simply not finished, which keeps the class as it was apart from the
+    pages already written.
+    """
+
+    def __init__(self, mirror: PassMirror, class_id: str, listed_at: float):
+        self.class_id = class_id
+        self._mirror = mirror
+        self._listed_at = listed_at
+        self._local = mirror.versions(class_id)
+        self._remote_ids: set = set()
+        self._written = 0
+
+    def add_page(self, page: List[Dict[str, Any]]) -> None:
+        self._remote_ids.update(p.get("id") for p in page)
+        self._written += self._mirror.upsert_many(
+            p for p in page if self._local.get(p.get("id")) != pass_version(p)
+        )
+
+    def finish(self) -> Dict[str, int]:
+        """Remove passes that were not listed and record the sync.
+
+        Returns:
+            Counts of written and removed rows.
+        """
+        return self._mirror._finish_reconcile(
+            self.class_id,
+            self._local,
+            self._remote_ids,
+            self._listed_at,
+            self._written,
+        )
+
+
+_pass_mirror = Lazy("pass_mirror", PassMirror)
+
+
+def get_pass_mirror() -> PassMirror:
+    """Return the process-wide pass mirror, opening the database on first use."""
+    return _pass_mirror.get()
@@ -0,0 +1,227 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Category shown in analytics for each Wallet class suffix
+CLASS_SUFFIX_TO_CATEGORY = {
+    "GroceryClass": "groceries",
+    "TravelClass": "travel",
+    "HealthClass": "health",
+    "EntertainmentClass": "entertainment",
+    "EducationClass": "education",
+}
+
+PASS_RECORD_CACHE_SIZE = int(os.getenv("PASS_RECORD_CACHE_SIZE", "200000"))
+
+# "Bananas (1.20)" as written by the frontend receipt upload
+_PRICED_ITEM = re.compile(r"^(.*?)\s*\(([-\d.]+)\)$")
+
+
+class PassRecord:
+    """The fields analytics reads from a Wallet pass, parsed once.
+
+    Attributes:
+        id: Wallet object ID.
+        class_id: Full class ID (e.g., 'issuer_id.GroceryClass').
+        date: Purchase date from DATE_MODULE, or None if missing/invalid.
+        amount: Total from TOTAL_MODULE, or None if missing/invalid.
+        currency: Currency code in front of the total (e.g., 'USD'), or ''.
+        category: Analytics category derived from the class suffix.
+        merchant: Body of MERCHANT_MODULE, or ''.
+        items: (description, price) pairs from ITEMS_MODULE; price is None
+            when the pass only lists item names.
+    """
+
+    __slots__ = (
+        "id",
+        "class_id",
+        "date",
+        "amount",
+        "currency",
+        "category",
+        "merchant",
+        "items",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        class_id: str,
+        date: Optional[date],
+        amount: Optional[float],
+        currency: str,
+        category: str,
+        merchant: str,
+        items: Tuple[Tuple[str, Optional[float]], ...],
+    ):
+        self.id = id
+        self.class_id = class_id
+        self.date = date
+        self.amount = amount
+        self.currency = currency
+        self.category = category
+        self.merchant = merchant
+        self.items = items
+
+    @property
+    def valid(self) -> bool:
+        """True if the pass has both a date and an amount."""
+        return self.date is not None and self.amount is not None
+
+    def __repr__(self) -> str:
+        return (
+            f"PassRecord(id={self.id!r}, date={self.date}, amount={self.amount}, "
+            f"category={self.category!r})"
+        )
+
+
+def category_for_class(class_id: str) -> str:
+    """Map 'issuer_id.GroceryClass' to 'groceries'; unknown suffixes pass through."""
+    parts = class_id.split(".")
+    class_suffix = parts[1] if len(parts) >= 2 else None
+    return CLASS_SUFFIX_TO_CATEGORY.get(class_suffix, class_suffix or "Unknown")
+
+
+def _parse_items(body: str) -> Tuple[Tuple[str, Optional[float]], ...]:
+    if not body:
+        return ()
+    items = None
+    if body.lstrip().startswith("["):
+        try:
+            items = json.loads(body)
+        except ValueError:
+            pass
+    if isinstance(items, list):
+        parsed = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                price = float(item.get("price", 0.0))
+            except (TypeError, ValueError):
+                price = 0.0
+            parsed.append((item.get("description", "Unknown"), price))
+        return tuple(parsed)
+    parsed = []
+    for part in body.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = _PRICED_ITEM.match(part)
+        if match:
+            try:
+                parsed.append((match.group(1), float(match.group(2))))
+                continue
+            except ValueError:
+                pass
+        parsed.append((part, None))
+    return tuple(parsed)
+
+
+def _parse_date(body: Optional[str]) -> Optional[date]:
+    # Fast path for zero-padded 'YYYY-MM-DD'; strptime handles the rest
+    if body and len(body) == 10 and body[4] == "-" and body[7] == "-":
+        year, month, day = body[:4], body[5:7], body[8:]
+        if year.isdigit() and month.isdigit() and day.isdigit():
+            try:
+                return date(int(year), int(month), int(day))
+            except ValueError:
+                return None
+    try:
+        return datetime.strptime(body, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_pass(pass_obj: Dict[str, Any]) -> PassRecord:
+    modules = {}
+    for m in pass_obj.get("textModulesData", []):
+        modules.setdefault(m.get("id"), m.get("body") or "")
+    pass_date = _parse_date(modules.get("DATE_MODULE"))
+    # Total is like 'USD 123.45'
+    total = modules.get("TOTAL_MODULE", "").split()
+    try:
+        amount = float(total[-1])
+    except (IndexError, ValueError):
+        amount = None
+    class_id = pass_obj.get("classId", "")
+    return PassRecord(
+        id=pass_obj.get("id", ""),
+        class_id=class_id,
+        date=pass_date,
+        amount=amount,
+        currency=total[0] if len(total) > 1 else "",
+        category=category_for_class(class_id),
+        merchant=modules.get("MERCHANT_MODULE", ""),
+        items=_parse_items(modules.get("ITEMS_MODULE", "")),
+    )
+
+
+def _version_key(pass_obj: Dict[str, Any]) -> Hashable:
+    version = pass_obj.get("version")
+    if version:
+        return str(version)
+    # Generic objects rarely carry a version, so fall back to the fields the
+    # parser reads; hashing them is far cheaper than parsing them.
+    return (
+        pass_obj.get("classId"),
+        tuple(
+            (m.get("id"), m.get("body")) for m in pass_obj.get("textModulesData", [])
+        ),
+    )
+
+
+class PassRecordCache:
+    """Memoizes parse results by object ID and version, bounded LRU.
+
+    Attributes:
+        maxsize: Maximum number of pass IDs kept.
+    """
+
+    def __init__(self, maxsize: int = PASS_RECORD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._records: "OrderedDict[str, Tuple[Hashable, PassRecord]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, pass_obj: Dict[str, Any]) -> PassRecord:
+        """Return the record for a pass, parsing it only if it is new or changed."""
+        pass_id = pass_obj.get("id")
+        if not pass_id:
+            return _parse_pass(pass_obj)
+        key = _version_key(pass_obj)
+        with self._lock:
+            cached = self._records.get(pass_id)
+            if cached is not None and cached[0] == key:
+                self._records.move_to_end(pass_id)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        record = _parse_pass(pass_obj)
+        with self._lock:
+            self._records[pass_id] = (key, record)
+            self._records.move_to_end(pass_id)
+            while len(self._records) > self.maxsize:
+                self._records.popitem(last=False)
+        return record
+
+    def stats(self) -> dict:
+        return {"size": len(self._records), "hits": self.hits, "misses": self.misses}
+
+
+pass_records = PassRecordCache()
+
+
+def parse_pass(pass_obj: Dict[str, Any]) -> PassRecord:
+    """Parse a Wallet pass into a PassRecord, shared across analytics paths."""
+    return pass_records.parse(pass_obj)
+
+
+def parse_passes(passes: Iterable[Dict[str, Any]]) -> List[PassRecord]:
+    """parse_pass over a list of passes, preserving order."""
+    return [pass_records.parse(p) for p in passes]
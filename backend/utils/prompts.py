@@ -51,7 +51,14 @@ Follow these rules strictly:
     2.  Take the JSON output from the first tool and pass it directly to the `analyze_spending_and_suggest_savings` tool.
     3.  **Synthesize the response:** Present the answer from `analyze_spending_and_suggest_savings` directly to the user in a conversational way. For example: "Last month, you spent a total of... Here are a couple of ideas based on your purchases to help you save..."
 
-**Scenario 4: Simple, Direct Query**
+**Scenario 4: Ad-hoc Spending Questions**
+
+* **User Query:** "Who were my top 5 merchants this quarter?" or "How much did I spend on dairy in the last 2 weeks?"
+* **Correct Agent/Tool Flow:**
+    1.  Call `query_spending`. For the first question use `time_period="this quarter"`, `group_by="merchant"` and `top_k=5`; for the second use `time_period="last 2 weeks"` and `item_keywords="milk,cheese,yogurt,butter,curd,paneer"`.
+    2.  **Synthesize the response:** Read the totals from the returned rows, e.g. "Your top merchants this quarter were FreshMart (USD 412.50 over 9 receipts), ..."
+
+**Scenario 5: Simple, Direct Query**
 
 * **User Query:** "Do I have any milk?"
 * **Correct Agent/Tool Flow:**
@@ -0,0 +1,341 @@
+"""
+Memory-mapped columnar snapshot of the mirrored receipts and line items.
+
+The sync job exports the rollup contributions and pass_items of the pass
+mirror into NumPy .npy columns plus one string dictionary (pass ids, users,
+categories, merchants and item names are stored as int32 codes into it).
+Every worker process memory-maps the columns read-only, so they share one
+copy through the page cache instead of each holding parsed passes in
+Python dicts, and range scans read the arrays in place.
+
+Layout of RECEIPT_SNAPSHOT_DIR:
+    CURRENT              name of the live version
+    v<ns>/meta.json      generation, row counts, per-user row ranges
+    v<ns>/strings.json   the string dictionary
+    v<ns>/<column>.npy   receipts sorted by (user, day); items by receipt
+
+A refresh writes a new version directory and then replaces CURRENT, so a
+reader sees either the old snapshot or the new one, never a mix. Readers
+check CURRENT at most every RECEIPT_SNAPSHOT_CHECK_SECONDS; arrays of a
+replaced version stay valid for as long as they are mapped.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import rollups
+from utils.expenditure_engine import PERIODS, PeriodStats, period_bounds
+from utils.lazy import lazy_module
+from utils.pass_records import CLASS_SUFFIX_TO_CATEGORY
+
+np = lazy_module("numpy")
+
+RECEIPT_SNAPSHOT_DIR = os.getenv("RECEIPT_SNAPSHOT_DIR", "receipt_snapshot")
+RECEIPT_SNAPSHOT_CHECK_SECONDS = float(os.getenv("RECEIPT_SNAPSHOT_CHECK_SECONDS", "5"))
+# Versions kept on disk, the live one included
+RECEIPT_SNAPSHOT_KEEP = 2
+
+# Column name -> dtype; string columns hold codes into the dictionary
+RECEIPT_COLUMNS = {
+    "receipt_pass": "int32",
+    "receipt_user": "int32",
+    "receipt_day": "int32",  # date.toordinal()
+    "receipt_amount": "float64",
+    "receipt_category": "int32",
+    "receipt_merchant": "int32",
+}
+ITEM_COLUMNS = {
+    "item_receipt": "int32",  # row in the receipt columns
+    "item_name": "int32",
+    "item_price": "float64",  # NaN without a price
+}
+
+
+class ReceiptColumns:
+    """Receipts and line items of the pass mirror, in snapshot order.
+
+    Attributes:
+        generation: Rollup generation the columns were exported at.
+        strings: The string dictionary.
+        receipts: One list per RECEIPT_COLUMNS entry.
+        items: One list per ITEM_COLUMNS entry.
+        users: user_id -> [first, end) receipt rows.
+    """
+
+    __slots__ = ("generation", "strings", "receipts", "items", "users")
+
+    def __init__(self, generation, strings, receipts, items, users):
+        self.generation = generation
+        self.strings = strings
+        self.receipts = receipts
+        self.items = items
+        self.users = users
+
+
+def export_columns(conn: sqlite3.Connection) -> ReceiptColumns:
+    """Read every contribution and line item of the mirror into columns.
+
+    Both tables and the generation are read in one read transaction, so a
+    separate connection to the mirror's (WAL) database file gets a
+    consistent view without blocking the mirror's writers; the columns are
+    built after the transaction ends.
+    """
+    conn.execute("BEGIN")
+    try:
+        generation = rollups.generation(conn)
+        contributions = conn.execute(
+            "SELECT pass_id, user_id, day, amount, category, merchant "
+            "FROM pass_contributions ORDER BY user_id, day, pass_id"
+        ).fetchall()
+        item_rows = conn.execute(
+            "SELECT rowid, pass_id, item, price FROM pass_items"
+        ).fetchall()
+    finally:
+        conn.rollback()
+
+    codes: Dict[str, int] = {}
+
+    def code(text: str) -> int:
+        return codes.setdefault(text, len(codes))
+
+    receipts = {name: [] for name in RECEIPT_COLUMNS}
+    users: Dict[str, List[int]] = {}
+    rows: Dict[str, int] = {}
+    for row, (pass_id, user_id, day, amount, category, merchant) in enumerate(
+        contributions
+    ):
+        rows[pass_id] = row
+        users.setdefault(user_id, [row, row])[1] = row + 1
+        receipts["receipt_pass"].append(code(pass_id))
+        receipts["receipt_user"].append(code(user_id))
+        receipts["receipt_day"].append(date.fromisoformat(day).toordinal())
+        receipts["receipt_amount"].append(amount)
+        receipts["receipt_category"].append(code(category))
+        receipts["receipt_merchant"].append(code(merchant))
+
+    items = sorted(
+        (rows[pass_id], rowid, item, price)
+        for rowid, pass_id, item, price in item_rows
+        if pass_id in rows
+    )
+    item_columns = {
+        "item_receipt": [row for row, _, _, _ in items],
+        "item_name": [code(item) for _, _, item, _ in items],
+        "item_price": [
+            float("nan") if price is None else price for _, _, _, price in items
+        ],
+    }
+    return ReceiptColumns(
+        generation=generation,
+        strings=list(codes),
+        receipts=receipts,
+        items=item_columns,
+        users=users,
+    )
+
+
+def _read_current(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_snapshot(
+    columns: ReceiptColumns, directory: str = RECEIPT_SNAPSHOT_DIR
+) -> str:
+    """Write columns as a new version and make it the live one.
+
+    Returns:
+        The name of the new version.
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    staging = os.path.join(directory, f".tmp-{version}")
+    os.makedirs(staging)
+    for dtypes, values in (
+        (RECEIPT_COLUMNS, columns.receipts),
+        (ITEM_COLUMNS, columns.items),
+    ):
+        for name, dtype in dtypes.items():
+            np.save(
+                os.path.join(staging, f"{name}.npy"),
+                np.asarray(values[name], dtype=dtype),
+            )
+    with open(os.path.join(staging, "strings.json"), "w") as f:
+        json.dump(columns.strings, f, ensure_ascii=False)
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump(
+            {
+                "generation": columns.generation,
+                "created_at": time.time(),
+                "receipts": len(columns.receipts["receipt_day"]),
+                "items": len(columns.items["item_receipt"]),
+                "users": columns.users,
+            },
+            f,
+        )
+    os.replace(staging, os.path.join(directory, version))
+    pointer = os.path.join(directory, f".tmp-CURRENT-{version}")
+    with open(pointer, "w") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(directory, "CURRENT"))
+    _prune(directory)
+    return version
+
+
+def _prune(directory: str) -> None:
+    current = _read_current(directory)
+    versions = sorted(
+        (n for n in os.listdir(directory) if n.startswith("v")), reverse=True
+    )
+    for name in versions[RECEIPT_SNAPSHOT_KEEP:]:
+        if name != current:
+            # Workers that still map the old arrays keep reading them
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class ReceiptSnapshot:
+    """Read-only, memory-mapped view of one snapshot version.
+
+    Attributes:
+        version: Name of the version directory.
+        generation: Rollup generation the snapshot was exported at.
+        receipts: Number of receipt rows.
+        items: Number of line item rows.
+        nbytes: Size of the mapped columns.
+    """
+
+    def __init__(self, directory: str, version: str):
+        path = os.path.join(directory, version)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        with open(os.path.join(path, "strings.json")) as f:
+            self._strings: List[str] = json.load(f)
+        self._codes = {text: code for code, text in enumerate(self._strings)}
+        self._users: Dict[str, List[int]] = meta["users"]
+        self._columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in (*RECEIPT_COLUMNS, *ITEM_COLUMNS)
+        }
+        self.version = version
+        self.generation: int = meta["generation"]
+        self.receipts: int = meta["receipts"]
+        self.items: int = meta["items"]
+        self.nbytes = sum(column.nbytes for column in self._columns.values())
+
+    def receipt_count(self, user_id: str) -> int:
+        lo, hi = self._users.get(user_id, (0, 0))
+        return hi - lo
+
+    def _rows(self, user_id: str, start: date, end: date) -> Tuple[int, int]:
+        """Receipt rows [lo, hi) of one user dated in [start, end)."""
+        first, last = self._users.get(user_id, (0, 0))
+        days = self._columns["receipt_day"][first:last]
+        lo, hi = np.searchsorted(days, [start.toordinal(), end.toordinal()])
+        return first + int(lo), first + int(hi)
+
+    def range_stats(
+        self,
+        user_id: str,
+        start: date,
+        end: date,
+        categories: Optional[List[str]] = None,
+    ) -> PeriodStats:
+        """Aggregate one user's receipts dated in [start, end).
+
+        Args:
+            categories: Restrict to these categories; None means all.
+
+        Returns:
+            PeriodStats whose positions are snapshot receipt rows.
+        """
+        lo, hi = self._rows(user_id, start, end)
+        days = self._columns["receipt_day"][lo:hi]
+        amounts = self._columns["receipt_amount"][lo:hi]
+        codes = self._columns["receipt_category"][lo:hi]
+        names = list(dict.fromkeys(CLASS_SUFFIX_TO_CATEGORY.values()))
+        if categories is not None:
+            wanted = [self._codes[c] for c in categories if c in self._codes]
+            mask = np.isin(codes, wanted)
+            days, amounts, codes = days[mask], amounts[mask], codes[mask]
+            positions = (np.flatnonzero(mask) + lo).tolist()
+        else:
+            positions = list(range(lo, hi))
+        totals = np.bincount(codes, weights=amounts, minlength=len(self._strings))
+        # Every known category is listed, like ExpenditureFrame does
+        category_totals = {name: 0.0 for name in names}
+        for code in np.unique(codes).tolist():
+            category_totals[self._strings[code]] = round(float(totals[code]), 2)
+        return PeriodStats(
+            start=start,
+            end=end,
+            total=round(float(amounts.sum()), 2),
+            count=len(days),
+            unique_days=int(np.count_nonzero(np.diff(days))) + 1 if len(days) else 0,
+            category_totals=category_totals,
+            positions=positions,
+        )
+
+    def report(
+        self,
+        user_id: str,
+        today: Optional[date] = None,
+        categories: Optional[List[str]] = None,
+    ) -> Dict[str, PeriodStats]:
+        """Aggregate every named period (see expenditure_engine.PERIODS)."""
+        today = today or date.today()
+        return {
+            name: self.range_stats(
+                user_id, *period_bounds(name, today), categories=categories
+            )
+            for name in PERIODS
+        }
+
+
+_current: Optional[ReceiptSnapshot] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def current_snapshot(
+    directory: str = RECEIPT_SNAPSHOT_DIR,
+) -> Optional[ReceiptSnapshot]:
+    """The live snapshot, reopened when CURRENT changes; None if there is none."""
+    global _current, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _current is not None and now - _checked_at < RECEIPT_SNAPSHOT_CHECK_SECONDS:
+            return _current
+        _checked_at = now
+        version = _read_current(directory)
+        if version is None:
+            _current = None
+        elif _current is None or _current.version != version:
+            try:
+                _current = ReceiptSnapshot(directory, version)
+                print(f"[SNAPSHOT] Mapped receipt snapshot {version}")
+            except (OSError, ValueError) as e:
+                # Pruned between reading CURRENT and opening it; retry later
+                print(f"[SNAPSHOT] Could not open {version}: {e}")
+        return _current
+
+
+def snapshot_stats(directory: str = RECEIPT_SNAPSHOT_DIR) -> Dict[str, Any]:
+    snapshot = current_snapshot(directory)
+    if snapshot is None:
+        return {"version": None}
+    return {
+        "version": snapshot.version,
+        "generation": snapshot.generation,
+        "receipts": snapshot.receipts,
+        "items": snapshot.items,
+        "mapped_bytes": snapshot.nbytes,
+    }
@@ -1,5 +1,6 @@
 import requests
 import os
+from utils.single_flight import SingleFlight
 
 # Define merchant keywords by category
 CATEGORY_KEYWORDS = {
@@ -35,12 +36,22 @@ CARD_RECOMMENDATIONS = {
 }
 
 FI_MCP_DEV_URL = os.getenv("FI_MCP_DEV_URL")
+# Concurrent calls for the same session share one fi-mcp-dev request
+fi_mcp_flight = SingleFlight("fi_mcp")
 
 
 def fetch_bank_transactions(session_id):
     """
     Calls fi-mcp-dev fetch_bank_transactions and returns the parsed JSON.
+    Concurrent calls for the same session are coalesced into one request.
     """
+    return fi_mcp_flight.do(
+        (session_id, "fetch_bank_transactions"),
+        lambda: _fetch_bank_transactions(session_id),
+    )
+
+
+def _fetch_bank_transactions(session_id):
     headers = {
         "Content-Type": "application/json",
         "Mcp-Session-Id": session_id
@@ -0,0 +1,403 @@
+"""
+Daily spending rollups kept next to the pass mirror.
+
+Every mirrored pass contributes (amount, 1, item count) to one row of
+daily_rollups keyed by (user, category, day), and (amount, 1) to one row of
+monthly_rollups keyed by (user, category, month). The pass mirror applies the
+difference whenever it writes or deletes a pass, so range totals cost
+O(days x categories) and a month's total O(1), no matter how many receipts
+exist. The line items of each contributing pass are kept in pass_items for
+item-level queries (see utils.spending_query).
+
+Rebuild from the mirror with:
+    python -m utils.rollups
+"""
+
+import json
+import sqlite3
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils import pass_index
+from utils.pass_index import DEFAULT_USER_ID
+from utils.item_stats import item_key
+from utils.pass_records import PassRecord, parse_pass
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pass_contributions (
+    pass_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    day TEXT NOT NULL,
+    amount REAL NOT NULL,
+    item_count INTEGER NOT NULL,
+    merchant TEXT NOT NULL DEFAULT '' COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS pass_contributions_merchant
+    ON pass_contributions (user_id, merchant, day);
+CREATE INDEX IF NOT EXISTS pass_contributions_day
+    ON pass_contributions (user_id, day);
+CREATE TABLE IF NOT EXISTS pass_items (
+    pass_id TEXT NOT NULL,
+    item TEXT NOT NULL,  -- normalized, see item_stats.item_key
+    description TEXT NOT NULL,
+    price REAL
+);
+CREATE INDEX IF NOT EXISTS pass_items_pass ON pass_items (pass_id);
+-- Bumped by every change to the contributions, for snapshots of them
+CREATE TABLE IF NOT EXISTS rollup_generation (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    generation INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO rollup_generation (id, generation) VALUES (0, 0);
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    day TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    item_count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category, day)
+);
+CREATE TABLE IF NOT EXISTS monthly_rollups (
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    month TEXT NOT NULL,  -- YYYY-MM
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category, month)
+);
+"""
+
+
+# (pass_id, user_id, category, day, amount, item_count, merchant)
+Contribution = Tuple[str, str, str, str, float, int, str]
+# (pass_id, item, description, price)
+ItemRow = Tuple[str, str, str, Optional[float]]
+
+
+def ensure_schema(conn: sqlite3.Connection) -> bool:
+    """Create or migrate the rollup tables.
+
+    Returns:
+        True if existing contributions predate a column or table and need a
+        rebuild.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(pass_contributions)")}
+    (tables,) = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master "
+        "WHERE name IN ('monthly_rollups', 'pass_items')"
+    ).fetchone()
+    migrated = bool(columns) and ("merchant" not in columns or tables < 2)
+    if columns and "merchant" not in columns:
+        conn.execute(
+            "ALTER TABLE pass_contributions ADD COLUMN "
+            "merchant TEXT NOT NULL DEFAULT '' COLLATE NOCASE"
+        )
+    conn.executescript(ROLLUP_SCHEMA)
+    return migrated
+
+
+def contribution(pass_obj: Dict[str, Any], user_id: str) -> Optional[Contribution]:
+    """What a pass adds to its owner's rollups, or None without date or amount."""
+    return _contribution(parse_pass(pass_obj), user_id)
+
+
+def _contribution(record: PassRecord, user_id: str) -> Optional[Contribution]:
+    if not record.valid:
+        return None
+    return (
+        record.id,
+        user_id,
+        record.category,
+        record.date.isoformat(),
+        record.amount,
+        len(record.items),
+        record.merchant,
+    )
+
+
+def _item_rows(record: PassRecord) -> List[ItemRow]:
+    """Line items of a contributing pass, as stored in pass_items."""
+    if not record.valid:
+        return []
+    return [
+        (record.id, item_key(description), description, price)
+        for description, price in record.items
+        if description
+    ]
+
+
+def _add(conn: sqlite3.Connection, rows: List[Contribution], sign: int) -> None:
+    conn.executemany(
+        "INSERT INTO monthly_rollups (user_id, category, month, total, count) "
+        "VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (user_id, category, month) DO UPDATE SET "
+        "total = total + excluded.total, count = count + excluded.count",
+        [
+            (user_id, category, day[:7], sign * amount, sign)
+            for _, user_id, category, day, amount, _, _ in rows
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO daily_rollups (user_id, category, day, total, count, item_count) "
+        "VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (user_id, category, day) DO UPDATE SET "
+        "total = total + excluded.total, count = count + excluded.count, "
+        "item_count = item_count + excluded.item_count",
+        [
+            (user_id, category, day, sign * amount, sign, sign * item_count)
+            for _, user_id, category, day, amount, item_count, _ in rows
+        ],
+    )
+
+
+def apply_passes(
+    conn: sqlite3.Connection,
+    pass_ids: Iterable[str],
+    new_passes: Iterable[Dict[str, Any]] = (),
+) -> List[Contribution]:
+    """Move the rollups from the stored contributions of pass_ids to new_passes.
+
+    Call inside the caller's transaction: every pass in new_passes must be
+    listed in pass_ids; ids without a new pass are treated as deleted.
+
+    Returns:
+        The contributions of new_passes.
+    """
+    pass_ids = list(pass_ids)
+    if not pass_ids:
+        return []
+    old = []
+    for start in range(0, len(pass_ids), 500):
+        chunk = pass_ids[start : start + 500]
+        placeholders = ",".join("?" for _ in chunk)
+        old.extend(
+            conn.execute(
+                "SELECT pass_id, user_id, category, day, amount, item_count, merchant "
+                f"FROM pass_contributions WHERE pass_id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+        )
+    # The last version wins if a pass appears more than once
+    latest = {p["id"]: p for p in new_passes}
+    owners = pass_index.owners(conn, latest)
+    records = [parse_pass(p) for p in latest.values()]
+    new = [
+        c for c in (_contribution(r, owners[r.id]) for r in records) if c is not None
+    ]
+    _add(conn, old, -1)
+    _add(conn, new, 1)
+    conn.executemany(
+        "DELETE FROM pass_contributions WHERE pass_id = ?", [(p,) for p in pass_ids]
+    )
+    conn.executemany(
+        "DELETE FROM pass_items WHERE pass_id = ?", [(p,) for p in pass_ids]
+    )
+    conn.executemany(
+        "INSERT INTO pass_contributions "
+        "(pass_id, user_id, category, day, amount, item_count, merchant) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        new,
+    )
+    conn.executemany(
+        "INSERT INTO pass_items (pass_id, item, description, price) "
+        "VALUES (?, ?, ?, ?)",
+        [row for r in records for row in _item_rows(r)],
+    )
+    # Only keys an old contribution was taken from can have emptied
+    emptied = {(user_id, category, day) for _, user_id, category, day, _, _, _ in old}
+    conn.executemany(
+        "DELETE FROM daily_rollups "
+        "WHERE user_id = ? AND category = ? AND day = ? AND count <= 0",
+        emptied,
+    )
+    conn.executemany(
+        "DELETE FROM monthly_rollups "
+        "WHERE user_id = ? AND category = ? AND month = ? AND count <= 0",
+        {(user_id, category, day[:7]) for user_id, category, day in emptied},
+    )
+    _bump_generation(conn)
+    return new
+
+
+def _bump_generation(conn: sqlite3.Connection) -> None:
+    conn.execute("UPDATE rollup_generation SET generation = generation + 1")
+
+
+def generation(conn: sqlite3.Connection) -> int:
+    """Counter that changes whenever any contribution or line item changes."""
+    (value,) = conn.execute("SELECT generation FROM rollup_generation").fetchone()
+    return value
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Recompute every contribution and rollup from the mirrored pass bodies.
+
+    Returns:
+        The number of passes that contribute to the rollups.
+    """
+    contributions = []
+    items = []
+    for body, user_id in conn.execute(
+        "SELECT body, user_id FROM passes "
+        "LEFT JOIN pass_owners ON pass_owners.pass_id = passes.id"
+    ):
+        record = parse_pass(json.loads(body))
+        c = _contribution(record, user_id or DEFAULT_USER_ID)
+        if c is not None:
+            contributions.append(c)
+            items.extend(_item_rows(record))
+    conn.execute("DELETE FROM pass_contributions")
+    conn.execute("DELETE FROM pass_items")
+    conn.execute("DELETE FROM daily_rollups")
+    conn.execute("DELETE FROM monthly_rollups")
+    conn.executemany(
+        "INSERT INTO pass_contributions "
+        "(pass_id, user_id, category, day, amount, item_count, merchant) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        contributions,
+    )
+    conn.executemany(
+        "INSERT INTO pass_items (pass_id, item, description, price) "
+        "VALUES (?, ?, ?, ?)",
+        items,
+    )
+    conn.execute(
+        "INSERT INTO daily_rollups "
+        "SELECT user_id, category, day, SUM(amount), COUNT(*), SUM(item_count) "
+        "FROM pass_contributions GROUP BY user_id, category, day"
+    )
+    conn.execute(
+        "INSERT INTO monthly_rollups "
+        "SELECT user_id, category, substr(day, 1, 7), SUM(total), SUM(count) "
+        "FROM daily_rollups GROUP BY user_id, category, substr(day, 1, 7)"
+    )
+    _bump_generation(conn)
+    return len(contributions)
+
+
+class RangeTotals:
+    """Rollup totals over a date range.
+
+    Attributes:
+        total: Sum of pass amounts.
+        count: Number of passes.
+        item_count: Number of receipt items.
+        unique_days: Number of days with at least one pass.
+        category_totals: Amount per category that had passes.
+    """
+
+    __slots__ = ("total", "count", "item_count", "unique_days", "category_totals")
+
+    def __init__(self, total, count, item_count, unique_days, category_totals):
+        self.total = total
+        self.count = count
+        self.item_count = item_count
+        self.unique_days = unique_days
+        self.category_totals = category_totals
+
+    @property
+    def average_per_day(self) -> float:
+        return round(self.count / max(self.unique_days, 1), 2) if self.count else 0
+
+
+def _where(
+    user_id: str, start: date, end: date, categories: Optional[List[str]]
+) -> Tuple[str, list]:
+    clause = "user_id = ? AND day >= ? AND day < ?"
+    params = [user_id, start.isoformat(), end.isoformat()]
+    if categories is not None:
+        clause += f" AND category IN ({','.join('?' for _ in categories)})"
+        params.extend(categories)
+    return clause, params
+
+
+def range_totals(
+    conn: sqlite3.Connection,
+    user_id: str,
+    start: date,
+    end: date,
+    categories: Optional[List[str]] = None,
+) -> RangeTotals:
+    """Aggregate the rollups of one user over [start, end).
+
+    Args:
+        categories: Restrict to these categories; None means all.
+    """
+    clause, params = _where(user_id, start, end, categories)
+    rows = conn.execute(
+        "SELECT category, day, total, count, item_count FROM daily_rollups "
+        f"WHERE {clause}",
+        params,
+    ).fetchall()
+    category_totals: Dict[str, float] = {}
+    days = set()
+    total = count = item_count = 0
+    for category, day, day_total, day_count, day_items in rows:
+        category_totals[category] = category_totals.get(category, 0.0) + day_total
+        days.add(day)
+        total += day_total
+        count += day_count
+        item_count += day_items
+    return RangeTotals(
+        total=round(total, 2),
+        count=count,
+        item_count=item_count,
+        unique_days=len(days),
+        category_totals={k: round(v, 2) for k, v in category_totals.items()},
+    )
+
+
+def month_total(
+    conn: sqlite3.Connection, user_id: str, category: str, month: str
+) -> float:
+    """Amount one user spent in a category during a YYYY-MM month."""
+    row = conn.execute(
+        "SELECT total FROM monthly_rollups "
+        "WHERE user_id = ? AND category = ? AND month = ?",
+        (user_id, category, month),
+    ).fetchone()
+    return round(row[0], 2) if row else 0.0
+
+
+def daily_series(
+    conn: sqlite3.Connection,
+    user_id: str,
+    start: date,
+    end: date,
+    categories: Optional[List[str]] = None,
+    merchant: Optional[str] = None,
+) -> List[Tuple[str, str, float, int]]:
+    """Per-day, per-category totals of one user over [start, end).
+
+    Without a merchant this reads daily_rollups; with one it aggregates the
+    merchant's indexed contributions (case-insensitive match).
+
+    Returns:
+        (day, category, total, count) rows ordered by day.
+    """
+    clause, params = _where(user_id, start, end, categories)
+    if merchant is None:
+        sql = (
+            "SELECT day, category, total, count FROM daily_rollups "
+            f"WHERE {clause} ORDER BY day"
+        )
+    else:
+        sql = (
+            "SELECT day, category, SUM(amount), COUNT(*) FROM pass_contributions "
+            f"WHERE {clause} AND merchant = ? GROUP BY day, category ORDER BY day"
+        )
+        params.append(merchant)
+    return conn.execute(sql, params).fetchall()
+
+
+def main():
+    from utils.pass_mirror import get_pass_mirror
+
+    count = get_pass_mirror().rebuild_rollups()
+    print(f"[ROLLUPS] Rebuilt rollups from {count} passes")
+
+
+if __name__ == "__main__":
+    main()
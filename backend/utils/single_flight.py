@@ -0,0 +1,88 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one upstream call.
+
+    The first caller for a key runs fn; callers that arrive while it is in
+    flight wait for it and receive the same result, or the same exception.
+    Nothing is cached once the call finishes.
+
+    Attributes:
+        name: Label used in stats.
+        calls: Total calls made through do().
+        coalesced: Calls that were served by another caller's in-flight call.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        _REGISTRY.append(self)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn for key, or join the call already in flight for it.
+
+        Args:
+            key: Identifies identical upstream calls.
+            fn: Makes the upstream call.
+
+        Returns:
+            The result of fn, shared by every caller that joined the flight.
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._inflight.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._inflight[key] = _Call()
+                leader = True
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self, key: Hashable) -> bool:
+        """True while a call for key is running."""
+        return key in self._inflight
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
+
+
+_REGISTRY: List[SingleFlight] = []
+
+
+def single_flight_stats() -> Dict[str, dict]:
+    """Stats of every SingleFlight group in the process."""
+    return {group.name: group.stats() for group in _REGISTRY}
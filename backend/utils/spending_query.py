@@ -0,0 +1,310 @@
+"""
+Ad-hoc analytics queries over the mirrored receipts and their line items.
+
+A query is a JSON-friendly dict:
+
+    {
+        "filters": {
+            "period": "this quarter",      # or "start"/"end" (inclusive ISO dates)
+            "category": ["groceries"],     # exact, str or list
+            "merchant": ["FreshMart"],     # exact, case-insensitive
+            "item": ["milk", "cheese"],    # substring of the item, any matches
+            "min_amount": 10, "max_amount": 500,
+        },
+        "group_by": ["merchant"],          # merchant, category, item, day, week,
+                                           # month, quarter, year
+        "metrics": ["sum", "count"],       # sum, count, avg, min, max, receipts
+        "order_by": "sum",                 # a metric or a group key
+        "descending": True,
+        "limit": 5,                        # top-k
+    }
+
+Queries on receipts read pass_contributions; grouping by item or filtering
+on items switches to pass_items (one row per line item, valued at its
+price; "count" then counts line items and "receipts" the receipts they
+came from) joined to its receipt. Every filter and the top-k are
+compiled into the SQL statement, so SQLite narrows to the user's date range
+through the (user_id, day) index and only touches matching rows; no pass
+body is parsed at query time.
+"""
+
+import re
+import sqlite3
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+GROUP_KEYS = {
+    "merchant": "c.merchant",
+    "category": "c.category",
+    "item": "i.item",
+    "day": "c.day",
+    "week": "date(c.day, 'weekday 0', '-6 days')",
+    "month": "substr(c.day, 1, 7)",
+    "quarter": (
+        "substr(c.day, 1, 4) || '-Q' "
+        "|| ((CAST(substr(c.day, 6, 2) AS INTEGER) + 2) / 3)"
+    ),
+    "year": "substr(c.day, 1, 4)",
+}
+TIME_KEYS = ("day", "week", "month", "quarter", "year")
+# SQL of each metric over the value column {v}
+METRICS = {
+    "sum": "ROUND(SUM({v}), 2)",
+    "count": "COUNT(*)",
+    "avg": "ROUND(AVG({v}), 2)",
+    "min": "MIN({v})",
+    "max": "MAX({v})",
+    "receipts": "COUNT(DISTINCT c.pass_id)",
+}
+DEFAULT_METRICS = ["sum", "count"]
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+_UNITS = {"day": 1, "week": 7}
+
+
+class QueryError(ValueError):
+    """The query spec is malformed."""
+
+
+def _month_start(day: date, months_back: int = 0) -> date:
+    index = day.year * 12 + day.month - 1 - months_back
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _months_ago(day: date, months: int) -> date:
+    first = _month_start(day, months)
+    following = _month_start(first, -1)
+    return first.replace(day=min(day.day, (following - timedelta(days=1)).day))
+
+
+def resolve_period(
+    period: Optional[str], today: date
+) -> Tuple[Optional[date], Optional[date]]:
+    """Turn a period phrase into a [start, end) date range.
+
+    Understands "today", "yesterday", "this/last week|month|quarter|year",
+    "last N days|weeks|months" (rolling, today included), "YYYY", "YYYY-MM",
+    "YYYY-Qn" and "all"/"all time" (no bounds). Underscores count as spaces.
+
+    Raises:
+        QueryError: If the phrase is not understood.
+    """
+    text = " ".join((period or "all").lower().replace("_", " ").split())
+    tomorrow = today + timedelta(days=1)
+    if text in ("all", "all time", "any"):
+        return None, None
+    if text == "today":
+        return today, tomorrow
+    if text == "yesterday":
+        return today - timedelta(days=1), today
+
+    match = re.fullmatch(
+        r"(this|current|last|previous) (week|month|quarter|year)", text
+    )
+    if match:
+        back = match.group(1) in ("last", "previous")
+        unit = match.group(2)
+        if unit == "week":
+            start = today - timedelta(days=today.weekday() + 7 * back)
+            return start, start + timedelta(days=7)
+        months = {"month": 1, "quarter": 3, "year": 12}[unit]
+        current = _month_start(today, (today.month - 1) % months)
+        start = _month_start(current, months * back)
+        return start, _month_start(start, -months)
+
+    match = re.fullmatch(r"(?:last|past) (\d+) (day|week|month)s?", text)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        if count < 1:
+            raise QueryError(f"Invalid period '{period}'")
+        if unit == "month":
+            return _months_ago(today, count) + timedelta(days=1), tomorrow
+        return today - timedelta(days=count * _UNITS[unit] - 1), tomorrow
+
+    match = re.fullmatch(r"(\d{4})(?:-(\d{2})|-?q([1-4]))?", text)
+    if match:
+        year = int(match.group(1))
+        if match.group(2):
+            month = int(match.group(2))
+            if not 1 <= month <= 12:
+                raise QueryError(f"Invalid period '{period}'")
+            start = date(year, month, 1)
+            return start, _month_start(start, -1)
+        if match.group(3):
+            start = date(year, 3 * int(match.group(3)) - 2, 1)
+            return start, _month_start(start, -3)
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    raise QueryError(f"Unknown period '{period}'")
+
+
+def _as_list(value: Any, name: str) -> List[str]:
+    if value is None or value == "" or value == "all":
+        return []
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return [v for v in value if v]
+    raise QueryError(f"'{name}' must be a string or a list of strings")
+
+
+def _as_date(value: Any, name: str) -> date:
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise QueryError(f"'{name}' must be an ISO date (YYYY-MM-DD)")
+
+
+def _as_number(value: Any, name: str) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise QueryError(f"'{name}' must be a number")
+
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{' '.join(escaped.lower().split())}%"
+
+
+def compile_query(
+    spec: Dict[str, Any], user_id: str, today: date
+) -> Tuple[str, list, Dict[str, Any]]:
+    """Validate a query spec and compile it to SQL.
+
+    Returns:
+        The SQL statement, its parameters and the normalized query (echoed
+        back with the results).
+
+    Raises:
+        QueryError: If the spec is malformed.
+    """
+    if not isinstance(spec, dict):
+        raise QueryError("The query must be a JSON object")
+    filters = spec.get("filters") or {}
+    if not isinstance(filters, dict):
+        raise QueryError("'filters' must be an object")
+
+    group_by = _as_list(spec.get("group_by"), "group_by")
+    unknown = [g for g in group_by if g not in GROUP_KEYS]
+    if unknown:
+        raise QueryError(f"Cannot group by {unknown}; use {sorted(GROUP_KEYS)}")
+    metrics = _as_list(spec.get("metrics"), "metrics") or list(DEFAULT_METRICS)
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise QueryError(f"Unknown metrics {unknown}; use {sorted(METRICS)}")
+    group_by = list(dict.fromkeys(group_by))
+    metrics = list(dict.fromkeys(metrics))
+
+    items = _as_list(filters.get("item"), "item")
+    source = spec.get("source") or (
+        "items" if items or "item" in group_by else "receipts"
+    )
+    if source not in ("receipts", "items"):
+        raise QueryError("'source' must be 'receipts' or 'items'")
+    if source == "receipts" and (items or "item" in group_by):
+        raise QueryError("Item filters and grouping need source 'items'")
+    value = "i.price" if source == "items" else "c.amount"
+
+    if filters.get("start") or filters.get("end"):
+        start = _as_date(filters["start"], "start") if filters.get("start") else None
+        end = (
+            _as_date(filters["end"], "end") + timedelta(days=1)
+            if filters.get("end")
+            else None
+        )
+    else:
+        start, end = resolve_period(filters.get("period"), today)
+
+    where = ["c.user_id = ?"]
+    params: list = [user_id]
+    if start is not None:
+        where.append("c.day >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        where.append("c.day < ?")
+        params.append(end.isoformat())
+    for name, column in (("category", "c.category"), ("merchant", "c.merchant")):
+        values = _as_list(filters.get(name), name)
+        if values:
+            where.append(f"{column} IN ({','.join('?' for _ in values)})")
+            params.extend(values)
+    if items:
+        where.append(
+            "(" + " OR ".join("i.item LIKE ? ESCAPE '\\'" for _ in items) + ")"
+        )
+        params.extend(_like_pattern(item) for item in items)
+    for name, op in (("min_amount", ">="), ("max_amount", "<=")):
+        if filters.get(name) is not None:
+            where.append(f"{value} {op} ?")
+            params.append(_as_number(filters[name], name))
+
+    order_by = spec.get("order_by")
+    if order_by is None:
+        order_by = group_by[0] if group_by and group_by[0] in TIME_KEYS else metrics[0]
+    if order_by not in metrics and order_by not in group_by:
+        raise QueryError(f"'order_by' must be one of {metrics + group_by}")
+    descending = spec.get("descending")
+    if descending is None:
+        descending = order_by not in group_by
+    elif not isinstance(descending, bool):
+        raise QueryError("'descending' must be true or false")
+    limit = spec.get("limit", DEFAULT_LIMIT)
+    # Numbers in model tool calls arrive as floats
+    if isinstance(limit, float) and limit.is_integer():
+        limit = int(limit)
+    if isinstance(limit, bool) or not isinstance(limit, int):
+        raise QueryError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise QueryError(f"'limit' must be between 1 and {MAX_LIMIT}")
+
+    select = [f"{GROUP_KEYS[g]} AS {g}" for g in group_by]
+    select += [f"{METRICS[m].format(v=value)} AS {m}" for m in metrics]
+    if source == "items":
+        sql = (
+            f"SELECT {', '.join(select)} FROM pass_contributions c "
+            "JOIN pass_items i ON i.pass_id = c.pass_id"
+        )
+    else:
+        sql = f"SELECT {', '.join(select)} FROM pass_contributions c"
+    sql += " WHERE " + " AND ".join(where)
+    if group_by:
+        sql += " GROUP BY " + ", ".join(group_by)
+    # Ties are broken by the group keys so top-k results are stable
+    sql += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+    sql += "".join(f", {g}" for g in group_by if g != order_by)
+    sql += " LIMIT ?"
+    params.append(limit)
+
+    query = {
+        "source": source,
+        "start": start.isoformat() if start else None,
+        "end": (end - timedelta(days=1)).isoformat() if end else None,
+        "group_by": group_by,
+        "metrics": metrics,
+        "order_by": order_by,
+        "descending": descending,
+        "limit": limit,
+    }
+    return sql, params, query
+
+
+def run_query(
+    conn: sqlite3.Connection,
+    spec: Dict[str, Any],
+    user_id: str,
+    today: Optional[date] = None,
+) -> Dict[str, Any]:
+    """Run a query spec (see the module docstring) over one user's receipts.
+
+    Returns:
+        {"query": normalized query, "rows": [{group keys..., metrics...}]}.
+
+    Raises:
+        QueryError: If the spec is malformed.
+    """
+    sql, params, query = compile_query(spec, user_id, today or date.today())
+    cursor = conn.execute(sql, params)
+    columns = [c[0] for c in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return {"query": query, "rows": rows}
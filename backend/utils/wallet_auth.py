@@ -0,0 +1,64 @@
+import threading
+from typing import Dict
+
+WALLET_SCOPES = ["https://www.googleapis.com/auth/wallet_object.issuer"]
+DEFAULT_KEY_FILE_PATH = "gwallet_sa_keyfile.json"
+
+# Service account credentials and RSA signers, one per key file. Parsing the
+# key file is a disk read plus a PEM/RSA parse, so do it once per process.
+_credentials: Dict[str, object] = {}
+_signers: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def get_wallet_credentials(key_file_path: str = DEFAULT_KEY_FILE_PATH):
+    """Return cached Wallet-scoped service account credentials for a key file.
+
+    Args:
+        key_file_path: Path to the service account key file.
+
+    Returns:
+        A google.oauth2.service_account.Credentials instance.
+    """
+    creds = _credentials.get(key_file_path)
+    if creds is not None:
+        return creds
+    with _lock:
+        if key_file_path not in _credentials:
+            from google.oauth2.service_account import Credentials
+
+            _credentials[key_file_path] = Credentials.from_service_account_file(
+                key_file_path, scopes=WALLET_SCOPES
+            )
+        return _credentials[key_file_path]
+
+
+def get_wallet_signer(key_file_path: str = DEFAULT_KEY_FILE_PATH):
+    """Return a cached RSA signer used to sign "Add to Google Wallet" JWTs.
+
+    Args:
+        key_file_path: Path to the service account key file.
+
+    Returns:
+        A google.auth.crypt.RSASigner instance.
+    """
+    signer = _signers.get(key_file_path)
+    if signer is not None:
+        return signer
+    with _lock:
+        if key_file_path not in _signers:
+            from google.auth import crypt
+
+            _signers[key_file_path] = crypt.RSASigner.from_service_account_file(
+                key_file_path
+            )
+        return _signers[key_file_path]
+
+
+def refresh_wallet_token(key_file_path: str = DEFAULT_KEY_FILE_PATH):
+    """Fetch an access token now so the first Wallet API call does not have to."""
+    from google.auth.transport.requests import Request
+
+    creds = get_wallet_credentials(key_file_path)
+    creds.refresh(Request())
+    return creds
@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+from typing import Dict
+
+from utils.lazy import Lazy
+from utils.wallet_auth import DEFAULT_KEY_FILE_PATH, get_wallet_credentials
+
+# Static copy of the walletobjects v1 discovery document, so building the
+# client never fetches it over the network. To refresh it:
+#   curl -o utils/discovery/walletobjects.v1.json \
+#     "https://walletobjects.googleapis.com/$discovery/rest?version=v1"
+DISCOVERY_DOC_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "discovery", "walletobjects.v1.json"
+)
+
+
+def _load_discovery_document() -> dict:
+    with open(DISCOVERY_DOC_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+_discovery_document = Lazy("wallet_discovery_document", _load_discovery_document)
+
+# One built service (resource tree) per credential set, shared by all threads
+_services: Dict[str, object] = {}
+_services_lock = threading.Lock()
+
+# httplib2.Http is not thread-safe, so every thread gets its own transport per
+# credential set. Threads that are reused (gunicorn/gthread workers, thread
+# pools) keep their connections alive between requests.
+_thread_local = threading.local()
+
+
+def _thread_http(key_file_path: str):
+    import google_auth_httplib2
+    import httplib2
+
+    https = getattr(_thread_local, "https", None)
+    if https is None:
+        https = _thread_local.https = {}
+    http = https.get(key_file_path)
+    if http is None:
+        http = google_auth_httplib2.AuthorizedHttp(
+            get_wallet_credentials(key_file_path), http=httplib2.Http()
+        )
+        https[key_file_path] = http
+    return http
+
+
+def _build_service(key_file_path: str):
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.http import HttpRequest
+
+    def request_builder(http, *args, **kwargs):
+        # Ignore the http captured at build time and use the calling thread's
+        return HttpRequest(_thread_http(key_file_path), *args, **kwargs)
+
+    return build_from_document(
+        _discovery_document.get(),
+        http=_thread_http(key_file_path),
+        requestBuilder=request_builder,
+    )
+
+
+def get_wallet_service(key_file_path: str = DEFAULT_KEY_FILE_PATH):
+    """Return the shared, thread-safe walletobjects v1 client for a key file.
+
+    The service is built once per credential set from the vendored discovery
+    document; each request it creates runs on a per-thread HTTP transport.
+
+    Args:
+        key_file_path: Path to the service account key file.
+
+    Returns:
+        A googleapiclient Resource for the walletobjects v1 API.
+    """
+    service = _services.get(key_file_path)
+    if service is not None:
+        return service
+    with _services_lock:
+        if key_file_path not in _services:
+            _services[key_file_path] = _build_service(key_file_path)
+        return _services[key_file_path]
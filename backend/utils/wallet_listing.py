@@ -0,0 +1,86 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+# Upper bound on concurrent class listings; each worker holds one connection
+WALLET_FETCH_WORKERS = int(os.getenv("WALLET_FETCH_WORKERS", "4"))
+
+
+def iter_pass_pages(service, class_id: str) -> Iterator[List[Dict[str, Any]]]:
+    """Yield one page of generic objects at a time for a Wallet class.
+
+    Args:
+        service: A walletobjects v1 client (see utils.wallet_client).
+        class_id: The full ID of the class (e.g., 'issuer_id.CLASS_SUFFIX').
+    """
+    page_token = None
+    while True:
+        response = (
+            service.genericobject().list(classId=class_id, token=page_token).execute()
+        )
+        yield response.get("resources", [])
+        page_token = response.get("pagination", {}).get("nextPageToken")
+        if not page_token:
+            return
+
+
+_DONE = object()
+
+
+def stream_class_pages(
+    page_iter_fn: Callable[[str], Iterator[List[Dict[str, Any]]]],
+    class_ids: List[str],
+    max_workers: int = WALLET_FETCH_WORKERS,
+) -> Iterator[Tuple[str, List[Dict[str, Any]], Exception]]:
+    """Page through several classes concurrently, yielding pages as they arrive.
+
+    Pages of different classes interleave in arrival order. A class that fails
+    yields a single (class_id, [], exception) item and the others carry on.
+
+    Yields:
+        (class_id, page, None) for each page, or (class_id, [], exception).
+    """
+    if not class_ids:
+        return
+    # Bounded so fast producers wait for the consumer instead of buffering
+    # every page in memory.
+    pages: "queue.Queue" = queue.Queue(maxsize=max(4, 2 * max_workers))
+    # Set when the consumer stops early so blocked producers can exit
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(class_id):
+        try:
+            for page in page_iter_fn(class_id):
+                if not put((class_id, page, None)):
+                    return
+        except Exception as e:
+            put((class_id, [], e))
+        finally:
+            put(_DONE)
+
+    workers = max(1, min(max_workers, len(class_ids)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wallet-stream")
+    try:
+        for class_id in class_ids:
+            pool.submit(produce, class_id)
+        remaining = len(class_ids)
+        while remaining:
+            item = pages.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        stopped.set()
+        pool.shutdown(wait=False)
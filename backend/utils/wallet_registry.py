@@ -0,0 +1,117 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from utils.wallet_auth import DEFAULT_KEY_FILE_PATH, get_wallet_credentials
+
+
+class WalletClientRegistry:
+    """Process-wide registry of Wallet API clients, one per key file.
+
+    Credentials are loaded once and access tokens are refreshed ahead of expiry
+    by a background thread, so request threads never block on a token refresh
+    and never need to touch GOOGLE_APPLICATION_CREDENTIALS.
+
+    Attributes:
+        refresh_margin: Refresh a token when it expires within this window.
+        check_interval_seconds: How often the background refresher wakes up.
+    """
+
+    def __init__(
+        self,
+        refresh_margin: timedelta = timedelta(minutes=5),
+        check_interval_seconds: float = 60.0,
+    ):
+        self.refresh_margin = refresh_margin
+        self.check_interval_seconds = check_interval_seconds
+        self._clients: Dict[str, object] = {}
+        self._refresh_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def get_client(self, key_file_path: str = DEFAULT_KEY_FILE_PATH):
+        """Return the shared DemoGeneric client for a key file.
+
+        Args:
+            key_file_path: Path to the service account key file.
+
+        Returns:
+            A thread-safe DemoGeneric instance.
+        """
+        client = self._clients.get(key_file_path)
+        if client is None:
+            from utils.demo_generic import DemoGeneric
+
+            with self._lock:
+                if key_file_path not in self._clients:
+                    self._clients[key_file_path] = DemoGeneric(key_file_path)
+                    self._refresh_locks[key_file_path] = threading.Lock()
+                client = self._clients[key_file_path]
+            self._start_refresher()
+        return client
+
+    def _needs_refresh(self, creds) -> bool:
+        if not creds.token or creds.expiry is None:
+            return True
+        # google-auth keeps expiry as a naive UTC datetime
+        return creds.expiry - datetime.utcnow() <= self.refresh_margin
+
+    def ensure_fresh_token(self, key_file_path: str = DEFAULT_KEY_FILE_PATH) -> bool:
+        """Refresh the access token if it is missing or about to expire.
+
+        Only one thread refreshes a given credential set; the others return
+        immediately and let the transport use the current token.
+
+        Returns:
+            True if a refresh happened.
+        """
+        from google.auth.transport.requests import Request
+
+        creds = get_wallet_credentials(key_file_path)
+        if not self._needs_refresh(creds):
+            return False
+        lock = self._refresh_locks.setdefault(key_file_path, threading.Lock())
+        if not lock.acquire(blocking=False):
+            return False
+        try:
+            if not self._needs_refresh(creds):
+                return False
+            try:
+                creds.refresh(Request())
+                print(f"[WALLET] Refreshed access token for {key_file_path}")
+                return True
+            except Exception as e:
+                print(f"[WALLET] Token refresh failed for {key_file_path}: {e}")
+                return False
+        finally:
+            lock.release()
+
+    def _refresh_loop(self):
+        while True:
+            for key_file_path in list(self._clients):
+                self.ensure_fresh_token(key_file_path)
+            if self._stop.wait(self.check_interval_seconds):
+                return
+
+    def _start_refresher(self):
+        with self._lock:
+            if self._refresher is None or not self._refresher.is_alive():
+                self._refresher = threading.Thread(
+                    target=self._refresh_loop,
+                    name="wallet-token-refresher",
+                    daemon=True,
+                )
+                self._refresher.start()
+
+    def stop(self):
+        """Stop the background token refresher."""
+        self._stop.set()
+
+
+wallet_registry = WalletClientRegistry()
+
+
+def get_wallet_client(key_file_path: str = DEFAULT_KEY_FILE_PATH):
+    """Shortcut for wallet_registry.get_client()."""
+    return wallet_registry.get_client(key_file_path)
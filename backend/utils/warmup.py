@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Ordered warmup steps: name -> {"fn": callable, "required": bool}
+_STEPS: Dict[str, Dict[str, Any]] = {}
+# Latest outcome per step: status is "pending", "running", "ready" or "failed"
+_results: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+
+
+def register_warmup_step(name: str, fn: Callable[[], Any], required: bool = True):
+    """Register a warmup step.
+
+    Args:
+        name: Component name reported by the readiness endpoint.
+        fn: Zero-argument callable that builds / connects / primes the component.
+        required: Whether the instance counts as ready only once this step succeeded.
+    """
+    with _lock:
+        _STEPS[name] = {"fn": fn, "required": required}
+        _results.setdefault(name, {"status": "pending", "seconds": None, "error": None})
+
+
+def _run_step(name: str) -> Dict[str, Any]:
+    step = _STEPS[name]
+    with _lock:
+        _results[name] = {"status": "running", "seconds": None, "error": None}
+    start = time.perf_counter()
+    try:
+        step["fn"]()
+        result = {"status": "ready", "error": None}
+    except Exception as e:
+        print(f"[WARMUP] {name} failed: {e}")
+        result = {"status": "failed", "error": str(e)}
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    with _lock:
+        _results[name] = result
+    print(f"[WARMUP] {name}: {result['status']} in {result['seconds']}s")
+    return result
+
+
+def run_warmup(names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Run warmup steps concurrently and return the readiness report.
+
+    Steps are independent, so one slow connection does not hold up the rest.
+    Failed steps are retried on the next run; steps already ready are skipped.
+    """
+    pending = [
+        name
+        for name in names or list(_STEPS)
+        if _results.get(name, {}).get("status") != "ready"
+    ]
+    if pending:
+        with ThreadPoolExecutor(
+            max_workers=len(pending), thread_name_prefix="warmup"
+        ) as pool:
+            list(pool.map(_run_step, pending))
+    return readiness_report()
+
+
+def start_background_warmup() -> bool:
+    """Start run_warmup on a daemon thread unless one is already running.
+
+    Returns:
+        True if a new warmup thread was started.
+    """
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is not None and _warmup_thread.is_alive():
+            return False
+        _warmup_thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+        _warmup_thread.start()
+        return True
+
+
+def warmup_in_progress() -> bool:
+    return _warmup_thread is not None and _warmup_thread.is_alive()
+
+
+def readiness_report() -> Dict[str, Any]:
+    """Per-component readiness and timing. Ready when every required step is ready."""
+    with _lock:
+        components = {
+            name: dict(_results[name], required=_STEPS[name]["required"])
+            for name in _STEPS
+        }
+    ready = all(c["status"] == "ready" for c in components.values() if c["required"])
+    return {
+        "ready": ready,
+        "warming_up": warmup_in_progress(),
+        "components": components,
+    }
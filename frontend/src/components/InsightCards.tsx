@@ -4,9 +4,122 @@ import { TrendingUp, ShoppingCart, Calendar, AlertCircle, Wallet, BarChart3 } fr
 import { useEffect, useState } from "react";
 import axios from "axios";
 
+// Cards for the locally computed metrics (first phase of the response)
+const metricCards = (data: any) => {
+  const cards = [];
+  if (data.weekly_spending_trend !== undefined && data.weekly_spending_trend !== null) {
+    let trendText = "No change in weekly spending.";
+    if (typeof data.weekly_spending_trend === "number") {
+      if (data.weekly_spending_trend > 0) {
+        trendText = `Spending increased by ${data.weekly_spending_trend.toFixed(1)}% compared to last week.`;
+      } else if (data.weekly_spending_trend < 0) {
+        trendText = `Spending decreased by ${Math.abs(data.weekly_spending_trend).toFixed(1)}% compared to last week.`;
+      } else {
+        trendText = "Spending is unchanged compared to last week.";
+      }
+    }
+    cards.push({
+      icon: TrendingUp,
+      title: "Weekly Trend",
+      description: trendText,
+      category: "Weekly_Trend",
+      color: "text-info",
+      bgColor: "bg-info/10",
+      action: "View Details"
+    });
+  }
+  if (data.top_spending_category) {
+    cards.push({
+      icon: ShoppingCart,
+      title: "Top Spending Category",
+      description: `Most of this week's spending went to ${data.top_spending_category}.`,
+      category: "Top_Category",
+      color: "text-primary",
+      bgColor: "bg-primary/10",
+      action: "View Details"
+    });
+  }
+  if (data.monthly_budget_alert) {
+    cards.push({
+      icon: AlertCircle,
+      title: "Budget Alert",
+      description: data.monthly_budget_alert,
+      category: "Budget",
+      color: "text-destructive",
+      bgColor: "bg-destructive/10",
+      action: "View Details"
+    });
+  }
+  if (data.spending_anomaly) {
+    cards.push({
+      icon: AlertCircle,
+      title: "Spending Anomaly",
+      description: data.spending_anomaly,
+      category: "Anomaly",
+      color: "text-warning",
+      bgColor: "bg-warning/10",
+      action: "View Details"
+    });
+  }
+  return cards;
+};
+
+// Cards for the model's narrative sections (second phase of the response)
+const narrativeCards = (data: any) => {
+  const cards = [];
+  if (data.expenditure) {
+    cards.push({
+      icon: TrendingUp,
+      title: "Spending Tip",
+      description: data.expenditure,
+      category: "Trending",
+      color: "text-info",
+      bgColor: "bg-info/10",
+      action: "View Details"
+    });
+  }
+  if (data.perishables && Array.isArray(data.perishables)) {
+    cards.push({
+      icon: ShoppingCart,
+      title: "Perishables Alert",
+      description: data.perishables.join("; "),
+      category: "Perishables",
+      color: "text-warning",
+      bgColor: "bg-warning/10",
+      action: "View Details"
+    });
+  }
+  if (data.health) {
+    cards.push({
+      icon: Calendar,
+      title: "Health Tip",
+      description: data.health,
+      category: "Health",
+      color: "text-success",
+      bgColor: "bg-success/10",
+      action: "View Details"
+    });
+  }
+  if (data.recipes) {
+    cards.push({
+      icon: BarChart3,
+      title: "Try it Out!! Recipes for food perishing fast--"+data.recipes.recipe_name || "Recipe Suggestion",
+      description: data.recipes.description || "Try this recipe to reduce waste.",
+      category: "Recipe",
+      color: "text-primary",
+      bgColor: "bg-primary/10",
+      action: "View Recipe"
+    });
+  }
+  return cards;
+};
+
 export const InsightCards = () => {
   const [insights, setInsights] = useState<any[]>([]);
   const [loading, setLoading] = useState(false);
+  const [error, setError] = useState<string | null>(null);
+  // Why the narrative cards are missing: still being generated, or the model failed
+  const [narrativeNote, setNarrativeNote] = useState<{ text: string; failed: boolean } | null>(null);
   const [walletLinks, setWalletLinks] = useState<{[key: number]: string}>({});
   const [walletLoading, setWalletLoading] = useState<{[key: number]: boolean}>({});
   const backendUrl = import.meta.env.VITE_BACKEND_URL;
@@ -37,83 +150,55 @@ export const InsightCards = () => {
   };
 
   useEffect(() => {
+    const controller = new AbortController();
     setLoading(true);
-    axios.post(backendUrl + "/api/data-insights")
-      .then(res => {
-        // Transform API response to card format
-        const data = res.data;
-        const cards = [];
-        if (data.weekly_spending_trend !== undefined && data.weekly_spending_trend !== null) {
-          let trendText = "No change in weekly spending.";
-          if (typeof data.weekly_spending_trend === "number") {
-            if (data.weekly_spending_trend > 0) {
-              trendText = `Spending increased by ${data.weekly_spending_trend.toFixed(1)}% compared to last week.`;
-            } else if (data.weekly_spending_trend < 0) {
-              trendText = `Spending decreased by ${Math.abs(data.weekly_spending_trend).toFixed(1)}% compared to last week.`;
+    setError(null);
+    setNarrativeNote(null);
+    // Newline-delimited JSON: the metrics arrive first, the narrative when the model answers
+    const readPhases = async () => {
+      const res = await fetch(backendUrl + "/api/data-insights?stream=true", {
+        method: "POST",
+        signal: controller.signal,
+      });
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = "";
+      let narrativeSeen = false;
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split("\n");
+        buffered = lines.pop() ?? "";
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const data = JSON.parse(line);
+          if (data.phase === "metrics") {
+            setInsights(metricCards(data));
+            setLoading(false);
+          } else if (data.phase === "narrative") {
+            narrativeSeen = true;
+            if (data.error) {
+              setNarrativeNote({ text: `Personalized tips are unavailable: ${data.error}`, failed: true });
+            } else if (data.pending) {
+              setNarrativeNote({ text: "Personalized tips are being prepared. Check back shortly.", failed: false });
             } else {
-              trendText = "Spending is unchanged compared to last week.";
+              setInsights(prev => [...prev, ...narrativeCards(data)]);
             }
           }
-          cards.push({
-            icon: TrendingUp,
-            title: "Weekly Trend",
-            description: trendText,
-            category: "Weekly_Trend",
-            color: "text-info",
-            bgColor: "bg-info/10",
-            action: "View Details"
-          });
-        }
-        if (data.expenditure) {
-          cards.push({
-            icon: TrendingUp,
-            title: "Spending Tip",
-            description: data.expenditure,
-            category: "Trending",
-            color: "text-info",
-            bgColor: "bg-info/10",
-            action: "View Details"
-          });
         }
-        if (data.perishables && Array.isArray(data.perishables)) {
-          cards.push({
-            icon: ShoppingCart,
-            title: "Perishables Alert",
-            description: data.perishables.join("; "),
-            category: "Perishables",
-            color: "text-warning",
-            bgColor: "bg-warning/10",
-            action: "View Details"
-          });
-        }
-        if (data.health) {
-          cards.push({
-            icon: Calendar,
-            title: "Health Tip",
-            description: data.health,
-            category: "Health",
-            color: "text-success",
-            bgColor: "bg-success/10",
-            action: "View Details"
-          });
-        }
-        if (data.recipes) {
-          cards.push({
-            icon: BarChart3,
-            title: "Try it Out!! Recipes for food perishing fast--"+data.recipes.recipe_name || "Recipe Suggestion",
-            description: data.recipes.description || "Try this recipe to reduce waste.",
-            category: "Recipe",
-            color: "text-primary",
-            bgColor: "bg-primary/10",
-            action: "View Recipe"
-          });
-        }
-        setInsights(cards);
-        setLoading(false);
+      }
+      if (!narrativeSeen) throw new Error("The insights stream ended early.");
+    };
+    readPhases()
+      .catch(err => {
+        if (controller.signal.aborted) return;
+        console.error("Error loading insights:", err);
+        setError(err instanceof Error ? err.message : "Failed to load insights.");
       })
-      .catch(() => {
-        setLoading(false);
-      });
+      .finally(() => setLoading(false));
+    return () => controller.abort();
   }, [backendUrl]);
 
   return (
@@ -127,6 +212,18 @@ export const InsightCards = () => {
         <div className="flex justify-center items-center py-12">
           <div className="animate-spin rounded-full h-10 w-10 border-t-2 border-b-2 border-primary"></div>
         </div>
+      ) : error && insights.length === 0 ? (
+        <Card className="p-3 sm:p-4 w-full rounded-lg bg-card border-0 shadow-card">
+          <div className="flex items-start gap-3">
+            <div className="p-2 rounded-full bg-destructive/10 shrink-0">
+              <AlertCircle className="h-5 w-5 text-destructive" />
+            </div>
+            <div className="flex-1 min-w-0">
+              <h3 className="font-medium text-card-foreground mb-1">Couldn't load insights</h3>
+              <p className="text-sm text-muted-foreground break-words">{error}</p>
+            </div>
+          </div>
+        </Card>
       ) : (
         <div className="grid gap-4 sm:grid-cols-1 md:grid-cols-1">
           {insights.map((insight, index) => {
@@ -184,6 +281,14 @@ export const InsightCards = () => {
               </Card>
             );
           })}
+          {error && (
+            <p className="text-xs text-destructive break-words">Couldn't load the rest of your insights: {error}</p>
+          )}
+          {narrativeNote && (
+            <p className={`text-xs break-words ${narrativeNote.failed ? "text-destructive" : "text-muted-foreground"}`}>
+              {narrativeNote.text}
+            </p>
+          )}
         </div>
       )}
     </div>